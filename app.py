@@ -1,34 +1,189 @@
 import os
+import time
 import yaml
-import mlflow
+import asyncio
 
 from lib_msa import MSAAsync, log_handlers
 from loguru import logger
 
+from lean_ds_project_mlflow.serving.executor import InferenceExecutor
+from lean_ds_project_mlflow.serving.metrics import (
+    REGISTRY, REQUEST_LATENCY, IN_FLIGHT, ERRORS, MODEL_LOAD_TIME, BATCH_SIZE, Gauge
+)
+from lean_ds_project_mlflow.serving.workers import read_memory
+from lean_ds_project_mlflow.models.registry import get_model_cache, load_registered_model
+
+model_cache = get_model_cache()
 model = None
+model_version = None
+model_uri = None
+# index of the worker process, offsets the metrics port
+worker_index = 0
+batcher = None
+executor = None
+result_cache = None
 
-async def setup_environment(self):
+REGISTRY.register(Gauge(
+    'inference_queue_depth', 'Number of predictions waiting for the inference executor.',
+    function=lambda: executor.stats.queue_depth if executor is not None else 0
+))
+REGISTRY.register(Gauge(
+    'inference_wait_seconds_max', 'Maximal time a prediction waited for the inference executor.',
+    function=lambda: executor.stats.wait_time_max if executor is not None else 0
+))
+REGISTRY.register(Gauge(
+    'prediction_cache_hits', 'Number of predictions served from the cache.',
+    function=lambda: result_cache.hits if result_cache is not None else 0
+))
+REGISTRY.register(Gauge(
+    'prediction_cache_misses', 'Number of predictions computed by the model.',
+    function=lambda: result_cache.misses if result_cache is not None else 0
+))
+REGISTRY.register(Gauge(
+    'prediction_cache_coalesced', 'Number of predictions shared with a concurrent request with the same input.',
+    function=lambda: result_cache.coalesced if result_cache is not None else 0
+))
+REGISTRY.register(Gauge(
+    'process_private_memory_bytes', 'Memory of the process not shared with the other workers.',
+    function=lambda: read_memory().get('private', 0)
+))
+
+
+def to_model_input(data):
+    """
+    Convert message payload to the model input: a record or a list of records becomes a DataFrame.
+
+    :param data: deserialized message payload
+    :return: model input
+    """
+    import pandas as pd
+
+    if isinstance(data, dict):
+        return pd.DataFrame([data])
+    if isinstance(data, list) and all(isinstance(record, dict) for record in data):
+        return pd.DataFrame(data)
+    return data
+
+
+def to_response(prediction):
+    """
+    Convert model output to an object that can be serialized to JSON.
+
+    :param prediction: output of the model
+    :return: JSON serializable prediction
+    """
+    if hasattr(prediction, 'to_dict') and hasattr(prediction, 'columns'):
+        return prediction.to_dict(orient='records')
+    if hasattr(prediction, 'tolist'):
+        return prediction.tolist()
+    return prediction
+
+
+async def predict_batch(model_input):
+    return await executor.predict(model, model_input)
+
+
+def swap_model(new_model, version: str, new_model_uri: str, load_time: float):
     global model
+    global model_version
+    global model_uri
+
+    MODEL_LOAD_TIME.set(load_time)
+    executor.reload(new_model_uri)
+    model, model_version, model_uri = new_model, version, new_model_uri
+    if result_cache is not None:
+        result_cache.clear()
 
+
+def load_config() -> dict:
     with open('config/config.yml', 'r') as f:
-        config = yaml.safe_load(f)
+        return yaml.safe_load(f)
 
-        experiment_name = config['experiment']
-        model_stage = config['working_stage']
 
-    try:
-        logger.info('Trying to load model from MLFLow...')
-        model = mlflow.pyfunc.load_model(
-            model_uri=f"models:/{experiment_name}/{model_stage}"
+def load_model(config: dict):
+    """
+    Load the model of the working stage. In the multi-worker mode it is called by the master process
+    before the workers are forked, so the workers share the model.
+
+    :param config: configuration
+    :type config: dict
+    """
+    global model
+    global model_version
+    global model_uri
+
+    started_at = time.monotonic()
+    model, model_version, model_uri = load_registered_model(
+        config['experiment'], config['working_stage'], cache=model_cache
+    )
+    assert model is not None, "Unable to load model neither from MLflow nor locally."
+    MODEL_LOAD_TIME.set(time.monotonic() - started_at)
+
+
+async def setup_environment(self):
+    global batcher
+    global executor
+    global result_cache
+
+    config = load_config()
+    experiment_name = config['experiment']
+    model_stage = config['working_stage']
+    serving = config.get('serving', {})
+
+    # the optional features are imported only when they are enabled
+    if serving.get('metrics_port'):
+        from lean_ds_project_mlflow.serving.metrics import start_metrics_server
+        start_metrics_server(serving['metrics_port'] + worker_index)
+
+    if model is None:
+        load_model(config)
+
+    executor_config = serving.get('executor', {})
+    executor = InferenceExecutor(
+        backend=executor_config.get('backend', 'inline'),
+        max_workers=executor_config.get('max_workers'),
+        model_uri=model_uri
+    )
+    if executor_config.get('stats_interval_s'):
+        asyncio.get_running_loop().create_task(executor.report(executor_config['stats_interval_s']))
+
+    reload_config = serving.get('reload', {})
+    if reload_config.get('interval_s'):
+        from lean_ds_project_mlflow.serving.reload import ModelWatcher
+
+        watcher = ModelWatcher(
+            name=experiment_name,
+            stage=model_stage,
+            version=model_version,
+            cache=model_cache,
+            on_swap=swap_model,
+            interval=reload_config['interval_s'],
+            warmup_input=to_model_input(reload_config.get('warmup_input'))
         )
-        logger.info('Model from MLFlow has been loaded.')
-    except Exception as e:
-        logger.info("Unable to load model from MLFlow due to following reason,")
-        logger.exception(e)
-        model = mlflow.pyfunc.load_model(model_uri='/models')
-        logger.info('Local model has been loaded.')
-    finally:
-        assert model is not None, "Unable to load model neither from MLflow nor locally."
+        asyncio.get_running_loop().create_task(watcher.run())
+
+    max_batch_size = serving.get('max_batch_size', 1)
+    if max_batch_size > 1:
+        from lean_ds_project_mlflow.serving.batching import MicroBatcher
+
+        batcher = MicroBatcher(
+            predict_batch,
+            max_batch_size=max_batch_size,
+            max_wait_ms=serving.get('max_batch_wait_ms', 5),
+            observe_batch=BATCH_SIZE.observe
+        )
+        logger.info(f'Micro-batching is enabled: up to {max_batch_size} requests per batch.')
+
+    result_cache_config = serving.get('result_cache', {})
+    if result_cache_config.get('max_size'):
+        from lean_ds_project_mlflow.serving.result_cache import PredictionCache
+
+        result_cache = PredictionCache(
+            max_size=result_cache_config['max_size'],
+            ttl_s=result_cache_config.get('ttl_s', 60)
+        )
+        if result_cache_config.get('stats_interval_s'):
+            asyncio.get_running_loop().create_task(report_cache_stats(result_cache_config['stats_interval_s']))
 
 
 app = MSAAsync(
@@ -38,17 +193,78 @@ app = MSAAsync(
     on_startup = setup_environment
 )
 
+async def predict(data):
+    with REQUEST_LATENCY.time('deserialize'):
+        model_input = to_model_input(data)
+
+    with REQUEST_LATENCY.time('predict'):
+        if batcher is not None:
+            prediction = await batcher.predict(model_input)
+        else:
+            prediction = await predict_batch(model_input)
+
+    with REQUEST_LATENCY.time('serialize'):
+        return to_response(prediction)
+
+
+async def report_cache_stats(interval: float):
+    while True:
+        await asyncio.sleep(interval)
+        logger.info(f'Prediction cache: {result_cache.stats()}')
+
+
 @app.callback(logger_arg="logger")
 async def predict_model(logger, data):
+    IN_FLIGHT.inc()
+    try:
+        # the total latency includes the predictions served from the cache
+        with REQUEST_LATENCY.time('total'):
+            if result_cache is not None:
+                from lean_ds_project_mlflow.serving.result_cache import input_key
+                prediction = await result_cache.get_or_compute(input_key(data, model_version), lambda: predict(data))
+            else:
+                prediction = await predict(data)
+    except Exception as e:
+        ERRORS.inc(1, type(e).__name__)
+        raise
+    finally:
+        IN_FLIGHT.dec()
+
     return {
         'data': data,
+        'prediction': prediction,
     }
 
-if __name__ == '__main__':
+
+def run_worker(index: int = 0):
+    global worker_index
+
+    worker_index = index
     app.register_log_handler(
         log_handlers.get_elasticsearch_log_handler(
             es_url=os.getenv("ES_URL"),
             name=app.service_name
         )
     )
-    app.run()
\ No newline at end of file
+    app.run()
+
+
+if __name__ == '__main__':
+    config = load_config()
+    serving = config.get('serving', {})
+    workers = serving.get('workers', 1) or os.cpu_count() or 1
+
+    if workers == 1:
+        run_worker()
+    else:
+        from lean_ds_project_mlflow.serving.workers import WorkerSupervisor
+
+        # the model is loaded once, the workers get its pages copy-on-write
+        load_model(config)
+        logger.info(f'Model {model_version} is loaded, forking {workers} workers.')
+        WorkerSupervisor(
+            run_worker,
+            n_workers=workers,
+            restart_delay=serving.get('worker_restart_delay_s', 1),
+            shutdown_timeout=serving.get('worker_shutdown_timeout_s', 30)
+        ).run()
@@ -2,21 +2,35 @@ import pendulum
 from airflow.decorators import dag, task
 
 PYTHON_VERSION='3.9.13'#'3.7.13'
-CONFIG_PATH='/opt/airflow/projects/${CI_PROJECT_NAME}/config.yml'
-REQUIREMENTS_PATH='/opt/airflow/projects/${CI_PROJECT_NAME}/requirements.txt'
-REQUIREMENTS_CONTENT = ''
-with open(REQUIREMENTS_PATH, 'r') as f:
-    lines = f.readlines()
-    REQUIREMENTS_CONTENT = '\n'.join([line for line in lines if not line.startswith('git')])
+PROJECT_PATH='/opt/airflow/projects/${CI_PROJECT_NAME}'
+CONFIG_PATH=f'{PROJECT_PATH}/config.yml'
+# requirements.txt is read and filtered when the task is rendered on the worker, not when the DAG is parsed
+REQUIREMENTS_TEMPLATE = "{% filter pip_installable %}{% include 'requirements.txt' %}{% endfilter %}"
+# virtualenvs are built once per hash of rendered requirements and python version and reused by all tasks and runs
+VENV_CACHE_PATH='/opt/airflow/venvs/${CI_PROJECT_NAME}'
+VIRTUALENV_KWARGS = dict(
+    requirements=REQUIREMENTS_TEMPLATE,
+    system_site_packages=False,
+    python_version=PYTHON_VERSION,
+    venv_cache_path=VENV_CACHE_PATH,
+    queue='cpu',
+)
+
+
+def pip_installable(requirements: str) -> str:
+    return '\n'.join([line for line in requirements.splitlines() if not line.startswith('git')])
+
 
 @dag(
     schedule_interval=None,
     start_date=pendulum.datetime(2021, 1, 1, tz="UTC"),
     catchup=False,
     tags=['etl', 'retrain', 'mlflow'],
+    template_searchpath=PROJECT_PATH,
+    user_defined_filters={'pip_installable': pip_installable},
 )
 def lean_ds_project_mlflow():
-    @task.virtualenv(requirements=REQUIREMENTS_CONTENT, system_site_packages=False, python_version=PYTHON_VERSION, queue='cpu')
+    @task.virtualenv(**VIRTUALENV_KWARGS)
     def create_run(config_path: str):
         import sys
         sys.path.append('/opt/airflow/dags')
@@ -24,7 +38,7 @@ def lean_ds_project_mlflow():
 
         return create_run(config_path=config_path)
 
-    @task.virtualenv(requirements=REQUIREMENTS_CONTENT, system_site_packages=False, python_version=PYTHON_VERSION, queue='cpu')
+    @task.virtualenv(**VIRTUALENV_KWARGS)
     def download_data(config_path: str, mlflow_run_id: str):
         import sys
         sys.path.append('/opt/airflow/dags')
@@ -32,7 +46,7 @@ def lean_ds_project_mlflow():
 
         download_mlflow(config_path=config_path, run_id=mlflow_run_id)
 
-    @task.virtualenv(requirements=REQUIREMENTS_CONTENT, system_site_packages=False, python_version=PYTHON_VERSION, queue='cpu')
+    @task.virtualenv(**VIRTUALENV_KWARGS)
     def process(config_path: str, mlflow_run_id: str):
         import sys
         sys.path.append('/opt/airflow/dags')
@@ -40,7 +54,7 @@ def lean_ds_project_mlflow():
 
         process_mlflow(config_path=config_path, run_id=mlflow_run_id)
 
-    @task.virtualenv(requirements=REQUIREMENTS_CONTENT, system_site_packages=False, python_version=PYTHON_VERSION, queue='cpu')
+    @task.virtualenv(**VIRTUALENV_KWARGS)
     def transform(config_path: str, mlflow_run_id: str):
         import sys
         sys.path.append('/opt/airflow/dags')
@@ -48,7 +62,7 @@ def lean_ds_project_mlflow():
 
         transform_mlflow(config_path=config_path, run_id=mlflow_run_id)
 
-    @task.virtualenv(requirements=REQUIREMENTS_CONTENT, system_site_packages=False, python_version=PYTHON_VERSION, queue='cpu')
+    @task.virtualenv(**VIRTUALENV_KWARGS)
     def split(config_path: str, mlflow_run_id: str):
         import sys
         sys.path.append('/opt/airflow/dags')
@@ -56,7 +70,7 @@ def lean_ds_project_mlflow():
 
         split_mlflow(config_path=config_path, run_id=mlflow_run_id)
 
-    @task.virtualenv(requirements=REQUIREMENTS_CONTENT, system_site_packages=False, python_version=PYTHON_VERSION, queue='cpu')
+    @task.virtualenv(**VIRTUALENV_KWARGS)
     def train(config_path: str, mlflow_run_id: str):
         import sys
         sys.path.append('/opt/airflow/dags')
@@ -64,7 +78,7 @@ def lean_ds_project_mlflow():
 
         train_mlflow(config_path=config_path, run_id=mlflow_run_id)
 
-    @task.virtualenv(requirements=REQUIREMENTS_CONTENT, system_site_packages=False, python_version=PYTHON_VERSION, queue='cpu')
+    @task.virtualenv(**VIRTUALENV_KWARGS)
     def validate(config_path: str, mlflow_run_id: str):
         import sys
         sys.path.append('/opt/airflow/dags')
@@ -72,7 +86,7 @@ def lean_ds_project_mlflow():
 
         return validate_mlflow(config_path=config_path, run_id=mlflow_run_id)
 
-    @task.virtualenv(requirements=REQUIREMENTS_CONTENT, system_site_packages=False, python_version=PYTHON_VERSION, queue='cpu')
+    @task.virtualenv(**VIRTUALENV_KWARGS)
     def submit_metrics(config_path: str, metrics: dict):
         import sys
         sys.path.append('/opt/airflow/dags')
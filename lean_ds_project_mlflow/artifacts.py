@@ -0,0 +1,316 @@
+import os
+import time
+import stat
+import shutil
+import typing
+import pathlib
+import posixpath
+import tempfile
+import threading
+import concurrent.futures
+
+from loguru import logger
+
+from lean_ds_project_mlflow import IS_AIRFLOW_ENVIRONMENT
+from lean_ds_project_mlflow.cache import LocalCache, checksum, get_size
+
+ARTIFACT_IO_WORKERS = int(os.getenv('ARTIFACT_IO_WORKERS', 4))
+# tag of the run that holds sha256 checksum of the logged artifact
+CHECKSUM_TAG = 'checksum.{path}'
+
+
+class TransferStats():
+    """
+    Wall time and size of all the artifact transfers of the process, accumulated to separate
+    the transfer time of a stage from its compute time (see profiling.StageProfiler).
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.seconds = 0.
+        self.bytes = 0
+
+    def add(self, seconds: float = 0., size: int = 0):
+        with self._lock:
+            self.seconds += seconds
+            self.bytes += size
+
+    def snapshot(self) -> typing.Tuple[float, int]:
+        with self._lock:
+            return self.seconds, self.bytes
+
+
+TRANSFER_STATS = TransferStats()
+
+
+def get_artifact_cache() -> typing.Optional[LocalCache]:
+    """
+    Artifact cache shared by the stages running on the same host. The cache is configured with ARTIFACT_CACHE_DIR
+    and ARTIFACT_CACHE_SIZE_MB environment variables, under Airflow it is enabled in the temporary directory by default.
+
+    :return: cache or None if it is disabled
+    :rtype: typing.Optional[LocalCache]
+    """
+    directory = os.getenv('ARTIFACT_CACHE_DIR')
+    if directory is None and IS_AIRFLOW_ENVIRONMENT:
+        directory = os.path.join(tempfile.gettempdir(), 'lean_ds_project_mlflow', 'artifacts')
+    if not directory:
+        return None
+    return LocalCache(directory, max_size_mb=float(os.getenv('ARTIFACT_CACHE_SIZE_MB', 10240)))
+
+
+def link_tree(source: pathlib.Path, destination: pathlib.Path):
+    """
+    Hardlink file or directory tree to destination, files are copied if hardlinks are not possible
+    (e.g. source and destination are on different filesystems).
+
+    :param source: file or directory
+    :type source: pathlib.Path
+    :param destination: path of the link
+    :type destination: pathlib.Path
+    """
+    source, destination = pathlib.Path(source), pathlib.Path(destination)
+    if source.is_file():
+        files = [(source, destination)]
+    else:
+        destination.mkdir(parents=True, exist_ok=True)
+        files = [
+            (path, destination.joinpath(path.relative_to(source))) for path in source.glob('**/*') if path.is_file()
+        ]
+
+    for src, dst in files:
+        dst.parent.mkdir(parents=True, exist_ok=True)
+        if dst.exists():
+            dst.unlink()
+        try:
+            os.link(src, dst)
+        except OSError:
+            shutil.copy2(src, dst)
+
+
+def _make_read_only(path: pathlib.Path):
+    # cached files are hardlinked into working directories, they must not be modified in place
+    files = [path] if path.is_file() else [p for p in path.glob('**/*') if p.is_file()]
+    for fname in files:
+        fname.chmod(stat.S_IRUSR | stat.S_IRGRP | stat.S_IROTH)
+
+
+def _key(digest: str) -> str:
+    # entries are addressed by content, an artifact logged again to the same run gets a new entry
+    return f'sha256/{digest}'
+
+
+def get_artifact_checksum(client, run_id: str, artifact_path: str) -> typing.Optional[str]:
+    """
+    Checksum of the artifact stored by upload_artifact in the CHECKSUM_TAG tag of the run.
+
+    :param client: MLFlow client
+    :type client: MlflowClient
+    :param run_id: id of the run
+    :type run_id: str
+    :param artifact_path: path of the artifact in the run
+    :type artifact_path: str
+    :return: hex digest or None if the artifact was not logged by upload_artifact
+    :rtype: typing.Optional[str]
+    """
+    return client.get_run(run_id).data.tags.get(CHECKSUM_TAG.format(path=artifact_path))
+
+
+def download_artifact(client, run_id: str, artifact_path: str, directory: pathlib.Path,
+                      cache: LocalCache = None, expected_checksum: str = None) -> pathlib.Path:
+    """
+    Download the artifact (file or directory) of the run to directory/artifact_path, the same way
+    as MlflowClient.download_artifacts does. With the cache, the artifact is fetched over the network only
+    once per host and then hardlinked into the directory. Cache entries are addressed by the checksum from
+    the CHECKSUM_TAG tag of the run, artifacts without the tag are not cached.
+
+    :param client: MLFlow client
+    :type client: MlflowClient
+    :param run_id: id of the run
+    :type run_id: str
+    :param artifact_path: path of the artifact in the run, e.g. interim/dataset.csv
+    :type artifact_path: str
+    :param directory: local directory
+    :type directory: pathlib.Path
+    :param cache: artifact cache, defaults to None
+    :type cache: LocalCache, optional
+    :param expected_checksum: checksum of the artifact, read from the tags of the run if not given
+    :type expected_checksum: str, optional
+    :return: local path of the artifact
+    :rtype: pathlib.Path
+    """
+    destination = pathlib.Path(directory).joinpath(artifact_path)
+    if cache is not None and expected_checksum is None:
+        expected_checksum = get_artifact_checksum(client, run_id, artifact_path)
+    if cache is None or expected_checksum is None:
+        return pathlib.Path(client.download_artifacts(run_id, artifact_path, str(directory)))
+
+    key = _key(expected_checksum)
+    with cache.acquire(key) as path:
+        if path is not None:
+            link_tree(path, destination)
+            logger.info(f'Artifact {artifact_path} of run {run_id} is taken from the cache.')
+            return destination
+
+    with cache.staging() as staging:
+        local_path = pathlib.Path(client.download_artifacts(run_id, artifact_path, str(staging)))
+        if checksum(local_path) != expected_checksum:
+            # the artifact is being logged again (e.g. by a retried task), its content is not cached
+            logger.warning(f'Checksum of artifact {artifact_path} of run {run_id} does not match its tag.')
+            link_tree(local_path, destination)
+            return destination
+        _make_read_only(local_path)
+        cache.put(key, local_path, meta={'run_id': run_id, 'artifact_path': artifact_path})
+
+    with cache.acquire(key) as path:
+        link_tree(path, destination)
+    return destination
+
+
+def upload_artifact(client, run_id: str, local_path: pathlib.Path, artifact_path: str,
+                    cache: LocalCache = None):
+    """
+    Log the file or directory to the run as artifact_path. Checksum of the artifact is stored in the
+    CHECKSUM_TAG tag of the run. With the cache, the local copy is put into the cache, so the next stages
+    on the same host do not download it.
+
+    :param client: MLFlow client
+    :type client: MlflowClient
+    :param run_id: id of the run
+    :type run_id: str
+    :param local_path: local file or directory
+    :type local_path: pathlib.Path
+    :param artifact_path: path of the artifact in the run, e.g. interim/dataset.csv
+    :type artifact_path: str
+    :param cache: artifact cache, defaults to None
+    :type cache: LocalCache, optional
+    """
+    local_path = pathlib.Path(local_path)
+    if local_path.is_dir():
+        client.log_artifacts(run_id, str(local_path), artifact_path)
+    else:
+        if posixpath.basename(artifact_path) != local_path.name:
+            raise ValueError(f'Name of the file {local_path} does not match artifact path {artifact_path}.')
+        client.log_artifact(run_id, str(local_path), posixpath.dirname(artifact_path) or None)
+
+    digest = checksum(local_path)
+    client.set_tag(run_id, CHECKSUM_TAG.format(path=artifact_path), digest)
+
+    if cache is not None:
+        with cache.staging() as staging:
+            # working file is copied rather than linked, it stays writable for the stage
+            copy = staging.joinpath(local_path.name)
+            if local_path.is_dir():
+                shutil.copytree(local_path, copy)
+            else:
+                shutil.copy2(local_path, copy)
+            _make_read_only(copy)
+            cache.put(_key(digest), copy, meta={'run_id': run_id, 'artifact_path': artifact_path})
+
+
+def _transfer(name: str, func: typing.Callable, retries: int, backoff: float) -> pathlib.Path:
+    for attempt in range(retries + 1):
+        started_at = time.monotonic()
+        try:
+            path = func()
+        except Exception as e:
+            if attempt == retries:
+                raise
+            delay = backoff * 2 ** attempt
+            logger.info(f'{name} failed ({e!r}), retrying in {delay:.1f}s...')
+            time.sleep(delay)
+            continue
+
+        elapsed = time.monotonic() - started_at
+        size = get_size(path)
+        TRANSFER_STATS.add(size=size)
+        logger.info(f'{name}: {size} bytes in {elapsed:.2f}s, {size / max(elapsed, 1e-9) / 1024 / 1024:.2f} MB/s.')
+        return path
+
+
+def _run_concurrently(tasks: typing.List[typing.Callable], max_workers: int) -> list:
+    started_at = time.monotonic()
+    try:
+        if len(tasks) == 1 or max_workers <= 1:
+            return [task() for task in tasks]
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=min(max_workers, len(tasks))) as pool:
+            futures = [pool.submit(task) for task in tasks]
+            return [future.result() for future in futures]
+    finally:
+        # wall time of the concurrent transfers, not the sum of their durations
+        TRANSFER_STATS.add(seconds=time.monotonic() - started_at)
+
+
+def download_artifacts(client, run_id: str, artifact_paths: typing.Sequence[str], directory: pathlib.Path,
+                       cache: LocalCache = None, max_workers: int = ARTIFACT_IO_WORKERS, retries: int = 3,
+                       backoff: float = 1.) -> typing.List[pathlib.Path]:
+    """
+    Download several artifacts of the run concurrently, see download_artifact. Failed downloads are retried
+    with exponential backoff, size and throughput of every artifact are logged.
+
+    :param client: MLFlow client
+    :type client: MlflowClient
+    :param run_id: id of the run
+    :type run_id: str
+    :param artifact_paths: paths of the artifacts in the run
+    :type artifact_paths: typing.Sequence[str]
+    :param directory: local directory
+    :type directory: pathlib.Path
+    :param cache: artifact cache, defaults to None
+    :type cache: LocalCache, optional
+    :param max_workers: number of concurrent transfers, defaults to ARTIFACT_IO_WORKERS environment variable or 4
+    :type max_workers: int
+    :param retries: number of retries of a failed transfer
+    :type retries: int
+    :param backoff: delay before the first retry in seconds, doubled for every next one
+    :type backoff: float
+    :return: local paths of the artifacts
+    :rtype: typing.List[pathlib.Path]
+    """
+    tags = client.get_run(run_id).data.tags if cache is not None else {}
+    tasks = [
+        lambda artifact_path=artifact_path: _transfer(
+            f'Download of {artifact_path}',
+            lambda: download_artifact(
+                client, run_id, artifact_path, directory, cache, tags.get(CHECKSUM_TAG.format(path=artifact_path))
+            ),
+            retries, backoff
+        )
+        for artifact_path in artifact_paths
+    ]
+    return _run_concurrently(tasks, max_workers)
+
+
+def upload_artifacts(client, run_id: str, artifacts: typing.Sequence[typing.Tuple[pathlib.Path, str]],
+                     cache: LocalCache = None, max_workers: int = ARTIFACT_IO_WORKERS, retries: int = 3,
+                     backoff: float = 1.):
+    """
+    Log several files or directories to the run concurrently, see upload_artifact. Failed uploads are retried
+    with exponential backoff, size and throughput of every artifact are logged.
+
+    :param client: MLFlow client
+    :type client: MlflowClient
+    :param run_id: id of the run
+    :type run_id: str
+    :param artifacts: pairs of local path and path of the artifact in the run
+    :type artifacts: typing.Sequence[typing.Tuple[pathlib.Path, str]]
+    :param cache: artifact cache, defaults to None
+    :type cache: LocalCache, optional
+    :param max_workers: number of concurrent transfers, defaults to ARTIFACT_IO_WORKERS environment variable or 4
+    :type max_workers: int
+    :param retries: number of retries of a failed transfer
+    :type retries: int
+    :param backoff: delay before the first retry in seconds, doubled for every next one
+    :type backoff: float
+    """
+    def upload(local_path, artifact_path):
+        upload_artifact(client, run_id, local_path, artifact_path, cache)
+        return local_path
+
+    tasks = [
+        lambda local_path=local_path, artifact_path=artifact_path: _transfer(
+            f'Upload of {artifact_path}', lambda: upload(local_path, artifact_path), retries, backoff
+        )
+        for local_path, artifact_path in artifacts
+    ]
+    _run_concurrently(tasks, max_workers)
@@ -0,0 +1,161 @@
+import os
+import sys
+import json
+import time
+import yaml
+import click
+import typing
+import pathlib
+import platform
+import subprocess
+
+from loguru import logger
+
+# entry points of the project: stages run by Airflow tasks, batch jobs and the serving app
+ENTRY_POINTS = {
+    'download': 'lean_ds_project_mlflow.data.download',
+    'process': 'lean_ds_project_mlflow.features.process',
+    'split': 'lean_ds_project_mlflow.features.split',
+    'transform': 'lean_ds_project_mlflow.features.transform',
+    'train': 'lean_ds_project_mlflow.models.train',
+    'validate': 'lean_ds_project_mlflow.models.validate',
+    'predict': 'lean_ds_project_mlflow.models.predict',
+    'create_run': 'lean_ds_project_mlflow.lifecycle.create_run',
+    'submit_metrics': 'lean_ds_project_mlflow.lifecycle.submit_metrics',
+    'pipeline': 'lean_ds_project_mlflow.pipeline',
+    'app': 'app',
+}
+
+
+def parse_importtime(output: str, module: str) -> typing.Optional[typing.Dict[str, int]]:
+    """
+    Parse the output of python -X importtime: cumulative import time in microseconds of the module and
+    of every module it imported. The modules imported by the interpreter at startup (site and .pth
+    files) are listed before and are not included.
+
+    :param output: stderr of the interpreter
+    :type output: str
+    :param module: name of the imported module
+    :type module: str
+    :return: cumulative import time by module name, None if the module is not in the output
+    :rtype: typing.Optional[typing.Dict[str, int]]
+    """
+    times = dict()
+    for line in output.splitlines():
+        if not line.startswith('import time:'):
+            continue
+        fields = line[len('import time:'):].split('|')
+        if len(fields) != 3 or not fields[1].strip().isdigit():
+            continue
+        name = fields[2].strip()
+        # the output lists a module after its dependencies, a top-level import closes the list
+        times[name] = max(times.get(name, 0), int(fields[1]))
+        if not fields[2].startswith('  '):
+            if name == module:
+                return times
+            times = dict()
+    return None
+
+
+def measure_import(module: str, repeats: int = 3, top: int = 5) -> dict:
+    """
+    Measure the import time of the module in fresh interpreters. The minimum over the repeats is reported,
+    the first run also pays for compiling the bytecode and reading the files from a cold disk.
+
+    :param module: name of the module
+    :type module: str
+    :param repeats: number of interpreters started
+    :type repeats: int
+    :param top: number of the heaviest packages reported
+    :type top: int
+    :return: import time in milliseconds and the heaviest packages, or the error
+    :rtype: dict
+    """
+    best = None
+    for _ in range(repeats):
+        process = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+            stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True,
+            env=dict(os.environ, MLFLOW_DISABLE_AGENT_HINT='1')
+        )
+        if process.returncode != 0:
+            return {'module': module, 'error': process.stderr.strip().splitlines()[-1]}
+        times = parse_importtime(process.stderr, module)
+        if times is not None and (best is None or times[module] < best[module]):
+            best = times
+
+    if best is None:
+        return {'module': module, 'error': 'module is not found in the importtime output'}
+    # the heaviest third-party and standard library packages, without the modules of the project
+    packages = {
+        name: value for name, value in best.items()
+        if '.' not in name and name not in (module, 'lean_ds_project_mlflow')
+    }
+    heaviest = sorted(packages.items(), key=lambda item: item[1], reverse=True)[:top]
+    return {
+        'module': module,
+        'import_ms': best[module] / 1000,
+        'heaviest': {name: value / 1000 for name, value in heaviest},
+    }
+
+
+def check_budgets(results: typing.Dict[str, dict], budgets: typing.Dict[str, float]) -> typing.List[str]:
+    """
+    Find the entry points that take longer to import than their budget.
+
+    :param results: measured import times by entry point
+    :type results: typing.Dict[str, dict]
+    :param budgets: budgets in milliseconds by entry point, entry points without budget are not checked
+    :type budgets: typing.Dict[str, float]
+    :return: descriptions of the exceeded budgets
+    :rtype: typing.List[str]
+    """
+    exceeded = []
+    for name, budget in budgets.items():
+        result = results.get(name)
+        if result is None or 'import_ms' not in result:
+            continue
+        if result['import_ms'] > budget:
+            heaviest = ', '.join(f'{key} {value:.0f} ms' for key, value in result['heaviest'].items())
+            exceeded.append(f'{name}: {result["import_ms"]:.0f} ms vs budget {budget:.0f} ms ({heaviest})')
+    return exceeded
+
+
+@logger.catch()
+@click.command()
+@click.option('--config', type=click.Path(exists=True), help='path to config file', default='config/config_local.yml')
+@click.option('--output', type=click.Path(), default='reports/import_time.json', help='path to the report')
+@click.option('--repeats', type=int, default=3, help='number of interpreters started for each entry point')
+@click.option('--entry-point', multiple=True, type=click.Choice(list(ENTRY_POINTS)), help='entry points measured')
+def main(config, output, repeats, entry_point):
+    with open(config, 'r') as f:
+        config = yaml.safe_load(f)
+    budgets = config.get('benchmark', {}).get('import_budget_ms', {})
+
+    results = dict()
+    for name in entry_point or ENTRY_POINTS:
+        results[name] = measure_import(ENTRY_POINTS[name], repeats)
+        if 'error' in results[name]:
+            logger.warning(f'Unable to import {name}: {results[name]["error"]}')
+        else:
+            logger.info(f'{name}: {results[name]["import_ms"]:.0f} ms (budget {budgets.get(name, "-")})')
+
+    pathlib.Path(output).parent.mkdir(parents=True, exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump({
+            'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'python': platform.python_version(),
+            'results': results,
+            'budgets': budgets,
+        }, f, indent=2)
+    logger.info(f'Import time report is written to {output}.')
+
+    exceeded = check_budgets(results, budgets)
+    for message in exceeded:
+        logger.error(f'Import time budget is exceeded: {message}')
+    if exceeded:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
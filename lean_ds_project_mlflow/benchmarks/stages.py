@@ -0,0 +1,289 @@
+import os
+import sys
+import json
+import time
+import yaml
+import click
+import typing
+import pathlib
+import resource
+import tempfile
+import platform
+
+import numpy as np
+import pandas as pd
+
+from loguru import logger
+from lean_ds_project_mlflow.data.download import dowload_dataset
+from lean_ds_project_mlflow.features.process import process_dataset
+from lean_ds_project_mlflow.features.split import split_dataset
+from lean_ds_project_mlflow.features.transform import transform_dataset
+from lean_ds_project_mlflow.features.columnar import save_columnar, load_columnar
+
+TARGET_COLUMN = 'target'
+
+
+def generate_dataset(path: pathlib.Path, n_samples: int, seed: int = 42, n_features: int = 10,
+                     chunk_size: int = 100000) -> int:
+    """
+    Generate synthetic classification dataset: id, numeric features, categorical feature and target with
+    3 classes. The dataset is written chunk by chunk, so its size is not limited by memory.
+
+    :param path: path to output CSV file
+    :type path: pathlib.Path
+    :param n_samples: number of rows
+    :type n_samples: int
+    :param seed: fixed random seed
+    :type seed: int
+    :param n_features: number of numeric features
+    :type n_features: int
+    :param chunk_size: number of rows generated at once
+    :type chunk_size: int
+    :return: number of rows
+    :rtype: int
+    """
+    rng = np.random.default_rng(seed)
+    categories = np.array(['a', 'b', 'c', 'd', 'e'])
+    with open(path, 'w') as f:
+        for offset in range(0, max(n_samples, 1), chunk_size):
+            rows = min(chunk_size, n_samples - offset)
+            features = rng.normal(size=(rows, n_features))
+            chunk = pd.DataFrame(features, columns=[f'f{i}' for i in range(n_features)])
+            chunk.insert(0, 'id', np.arange(offset, offset + rows))
+            chunk['category'] = categories[rng.integers(0, len(categories), rows)]
+            chunk[TARGET_COLUMN] = np.digitize(features[:, 0] + rng.normal(scale=0.5, size=rows), [-0.5, 0.5])
+            chunk.to_csv(f, header=offset == 0, index=False)
+    return n_samples
+
+
+def measure(func: typing.Callable, *args) -> dict:
+    """
+    Run the function in a forked child process and measure its wall time and peak resident memory.
+    The child starts with the memory of the parent, so the increase of the peak over the memory at
+    start is reported too.
+
+    :param func: function to be measured
+    :type func: typing.Callable
+    :return: wall_s, peak_rss_mb and rss_increase_mb
+    :rtype: dict
+    """
+    read_fd, write_fd = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        os.close(read_fd)
+        status = 0
+        try:
+            rss_start = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            started = time.perf_counter()
+            func(*args)
+            payload = {'wall_s': time.perf_counter() - started, 'rss_start_kb': rss_start}
+        except BaseException as e:
+            payload, status = {'error': repr(e)}, 1
+        with os.fdopen(write_fd, 'w') as f:
+            json.dump(payload, f)
+        os._exit(status)
+
+    os.close(write_fd)
+    with os.fdopen(read_fd, 'r') as f:
+        payload = json.loads(f.read() or '{}')
+    _, _, usage = os.wait4(pid, 0)
+    if 'error' in payload or 'wall_s' not in payload:
+        raise RuntimeError(f'Benchmarked function {func.__name__} failed: {payload.get("error", "no result")}')
+
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    unit = 1 if sys.platform == 'darwin' else 1024
+    return {
+        'wall_s': payload['wall_s'],
+        'peak_rss_mb': usage.ru_maxrss * unit / 2 ** 20,
+        'rss_increase_mb': (usage.ru_maxrss - payload['rss_start_kb']) * unit / 2 ** 20,
+    }
+
+
+def count_rows(path: pathlib.Path, chunk_size: int = 100000) -> int:
+    """
+    Number of rows of the CSV file or of the dataset stored in columnar format.
+
+    :param path: path to CSV file or to the directory of columnar dataset
+    :type path: pathlib.Path
+    :param chunk_size: number of rows read at once
+    :type chunk_size: int
+    :return: number of rows
+    :rtype: int
+    """
+    path = pathlib.Path(path)
+    if path.is_dir():
+        return len(load_columnar(path))
+    return sum(len(chunk) for chunk in pd.read_csv(path, chunksize=chunk_size, usecols=[0], dtype=str))
+
+
+def _transform(interim: pathlib.Path, processed: pathlib.Path, chunk_size: int, n_jobs: int):
+    for name in ('dataset_tune', 'dataset_validate'):
+        save_columnar(transform_dataset(interim.joinpath(f'{name}.csv'), chunk_size, n_jobs), processed.joinpath(name))
+
+
+def _train(processed: pathlib.Path, models: pathlib.Path, config: dict):
+    import mlflow.pyfunc
+    from lean_ds_project_mlflow.models.train import train_model
+
+    clr = train_model(load_columnar(processed.joinpath('dataset_tune')), config)
+    mlflow.pyfunc.save_model(path=str(models), python_model=clr)
+
+
+def _validate(processed: pathlib.Path, models: pathlib.Path, config: dict):
+    import mlflow.pyfunc
+    from lean_ds_project_mlflow.models.validate import evaluate
+
+    clr = mlflow.pyfunc.load_model(model_uri=str(models))
+    evaluate(load_columnar(processed.joinpath('dataset_validate')), clr, config)
+
+
+def benchmark_size(config: dict, n_samples: int, directory: pathlib.Path) -> typing.List[dict]:
+    """
+    Run all the stages on the synthetic dataset of n_samples rows.
+
+    :param config: configuration
+    :type config: dict
+    :param n_samples: number of rows
+    :type n_samples: int
+    :param directory: working directory
+    :type directory: pathlib.Path
+    :return: measurements of the stages, rows_per_s is computed from the number of rows the stage processed
+    :rtype: typing.List[dict]
+    """
+    dataset_config = config['dataset']
+    chunk_size, n_jobs, seed = dataset_config['chunk_size'], dataset_config['n_jobs'], dataset_config['seed']
+    raw, interim, processed, models = [directory.joinpath(name) for name in ('raw', 'interim', 'processed', 'models')]
+    for path in (raw, interim, processed):
+        path.mkdir(parents=True, exist_ok=True)
+
+    # the metrics are computed for real against the synthetic target
+    config = dict(config, validation=dict(config.get('validation', {}), target_column=TARGET_COLUMN))
+    # inputs of every stage, their rows are the rows the stage processed
+    stages = [
+        ('download', dowload_dataset, (raw.joinpath('downloaded.csv'),), [raw.joinpath('downloaded.csv')]),
+        ('process', process_dataset, (raw.joinpath('dataset.csv'), interim.joinpath('dataset.csv'), chunk_size, n_jobs),
+         [raw.joinpath('dataset.csv')]),
+        ('split', split_dataset, (
+            interim.joinpath('dataset.csv'), interim.joinpath('dataset_tune.csv'),
+            interim.joinpath('dataset_validate.csv'), dataset_config['validate'], seed,
+            dataset_config.get('key_column'), dataset_config.get('stratify_column'), chunk_size
+        ), [interim.joinpath('dataset.csv')]),
+        ('transform', _transform, (interim, processed, chunk_size, n_jobs),
+         [interim.joinpath('dataset_tune.csv'), interim.joinpath('dataset_validate.csv')]),
+        ('train', _train, (processed, models, config), [processed.joinpath('dataset_tune')]),
+        ('validate', _validate, (processed, models, config), [processed.joinpath('dataset_validate')]),
+    ]
+
+    generate_dataset(raw.joinpath('dataset.csv'), n_samples, seed, chunk_size=chunk_size)
+    results = []
+    for stage, func, args, inputs in stages:
+        result = dict(stage=stage, n_samples=n_samples, **measure(func, *args))
+        result['rows'] = sum(count_rows(path, chunk_size) for path in inputs)
+        result['rows_per_s'] = result['rows'] / max(result['wall_s'], 1e-9)
+        logger.info(f'{stage} of {result["rows"]} rows: {result["wall_s"]:.2f} s, {result["rows_per_s"]:.0f} rows/s, '
+                    f'peak RSS {result["peak_rss_mb"]:.0f} MB (+{result["rss_increase_mb"]:.0f} MB)')
+        results.append(result)
+    return results
+
+
+def run_benchmark(config: dict, scales: typing.Sequence[float]) -> dict:
+    """
+    Benchmark the stages on the synthetic datasets of dataset.n_samples * scale rows for every scale.
+
+    :param config: configuration
+    :type config: dict
+    :param scales: sizes of the datasets as multiples of dataset.n_samples
+    :type scales: typing.Sequence[float]
+    :return: report
+    :rtype: dict
+    """
+    results = []
+    for scale in scales:
+        n_samples = int(config['dataset']['n_samples'] * scale)
+        with tempfile.TemporaryDirectory() as directory:
+            results.extend(benchmark_size(config, n_samples, pathlib.Path(directory)))
+
+    return {
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'dataset': config['dataset'],
+        'results': results,
+    }
+
+
+def compare(report: dict, baseline: dict, threshold: float, min_wall_s: float = 0.5) -> typing.List[str]:
+    """
+    Find the regressions of the report against the baseline: stages that are slower or use more memory
+    than in the baseline by more than threshold. Stages faster than min_wall_s are compared by memory only,
+    their timings are dominated by noise.
+
+    :param report: current report
+    :type report: dict
+    :param baseline: baseline report
+    :type baseline: dict
+    :param threshold: allowed relative increase, e.g. 0.2 for 20%
+    :type threshold: float
+    :param min_wall_s: minimal wall time to compare
+    :type min_wall_s: float
+    :return: descriptions of the regressions
+    :rtype: typing.List[str]
+    """
+    expected = {(result['stage'], result['n_samples']): result for result in baseline['results']}
+    regressions = []
+    for result in report['results']:
+        previous = expected.get((result['stage'], result['n_samples']))
+        if previous is None:
+            continue
+        for key in ('wall_s', 'peak_rss_mb'):
+            if key == 'wall_s' and max(result[key], previous[key]) < min_wall_s:
+                continue
+            if result[key] > previous[key] * (1 + threshold):
+                regressions.append(
+                    f'{result["stage"]} of {result["n_samples"]} rows: {key} {result[key]:.2f} '
+                    f'vs {previous[key]:.2f} in baseline (+{result[key] / previous[key] - 1:.0%})'
+                )
+    return regressions
+
+
+@logger.catch(reraise=True)
+@click.command()
+@click.option('--config', type=click.Path(exists=True), help='path to config file', default='config/config_local.yml')
+@click.option('--output', type=click.Path(), default='reports/benchmark.json', help='path to the report')
+@click.option('--baseline', type=click.Path(), default=None, help='path to the baseline report')
+@click.option('--update-baseline', is_flag=True, help='store the report as the new baseline')
+@click.option('--scale', type=float, multiple=True, help='size of dataset as a multiple of dataset.n_samples')
+def main(config, output, baseline, update_baseline, scale):
+    with open(config, 'r') as f:
+        config = yaml.safe_load(f)
+    benchmark_config = config.get('benchmark', {})
+    baseline = baseline or benchmark_config.get('baseline')
+
+    report = run_benchmark(config, scale or benchmark_config.get('scales', [1.0]))
+    pathlib.Path(output).parent.mkdir(parents=True, exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=2)
+    logger.info(f'Benchmark report is written to {output}.')
+
+    if baseline is None:
+        return
+    if update_baseline or not pathlib.Path(baseline).exists():
+        with open(baseline, 'w') as f:
+            json.dump(report, f, indent=2)
+        logger.info(f'Baseline {baseline} is updated.')
+        return
+
+    with open(baseline, 'r') as f:
+        regressions = compare(
+            report, json.load(f), benchmark_config.get('threshold', 0.2), benchmark_config.get('min_wall_s', 0.5)
+        )
+    for regression in regressions:
+        logger.error(f'Regression: {regression}')
+    if regressions:
+        sys.exit(1)
+    logger.info('No regressions against the baseline.')
+
+
+if __name__ == '__main__':
+    main()
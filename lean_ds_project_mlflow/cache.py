@@ -0,0 +1,199 @@
+import os
+import json
+import fcntl
+import shutil
+import typing
+import hashlib
+import pathlib
+import tempfile
+import contextlib
+
+from loguru import logger
+
+
+def checksum(path: pathlib.Path) -> str:
+    """
+    Calculate sha256 checksum of a file or of a directory (relative paths and content of all its files).
+
+    :param path: path to file or directory
+    :type path: pathlib.Path
+    :return: hex digest
+    :rtype: str
+    """
+    path = pathlib.Path(path)
+    digest = hashlib.sha256()
+    files = [path] if path.is_file() else sorted(p for p in path.glob('**/*') if p.is_file())
+
+    for fname in files:
+        if fname != path:
+            digest.update(fname.relative_to(path).as_posix().encode())
+        with open(fname, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                digest.update(block)
+    return digest.hexdigest()
+
+
+def get_size(path: pathlib.Path) -> int:
+    path = pathlib.Path(path)
+    if path.is_file():
+        return path.stat().st_size
+    return sum(p.stat().st_size for p in path.glob('**/*') if p.is_file())
+
+
+class LocalCache():
+    """
+    Persistent cache of files and directories on local disk, which can be shared by several processes
+    (replicas mounting the same volume, Airflow workers of the same host). Every entry is stored under
+    the digest of its key along with a manifest that holds the checksum of the content. The cache is
+    limited in size, least recently used entries are evicted first.
+
+    Entries are read under a shared lock and inserted / evicted under an exclusive one, new content is
+    prepared in a staging directory of the cache and moved in place atomically.
+    """
+    def __init__(self, directory: str, max_size_mb: float = 2048):
+        """
+        :param directory: root directory of the cache
+        :type directory: str
+        :param max_size_mb: size limit of the cache in megabytes
+        :type max_size_mb: float
+        """
+        self.directory = pathlib.Path(directory)
+        self.max_size = int(max_size_mb * 1024 * 1024)
+
+        self.entries_directory = self.directory.joinpath('entries')
+        self.staging_directory = self.directory.joinpath('staging')
+        self.entries_directory.mkdir(parents=True, exist_ok=True)
+        self.staging_directory.mkdir(parents=True, exist_ok=True)
+        self._lock_path = self.directory.joinpath('.lock')
+
+    @contextlib.contextmanager
+    def _lock(self, exclusive: bool):
+        with open(self._lock_path, 'a') as f:
+            fcntl.flock(f, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _entry(self, key: str) -> pathlib.Path:
+        return self.entries_directory.joinpath(hashlib.sha256(key.encode()).hexdigest()[:32])
+
+    @staticmethod
+    def _read_manifest(entry: pathlib.Path) -> typing.Optional[dict]:
+        try:
+            with open(entry.joinpath('manifest.json'), 'r') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def manifests(self) -> typing.List[dict]:
+        """
+        Manifests of all the complete entries of the cache.
+
+        :return: list of manifests (key, checksum, size, meta)
+        :rtype: typing.List[dict]
+        """
+        with self._lock(exclusive=False):
+            manifests = [self._read_manifest(entry) for entry in self.entries_directory.iterdir()]
+        return [manifest for manifest in manifests if manifest is not None]
+
+    @contextlib.contextmanager
+    def acquire(self, key: str, verify: bool = False):
+        """
+        Get path to the content of the entry. The entry is protected from eviction until the context is exited.
+
+        :param key: key of the entry
+        :type key: str
+        :param verify: verify checksum of the content, corrupted entries are treated as missing
+        :type verify: bool
+        :return: path to the content or None if there is no such entry
+        :rtype: typing.Optional[pathlib.Path]
+        """
+        with self._lock(exclusive=False):
+            entry = self._entry(key)
+            manifest = self._read_manifest(entry)
+            data = entry.joinpath('data')
+
+            if manifest is None or manifest['key'] != key:
+                yield None
+                return
+            if verify and checksum(data) != manifest['checksum']:
+                logger.info(f'Cache entry {key} is corrupted and will be ignored.')
+                yield None
+                return
+
+            # mtime of the manifest is the last access time used for LRU eviction
+            os.utime(entry.joinpath('manifest.json'))
+            yield data
+
+    @contextlib.contextmanager
+    def staging(self):
+        """
+        Temporary directory on the same filesystem as the cache, content prepared there can be passed to put.
+
+        :return: path to the temporary directory
+        :rtype: pathlib.Path
+        """
+        path = pathlib.Path(tempfile.mkdtemp(dir=self.staging_directory))
+        try:
+            yield path
+        finally:
+            shutil.rmtree(path, ignore_errors=True)
+
+    def put(self, key: str, source: pathlib.Path, meta: dict = None) -> dict:
+        """
+        Move file or directory into the cache. If the entry already exists with the same checksum, it is kept
+        as is, otherwise it is replaced.
+
+        :param key: key of the entry
+        :type key: str
+        :param source: file or directory in the staging directory of the cache
+        :type source: pathlib.Path
+        :param meta: arbitrary data to be stored in the manifest
+        :type meta: dict, optional
+        :return: manifest of the entry
+        :rtype: dict
+        """
+        source = pathlib.Path(source)
+        manifest = {
+            'key': key,
+            'checksum': checksum(source),
+            'size': get_size(source),
+            'meta': meta or {},
+        }
+
+        with self._lock(exclusive=True):
+            entry = self._entry(key)
+            existing = self._read_manifest(entry)
+            if existing is not None and existing['key'] == key and existing['checksum'] == manifest['checksum']:
+                return existing
+
+            shutil.rmtree(entry, ignore_errors=True)
+            entry_staging = pathlib.Path(tempfile.mkdtemp(dir=self.staging_directory))
+            os.rename(source, entry_staging.joinpath('data'))
+            # manifest is written last, entry without it is incomplete
+            with open(entry_staging.joinpath('manifest.json'), 'w') as f:
+                json.dump(manifest, f)
+            os.rename(entry_staging, entry)
+
+            self._evict(keep=entry)
+        return manifest
+
+    def _evict(self, keep: pathlib.Path):
+        entries = []
+        for entry in self.entries_directory.iterdir():
+            manifest = self._read_manifest(entry)
+            if manifest is None:
+                shutil.rmtree(entry, ignore_errors=True)
+                continue
+            entries.append((entry.joinpath('manifest.json').stat().st_mtime, manifest['size'], entry))
+
+        total_size = sum(size for _, size, _ in entries)
+        for _, size, entry in sorted(entries):
+            if total_size <= self.max_size:
+                break
+            if entry == keep:
+                continue
+            shutil.rmtree(entry, ignore_errors=True)
+            total_size -= size
+            logger.info(f'Cache entry {entry.name} is evicted ({size} bytes).')
@@ -0,0 +1,35 @@
+import typing
+
+from loguru import logger
+
+
+def config_command(func: typing.Callable[[str], typing.Any],
+                   default: str = 'config/config_local.yml') -> typing.Callable:
+    """
+    Command line entry point with --config option that calls func(config). click is imported only when
+    the command is run, so importing the module of the stage (e.g. by an Airflow task) does not load it.
+
+    >>> main = config_command(process_local)
+    >>> if __name__ == '__main__':
+    >>>     main()
+
+    :param func: function of the path to configuration file
+    :type func: typing.Callable[[str], typing.Any]
+    :param default: default path to configuration file
+    :type default: str
+    :return: entry point
+    :rtype: typing.Callable
+    """
+    def main(args: typing.Sequence[str] = None):
+        import click
+
+        @logger.catch()
+        @click.command()
+        @click.option('--config', type=click.Path(exists=True), help='path to config file', default=default)
+        def command(config):
+            func(config)
+
+        return command(args)
+
+    main.__doc__ = func.__doc__
+    return main
@@ -1,11 +1,12 @@
 import os
 import yaml
-import click
-import mlflow
 import pathlib
 from loguru import logger
 
 from lean_ds_project_mlflow import ContextualizedDirectory
+from lean_ds_project_mlflow.cli import config_command
+from lean_ds_project_mlflow.artifacts import get_artifact_cache, upload_artifacts
+from lean_ds_project_mlflow.profiling import profile_stage
 
 #UNCOMMENT TO HAVE MLFLOW ACCESS FROM LOCAL MACHINE
 #os.environ['MLFLOW_TRACKING_URI'] = 'http://10.80.20.26:5000'
@@ -35,6 +36,7 @@ def download_local(config_path: str):
         dowload_dataset(fname)
 
 
+@profile_stage('download')
 def download_mlflow(config_path: str, run_id: str=None):
     """
     Download raw data / raw dataset and store it in MLFlow.
@@ -44,26 +46,27 @@ def download_mlflow(config_path: str, run_id: str=None):
     :param run_id: id of MLFlow run, defaults to None
     :type run_id: str, optional
     """    
+    import mlflow
+    from mlflow.tracking import MlflowClient
+
     with open(config_path, 'r') as f:
         config = yaml.safe_load(f)
         experiment_name = config['experiment']
+
+    client = MlflowClient()
+    cache = get_artifact_cache()
     
     with ContextualizedDirectory() as directory:
         fname = directory.raw.joinpath('dataset.csv')
         dowload_dataset(fname)
 
         mlflow.set_experiment(experiment_name)
-        with mlflow.start_run(run_id = run_id):
-            mlflow.log_artifact(fname, artifact_path='raw')
+        with mlflow.start_run(run_id = run_id) as run:
+            upload_artifacts(client, run.info.run_id, [(fname, 'raw/dataset.csv')], cache)
+
 
+main = config_command(download_local)
 
-@logger.catch()
-@click.command()
-@click.option('--config', type=click.Path(exists=True), help='path to config file', default='config/config_local.yml')
-def main(config):
-    download_local(config)
-    #download_mlflow(config, None)
-                
 
 if __name__ == '__main__':
     main()
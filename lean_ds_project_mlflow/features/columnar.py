@@ -0,0 +1,187 @@
+import json
+import typing
+import pathlib
+
+import numpy as np
+import pandas as pd
+
+SCHEMA_FILE = 'schema.json'
+
+
+def column_to_numpy(column: pd.Series) -> np.ndarray:
+    """
+    Convert the column to numpy array. Columns of pandas extension dtypes are converted to numpy dtypes:
+    nullable numbers and booleans to their numpy dtype, or to float64 with NaN if there are missing values,
+    categories to the array of their values, strings to objects with NaN for missing values.
+
+    :param column: column of the dataset
+    :type column: pandas.Series
+    :raises TypeError: the extension dtype has no numpy counterpart (e.g. timezone-aware datetimes, periods)
+    :return: values of the column
+    :rtype: numpy.ndarray
+    """
+    dtype = column.dtype
+    if isinstance(dtype, np.dtype):
+        return column.to_numpy()
+    if isinstance(dtype, pd.CategoricalDtype):
+        return np.asarray(column)
+    if pd.api.types.is_numeric_dtype(dtype) and hasattr(dtype, 'numpy_dtype'):
+        if column.isna().any():
+            return column.to_numpy(dtype=np.float64, na_value=np.nan)
+        return column.to_numpy(dtype=dtype.numpy_dtype)
+    if pd.api.types.is_string_dtype(dtype):
+        return column.to_numpy(dtype=object, na_value=np.nan)
+    raise TypeError(
+        f'Column {column.name!r} of dtype {dtype} can not be stored in columnar format, convert it to a numpy dtype.'
+    )
+
+
+def save_columnar(frame: pd.DataFrame, directory: pathlib.Path) -> dict:
+    """
+    Store the dataset in columnar format: every column is saved to its own .npy file and the schema
+    (names, files and dtypes of the columns, number of rows) is saved to schema.json next to them.
+    Columns of pandas extension dtypes are converted with column_to_numpy. String columns are stored as fixed
+    width unicode arrays, so every column can be memory-mapped, at the cost of size: every value takes the space
+    of the longest one, 4 bytes per character both on disk and in memory. Missing values of a string column are
+    stored as empty strings along with a null mask in its own .npy file, they are restored as NaN on load.
+
+    :param frame: dataset to be stored
+    :type frame: pandas.DataFrame
+    :param directory: directory for the dataset, created if needed
+    :type directory: pathlib.Path
+    :return: schema of the dataset
+    :rtype: dict
+    """
+    directory = pathlib.Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+
+    schema = {'rows': len(frame), 'columns': []}
+    for i, name in enumerate(frame.columns):
+        values = column_to_numpy(frame[name])
+        column = {'name': str(name), 'file': f'{i:04d}.npy'}
+        if values.dtype == object:
+            mask = pd.isna(values)
+            if mask.any():
+                column['mask'] = f'{i:04d}.mask.npy'
+                np.save(directory.joinpath(column['mask']), mask, allow_pickle=False)
+                values = np.where(mask, '', values)
+            values = values.astype(str)
+        np.save(directory.joinpath(column['file']), values, allow_pickle=False)
+        schema['columns'].append(dict(column, dtype=values.dtype.str))
+
+    with open(directory.joinpath(SCHEMA_FILE), 'w') as f:
+        json.dump(schema, f, indent=2)
+    return schema
+
+
+class ColumnarDataset():
+    """
+    Dataset stored with save_columnar. Columns are loaded lazily on access and memory-mapped by
+    default, so only the pages of the columns that are actually read get into memory.
+    """
+    def __init__(self, directory: pathlib.Path, mmap: bool = True):
+        """
+        :param directory: directory of the dataset
+        :type directory: pathlib.Path
+        :param mmap: memory-map the columns instead of reading them into memory
+        :type mmap: bool
+        """
+        self.directory = pathlib.Path(directory)
+        self.mmap = mmap
+        with open(self.directory.joinpath(SCHEMA_FILE), 'r') as f:
+            self.schema = json.load(f)
+        self._files = {column['name']: column['file'] for column in self.schema['columns']}
+        self._masks = {column['name']: column['mask'] for column in self.schema['columns'] if 'mask' in column}
+
+    @property
+    def columns(self) -> typing.List[str]:
+        return list(self._files.keys())
+
+    def __len__(self) -> int:
+        return self.schema['rows']
+
+    def _load(self, fname: str) -> np.ndarray:
+        # empty files can not be memory-mapped
+        mmap_mode = 'r' if self.mmap and len(self) > 0 else None
+        return np.load(self.directory.joinpath(fname), mmap_mode=mmap_mode, allow_pickle=False)
+
+    def _read(self, column: str, start: int = 0, stop: int = None) -> np.ndarray:
+        values = self._load(self._files[column])[start:stop]
+        if column not in self._masks:
+            return values
+        # the column with missing values is restored as object array, the same way pandas reads it
+        values = values.astype(object)
+        values[self._load(self._masks[column])[start:stop]] = np.nan
+        return values
+
+    def __getitem__(self, column: str) -> np.ndarray:
+        return self._read(column)
+
+    def to_frame(self, columns: typing.Sequence[str] = None, start: int = 0, stop: int = None) -> pd.DataFrame:
+        """
+        Read the columns (all by default) in the range of rows into a DataFrame.
+
+        :param columns: columns to be read
+        :type columns: typing.Sequence[str], optional
+        :param start: first row
+        :type start: int
+        :param stop: row after the last one, defaults to the end of the dataset
+        :type stop: int, optional
+        :return: dataset
+        :rtype: pandas.DataFrame
+        """
+        columns = self.columns if columns is None else columns
+        return pd.DataFrame({column: self._read(column, start, stop) for column in columns}, columns=columns)
+
+    def iter_chunks(self, chunk_size: int, columns: typing.Sequence[str] = None,
+                    start: int = 0) -> typing.Iterator[pd.DataFrame]:
+        """
+        Read the dataset in chunks of chunk_size rows.
+
+        :param chunk_size: number of rows in a chunk
+        :type chunk_size: int
+        :param columns: columns to be read, defaults to all
+        :type columns: typing.Sequence[str], optional
+        :param start: first row
+        :type start: int
+        :return: iterator over chunks
+        :rtype: typing.Iterator[pandas.DataFrame]
+        """
+        for offset in range(start, len(self), chunk_size):
+            yield self.to_frame(columns, offset, offset + chunk_size)
+
+
+class FrameDataset(ColumnarDataset):
+    """
+    In-memory dataset with the same interface as ColumnarDataset, used to pass data between
+    the stages without storing it.
+    """
+    def __init__(self, frame: pd.DataFrame):
+        """
+        :param frame: dataset
+        :type frame: pandas.DataFrame
+        """
+        self.frame = frame.reset_index(drop=True)
+        self._arrays = {str(name): column_to_numpy(self.frame[name]) for name in self.frame.columns}
+        self.schema = {
+            'rows': len(self.frame),
+            'columns': [{'name': name, 'dtype': values.dtype.str} for name, values in self._arrays.items()],
+        }
+        self._files = {name: name for name in self._arrays}
+
+    def _read(self, column: str, start: int = 0, stop: int = None) -> np.ndarray:
+        return self._arrays[column][start:stop]
+
+
+def load_columnar(directory: pathlib.Path, mmap: bool = True) -> ColumnarDataset:
+    """
+    Open the dataset stored with save_columnar.
+
+    :param directory: directory of the dataset
+    :type directory: pathlib.Path
+    :param mmap: memory-map the columns instead of reading them into memory
+    :type mmap: bool
+    :return: dataset
+    :rtype: ColumnarDataset
+    """
+    return ColumnarDataset(directory, mmap=mmap)
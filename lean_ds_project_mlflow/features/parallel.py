@@ -0,0 +1,57 @@
+import os
+import typing
+import collections
+import concurrent.futures
+
+
+def get_n_jobs(n_jobs: typing.Optional[int]) -> int:
+    """
+    Number of worker processes: None or non-positive value means all the CPUs.
+
+    :param n_jobs: configured number of workers
+    :type n_jobs: typing.Optional[int]
+    :return: number of workers
+    :rtype: int
+    """
+    if n_jobs is None or n_jobs <= 0:
+        return os.cpu_count() or 1
+    return n_jobs
+
+
+def map_partitions(func: typing.Callable, partitions: typing.Iterable, n_jobs: int = 1,
+                   initializer: typing.Callable = None, initargs: tuple = ()) -> typing.Iterator:
+    """
+    Apply func to every partition in a process pool and yield the results in the original order.
+    Only a bounded number of partitions is submitted at once, so the partitions can be read lazily
+    (e.g. chunks of pandas.read_csv) without loading the whole dataset. With n_jobs equal to 1
+    the partitions are processed serially in the current process.
+
+    :param func: picklable function applied to every partition
+    :type func: typing.Callable
+    :param partitions: partitions of the dataset
+    :type partitions: typing.Iterable
+    :param n_jobs: number of worker processes
+    :type n_jobs: int
+    :param initializer: picklable function called once in every worker before the partitions, defaults to None
+    :type initializer: typing.Callable, optional
+    :param initargs: arguments of the initializer
+    :type initargs: tuple
+    :return: results in the order of partitions
+    :rtype: typing.Iterator
+    """
+    n_jobs = get_n_jobs(n_jobs)
+    if n_jobs == 1:
+        if initializer is not None:
+            initializer(*initargs)
+        yield from map(func, partitions)
+        return
+
+    with concurrent.futures.ProcessPoolExecutor(max_workers=n_jobs, initializer=initializer,
+                                                initargs=initargs) as pool:
+        pending = collections.deque()
+        for partition in partitions:
+            pending.append(pool.submit(func, partition))
+            if len(pending) >= 2 * n_jobs:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
@@ -1,12 +1,16 @@
 import os
+import time
 import yaml
-import click
-import joblib
-import mlflow
+import typing
+import pandas as pd
 
 from loguru import logger
-from mlflow.tracking import MlflowClient
 from lean_ds_project_mlflow import ContextualizedDirectory
+from lean_ds_project_mlflow.cli import config_command
+from lean_ds_project_mlflow.artifacts import get_artifact_cache, download_artifacts, upload_artifacts
+from lean_ds_project_mlflow.profiling import profile_stage
+from lean_ds_project_mlflow.features.parallel import map_partitions
+from lean_ds_project_mlflow.lifecycle.fingerprint import StageFingerprint
 
 #UNCOMMENT TO HAVE MLFLOW ACCESS FROM LOCAL MACHINE
 #os.environ['MLFLOW_TRACKING_URI'] = 'http://10.80.20.26:5000'
@@ -14,20 +18,93 @@ from lean_ds_project_mlflow import ContextualizedDirectory
 #MLFLOW_RUN_ID = 'bfedefdd118c4959aab41c7cb296378e'
 
 
-def process_dataset(raw_dataset_path: str, processed_dataset_path: str):
+def clean_chunk(chunk):
+    """
+    Cleaning of a chunk of raw dataset. Rows are cleaned independently from each other, so the
+    function can be applied to the dataset chunk by chunk. Missing values are NaN or empty strings, the
+    latter when the fields are read as raw strings by process_dataset.
+
+    :param chunk: chunk of raw dataset
+    :type chunk: pandas.DataFrame
+    :return: cleaned chunk
+    :rtype: pandas.DataFrame
+    """
+    return chunk[~(chunk.isna() | chunk.eq('')).all(axis=1)]
+
+
+def read_raw_chunks(raw_dataset_path: str, chunk_size: int = 100000) -> typing.Iterator[pd.DataFrame]:
+    """
+    Read the raw dataset in chunks of chunk_size rows. Fields are read as strings and missing values are
+    kept as empty strings, so the values are not altered by type inference of a chunk (e.g. 3 written as 3.0
+    in a chunk with a missing value, leading zeros dropped) and are written back unchanged.
+
+    :param raw_dataset_path: path to raw dataset
+    :type raw_dataset_path: str
+    :param chunk_size: number of rows in a chunk
+    :type chunk_size: int
+    :return: iterator over chunks
+    :rtype: typing.Iterator[pandas.DataFrame]
+    """
+    return pd.read_csv(raw_dataset_path, chunksize=chunk_size, dtype=str, keep_default_na=False)
+
+
+def read_raw_header(raw_dataset_path: str) -> pd.DataFrame:
+    """
+    Read the columns of the raw dataset without rows, for datasets that have only the header.
+
+    :param raw_dataset_path: path to raw dataset
+    :type raw_dataset_path: str
+    :return: empty dataset
+    :rtype: pandas.DataFrame
+    """
+    return pd.read_csv(raw_dataset_path, nrows=0, dtype=str)
+
+
+def process_dataset(raw_dataset_path: str, processed_dataset_path: str, chunk_size: int = 100000,
+                    n_jobs: int = 1) -> int:
     """
     Preprocessing phase (primarily, the cleaning phase and adaptation of raw data for the experiments). 
     The data that comes from this phase can be transformed in a sense, that is is ready to be used with different
-    models.
+    models. The raw dataset is read and cleaned in chunks of chunk_size rows, so the memory usage does not
+    depend on the size of the dataset. With n_jobs > 1 the chunks are cleaned in parallel and written in
+    the original order, the output is identical to the serial one. Fields are written back unchanged,
+    see read_raw_chunks.
 
     :param raw_dataset_path: path to raw dataset
     :type raw_dataset_path: str
     :param processed_dataset_path: path to processed dataset to be stored
     :type processed_dataset_path: str
-    """    
-    with open(raw_dataset_path, 'r') as f_s:
-        with open(processed_dataset_path, 'w') as f_d:
-            f_d.write(f_s.read())
+    :param chunk_size: number of rows processed at once
+    :type chunk_size: int
+    :param n_jobs: number of worker processes, non-positive value means all the CPUs
+    :type n_jobs: int
+    :return: number of rows in processed dataset
+    :rtype: int
+    """
+    started_at = time.monotonic()
+    rows_read, rows_written = 0, 0
+
+    def read_chunks():
+        nonlocal rows_read
+        for chunk in read_raw_chunks(raw_dataset_path, chunk_size):
+            rows_read += len(chunk)
+            yield chunk
+
+    with open(processed_dataset_path, 'w', newline='') as f_d:
+        for i, cleaned in enumerate(map_partitions(clean_chunk, read_chunks(), n_jobs)):
+            cleaned.to_csv(f_d, header=i == 0, index=False)
+            rows_written += len(cleaned)
+
+        if f_d.tell() == 0:
+            # the raw dataset has no rows, only the header is to be written
+            read_raw_header(raw_dataset_path).to_csv(f_d, index=False)
+
+    elapsed = time.monotonic() - started_at
+    logger.info(
+        f'Processed {rows_read} rows ({rows_written} kept) in {elapsed:.2f}s, '
+        f'{rows_read / max(elapsed, 1e-9):.0f} rows/s.'
+    )
+    return rows_written
 
 
 def process_local(config_path: str):
@@ -38,12 +115,18 @@ def process_local(config_path: str):
     :param config_path: path to configuration file
     :type config_path: str
     """    
+    with open(config_path, 'r') as f:
+        config = yaml.safe_load(f)
+        chunk_size = config['dataset']['chunk_size']
+        n_jobs = config['dataset']['n_jobs']
+
     with ContextualizedDirectory() as directory:
         raw_dataset_path = directory.raw.joinpath('dataset.csv')
         processed_dataset_path = directory.interim.joinpath('dataset.csv')
-        process_dataset(raw_dataset_path, processed_dataset_path)
+        process_dataset(raw_dataset_path, processed_dataset_path, chunk_size, n_jobs)
 
 
+@profile_stage('process')
 def process_mlflow(config_path: str, run_id: str):
     """
     Run preprocessing phase on the files, which are stored in MLFlow. All the intermediate results
@@ -54,11 +137,18 @@ def process_mlflow(config_path: str, run_id: str):
     :param run_id: id of run
     :type run_id: str
     """        
+    import mlflow
+    from mlflow.tracking import MlflowClient
+
     with open(config_path, 'r') as f:
         config = yaml.safe_load(f)
         experiment_name = config['experiment']
+        chunk_size = config['dataset']['chunk_size']
+        n_jobs = config['dataset']['n_jobs']
+        reuse_stages = config.get('pipeline', {}).get('reuse_stages', False)
 
     client = MlflowClient()
+    cache = get_artifact_cache()
 
     with ContextualizedDirectory() as directory:
         raw_dataset_path = directory.raw.joinpath('dataset.csv')
@@ -66,18 +156,21 @@ def process_mlflow(config_path: str, run_id: str):
         
         mlflow.set_experiment(experiment_name)
         with mlflow.start_run(run_id=run_id) as run:
-            client.download_artifacts(run.info.run_id, 'raw/dataset.csv', directory.data)
-            process_dataset(raw_dataset_path, processed_dataset_path)
-            mlflow.log_artifact(processed_dataset_path, 'interim')
-
-
-@logger.catch()
-@click.command()
-@click.option('--config', type=click.Path(exists=True), help='path to config file', default='config/config_local.yml')
-def main(config):
-    process_local(config)
-    #process_mlflow(config, MLFLOW_RUN_ID)
-           
+            stage = StageFingerprint(
+                client, run.info.run_id, 'process', ['raw/dataset.csv'], ['interim/dataset.csv'],
+                params={'chunk_size': chunk_size}, enabled=reuse_stages
+            )
+            if stage.reuse(directory.data, cache) is not None:
+                return
+
+            download_artifacts(client, run.info.run_id, ['raw/dataset.csv'], directory.data, cache)
+            process_dataset(raw_dataset_path, processed_dataset_path, chunk_size, n_jobs)
+            upload_artifacts(client, run.info.run_id, [(processed_dataset_path, 'interim/dataset.csv')], cache)
+            stage.record()
+
+
+main = config_command(process_local)
+
 
 if __name__ == '__main__':
     main()
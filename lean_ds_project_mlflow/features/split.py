@@ -1,36 +1,162 @@
 import os
 import yaml
-import click
-import joblib
-import mlflow
+import typing
+import hashlib
+import numpy as np
+import pandas as pd
 
 from loguru import logger
-from mlflow.tracking import MlflowClient
 from lean_ds_project_mlflow import ContextualizedDirectory
+from lean_ds_project_mlflow.cli import config_command
+from lean_ds_project_mlflow.artifacts import get_artifact_cache, download_artifacts, upload_artifacts
+from lean_ds_project_mlflow.profiling import profile_stage
+from lean_ds_project_mlflow.lifecycle.fingerprint import StageFingerprint
 
 
-def split_dataset(processed_dataset_path: str, split_ratio: float, seed: int) -> tuple:
+def _hash_key(seed: int) -> str:
+    return hashlib.md5(str(seed).encode()).hexdigest()[:16]
+
+
+def uniform_hash(values: pd.Series, seed: int) -> np.ndarray:
+    """
+    Map values to [0, 1) with a seeded hash. The result depends only on the values and the seed,
+    so it is the same across runs and machines.
+
+    :param values: values to be hashed
+    :type values: pandas.Series
+    :param seed: fixed random seed
+    :type seed: int
+    :return: array of floats in [0, 1)
+    :rtype: numpy.ndarray
+    """
+    hashes = pd.util.hash_pandas_object(values, index=False, hash_key=_hash_key(seed)).to_numpy()
+    # 53 most significant bits are exactly representable as float64
+    return (hashes >> np.uint64(11)).astype(np.float64) / float(1 << 53)
+
+
+def assign_validation(chunk: pd.DataFrame, offset: int, split_ratio: float, seed: int,
+                      key_column: str = None, stratify_column: str = None,
+                      strata_counts: dict = None) -> np.ndarray:
+    """
+    Decide which rows of the chunk belong to the validation subset.
+
+    Without stratification a row goes to validation if the seeded hash of its key (or of its index in the
+    dataset) is less than split_ratio. With stratification every stratum is split exactly in split_ratio
+    proportion: k-th row of the stratum goes to validation if floor(k * ratio + o) increases, where o is
+    the seeded hash of the stratum. strata_counts keeps the number of rows seen in every stratum between
+    the chunks and is updated in place.
+
+    :param chunk: chunk of the dataset
+    :type chunk: pandas.DataFrame
+    :param offset: index of the first row of the chunk in the dataset
+    :type offset: int
+    :param split_ratio: the share of validation data in dataset
+    :type split_ratio: float
+    :param seed: fixed random seed
+    :type seed: int
+    :param key_column: column used for the assignment instead of the row index, defaults to None
+    :type key_column: str, optional
+    :param stratify_column: column to stratify the split on, defaults to None
+    :type stratify_column: str, optional
+    :param strata_counts: number of rows seen in every stratum, required for stratification
+    :type strata_counts: dict, optional
+    :return: boolean mask of validation rows
+    :rtype: numpy.ndarray
+    """
+    if stratify_column is None:
+        if key_column is None:
+            keys = pd.Series(np.arange(offset, offset + len(chunk), dtype=np.int64))
+        else:
+            keys = chunk[key_column].astype(str).reset_index(drop=True)
+        return uniform_hash(keys, seed) < split_ratio
+
+    strata = chunk[stratify_column].astype(str).reset_index(drop=True)
+    unique_strata = pd.Series(strata.unique())
+    stratum_offsets = pd.Series(uniform_hash(unique_strata, seed), index=unique_strata)
+
+    k = strata.map(strata_counts).fillna(0).to_numpy() + strata.groupby(strata).cumcount().to_numpy() + 1
+    o = strata.map(stratum_offsets).to_numpy()
+    for stratum, count in strata.value_counts().items():
+        strata_counts[stratum] = strata_counts.get(stratum, 0) + count
+
+    return np.floor(k * split_ratio + o) > np.floor((k - 1) * split_ratio + o)
+
+
+def split_chunks(chunks: typing.Iterable[pd.DataFrame], split_ratio: float, seed: int, key_column: str = None,
+                 stratify_column: str = None) -> typing.Iterator[typing.Tuple[pd.DataFrame, pd.DataFrame]]:
+    """
+    Split consecutive chunks of the dataset to tuning and validation rows, see assign_validation.
+    The assignment does not depend on the size of the chunks.
+
+    :param chunks: chunks of the dataset in order
+    :type chunks: typing.Iterable[pandas.DataFrame]
+    :param split_ratio: the share of validation data in dataset
+    :type split_ratio: float
+    :param seed: fixed random seed
+    :type seed: int
+    :param key_column: column used for the assignment instead of the row index, defaults to None
+    :type key_column: str, optional
+    :param stratify_column: column to stratify the split on, defaults to None
+    :type stratify_column: str, optional
+    :return: iterator over tuning and validation rows of every chunk
+    :rtype: typing.Iterator[typing.Tuple[pandas.DataFrame, pandas.DataFrame]]
+    """
+    strata_counts = dict()
+    offset = 0
+    for chunk in chunks:
+        mask = assign_validation(chunk, offset, split_ratio, seed, key_column, stratify_column, strata_counts)
+        offset += len(chunk)
+        yield chunk[~mask], chunk[mask]
+
+
+def split_dataset(processed_dataset_path: str, tune_dataset_path: str, val_dataset_path: str,
+                  split_ratio: float, seed: int, key_column: str = None, stratify_column: str = None,
+                  chunk_size: int = 100000) -> tuple:
     """
     Split dataset to tuning and validation subsets. tuning dataset is to be used for model selection, hyperparameter tuning
     and model tranining. Validation dataset is reserved for final validation.
 
+    The dataset is read once in chunks and both subsets are written incrementally, so the memory usage
+    does not depend on the size of the dataset. The assignment of the rows is deterministic, see assign_validation.
+    Fields are read as strings and written back unchanged, as in process_dataset, so the rows of the subsets
+    are the rows of the dataset whatever the chunk_size is.
+
     :param processed_dataset_path: path to processed dataset
     :type processed_dataset_path: str
-    :param split_ratio: the share of tranining data in dataset
+    :param tune_dataset_path: path to tuning dataset to be stored
+    :type tune_dataset_path: str
+    :param val_dataset_path: path to validation dataset to be stored
+    :type val_dataset_path: str
+    :param split_ratio: the share of validation data in dataset
     :type split_ratio: float
     :param seed: fixed random seed
     :type seed: int
-    :return: tuning and validation dataset
+    :param key_column: column used for the assignment instead of the row index, defaults to None
+    :type key_column: str, optional
+    :param stratify_column: column to stratify the split on, defaults to None
+    :type stratify_column: str, optional
+    :param chunk_size: number of rows read at once
+    :type chunk_size: int
+    :return: number of rows in tuning and validation dataset
     :rtype: tuple
     """
-    dataset = None
-    with open(processed_dataset_path, 'r') as f_s:
-        dataset = f_s.read()
+    tune_rows, val_rows = 0, 0
+
+    with open(tune_dataset_path, 'w', newline='') as f_tune, open(val_dataset_path, 'w', newline='') as f_val:
+        chunks = pd.read_csv(processed_dataset_path, chunksize=chunk_size, dtype=str, keep_default_na=False)
+        for i, (tune, validation) in enumerate(split_chunks(chunks, split_ratio, seed, key_column, stratify_column)):
+            tune.to_csv(f_tune, header=i == 0, index=False)
+            validation.to_csv(f_val, header=i == 0, index=False)
+            tune_rows += len(tune)
+            val_rows += len(validation)
 
-    tune_dataset = dataset
-    val_dataset = dataset
+        if f_tune.tell() == 0:
+            header = pd.read_csv(processed_dataset_path, nrows=0, dtype=str)
+            header.to_csv(f_tune, index=False)
+            header.to_csv(f_val, index=False)
 
-    return tune_dataset, val_dataset
+    logger.info(f'Dataset of {tune_rows + val_rows} rows is split to {tune_rows} tuning and {val_rows} validation rows.')
+    return tune_rows, val_rows
 
 
 def split_local(config_path: str):
@@ -47,6 +173,9 @@ def split_local(config_path: str):
 
         seed = config['dataset']['seed']
         validate_ratio = config['dataset']['validate']
+        key_column = config['dataset'].get('key_column')
+        stratify_column = config['dataset'].get('stratify_column')
+        chunk_size = config['dataset']['chunk_size']
     
     with ContextualizedDirectory() as directory:
         processed_dataset_path = directory.interim.joinpath('dataset.csv')
@@ -54,12 +183,13 @@ def split_local(config_path: str):
         tune_dataset_path = directory.interim.joinpath('dataset_tune.csv')
         val_dataset_path = directory.interim.joinpath('dataset_validate.csv')
         
-        tune_split, val_split = split_dataset(processed_dataset_path, validate_ratio, seed)
-
-        open(tune_dataset_path, 'w').write(tune_split)
-        open(val_dataset_path, 'w').write(val_split)
+        split_dataset(
+            processed_dataset_path, tune_dataset_path, val_dataset_path, validate_ratio, seed,
+            key_column=key_column, stratify_column=stratify_column, chunk_size=chunk_size
+        )
 
 
+@profile_stage('split')
 def split_mlflow(config_path: str, run_id: str):
     """
     Split preprocessed dataset, that is stored in MLFlow. All the intermediate results
@@ -70,14 +200,22 @@ def split_mlflow(config_path: str, run_id: str):
     :param run_id: id of run
     :type run_id: str
     """
+    import mlflow
+    from mlflow.tracking import MlflowClient
+
     with open(config_path, 'r') as f:
         config = yaml.safe_load(f)
         
         experiment_name = config['experiment']
         seed = config['dataset']['seed']
         validate_ratio = config['dataset']['validate']
+        key_column = config['dataset'].get('key_column')
+        stratify_column = config['dataset'].get('stratify_column')
+        chunk_size = config['dataset']['chunk_size']
+        reuse_stages = config.get('pipeline', {}).get('reuse_stages', False)
 
     client = MlflowClient()
+    cache = get_artifact_cache()
 
     with ContextualizedDirectory() as directory:
         processed_dataset_path = directory.interim.joinpath('dataset.csv')
@@ -87,22 +225,32 @@ def split_mlflow(config_path: str, run_id: str):
 
         mlflow.set_experiment(experiment_name)
         with mlflow.start_run(run_id=run_id) as run:
-            client.download_artifacts(run.info.run_id, 'interim/dataset.csv', directory.data)
-            tune_split, val_split = split_dataset(processed_dataset_path, validate_ratio, seed)
+            stage = StageFingerprint(
+                client, run.info.run_id, 'split', ['interim/dataset.csv'],
+                ['interim/dataset_tune.csv', 'interim/dataset_validate.csv'],
+                params={
+                    'seed': seed, 'validate': validate_ratio, 'key_column': key_column,
+                    'stratify_column': stratify_column, 'chunk_size': chunk_size,
+                },
+                enabled=reuse_stages
+            )
+            if stage.reuse(directory.data, cache) is not None:
+                return
 
-            open(tune_dataset_path, 'w').write(tune_split)
-            open(val_dataset_path, 'w').write(val_split)
+            download_artifacts(client, run.info.run_id, ['interim/dataset.csv'], directory.data, cache)
+            split_dataset(
+                processed_dataset_path, tune_dataset_path, val_dataset_path, validate_ratio, seed,
+                key_column=key_column, stratify_column=stratify_column, chunk_size=chunk_size
+            )
 
-            mlflow.log_artifact(tune_dataset_path, 'interim')
-            mlflow.log_artifact(val_dataset_path, 'interim')
+            upload_artifacts(client, run.info.run_id, [
+                (tune_dataset_path, 'interim/dataset_tune.csv'),
+                (val_dataset_path, 'interim/dataset_validate.csv'),
+            ], cache)
+            stage.record()
 
 
-@logger.catch()
-@click.command()
-@click.option('--config', type=click.Path(exists=True), help='path to config file', default='config/config_local.yml')
-def main(config):
-    split_local(config)
-    #split_mlflow(config, MLFLOW_RUN_ID)
+main = config_command(split_local)
 
 
 if __name__ == '__main__':
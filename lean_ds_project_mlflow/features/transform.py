@@ -1,12 +1,16 @@
 import os
 import yaml
-import click
-import joblib
-import mlflow
+import numpy as np
+import pandas as pd
 
 from loguru import logger
-from mlflow.tracking import MlflowClient
 from lean_ds_project_mlflow import ContextualizedDirectory
+from lean_ds_project_mlflow.cli import config_command
+from lean_ds_project_mlflow.artifacts import get_artifact_cache, download_artifacts, upload_artifacts
+from lean_ds_project_mlflow.profiling import profile_stage
+from lean_ds_project_mlflow.lifecycle.fingerprint import StageFingerprint
+from lean_ds_project_mlflow.features.parallel import map_partitions
+from lean_ds_project_mlflow.features.columnar import save_columnar
 
 #UNCOMMENT TO HAVE MLFLOW ACCESS FROM LOCAL MACHINE
 #os.environ['MLFLOW_TRACKING_URI'] = 'http://10.80.20.26:5000'
@@ -14,41 +18,116 @@ from lean_ds_project_mlflow import ContextualizedDirectory
 #MLFLOW_RUN_ID = 'bfedefdd118c4959aab41c7cb296378e'
 
 
-def transform_dataset(processed_dataset_path: str):
+def transform_chunk(chunk):
     """
-    Apply dataset transformations for specific model
+    Apply model specific transformations to a chunk of processed dataset. Rows are transformed
+    independently from each other, so the function can be applied to the dataset chunk by chunk.
+
+    :param chunk: chunk of processed dataset
+    :type chunk: pandas.DataFrame
+    :return: transformed chunk
+    :rtype: pandas.DataFrame
+    """
+    return chunk
+
+
+def cast_columns(frame):
+    """
+    Convert the fields read as strings to the types of the columns: empty fields are missing values,
+    columns whose values are all numbers become numeric, the others are kept as strings. The types are
+    decided on the whole dataset at once, so they do not depend on how the dataset is chunked.
+
+    :param frame: dataset with all the fields read as strings
+    :type frame: pandas.DataFrame
+    :return: dataset with typed columns
+    :rtype: pandas.DataFrame
+    """
+    columns = dict()
+    for name in frame.columns:
+        column = frame[name].astype(object)
+        column = column.where(column.ne(''), np.nan)
+        columns[name] = column
+        if len(column) == 0:
+            # there are no values to decide the type from, pandas.read_csv keeps such columns as strings
+            continue
+        try:
+            columns[name] = pd.to_numeric(column)
+        except (ValueError, TypeError):
+            pass
+    return pd.DataFrame(columns, index=frame.index, columns=frame.columns)
+
+
+def transform_frame(frame, chunk_size: int = 100000, n_jobs: int = 1):
+    """
+    Cast the columns of the dataset read as strings (see cast_columns) and apply transform_chunk to its
+    chunks of chunk_size rows, with n_jobs > 1 the chunks are transformed in parallel and concatenated
+    in the original order.
+
+    :param frame: dataset with all the fields read as strings
+    :type frame: pandas.DataFrame
+    :param chunk_size: number of rows transformed at once
+    :type chunk_size: int
+    :param n_jobs: number of worker processes, non-positive value means all the CPUs
+    :type n_jobs: int
+    :return: transformed dataset
+    :rtype: pandas.DataFrame
+    """
+    frame = cast_columns(frame)
+    chunks = [frame.iloc[offset:offset + chunk_size] for offset in range(0, len(frame), chunk_size)]
+    results = list(map_partitions(transform_chunk, chunks, n_jobs))
+    if not results:
+        return transform_chunk(frame)
+    return pd.concat(results, ignore_index=True)
+
+
+def transform_dataset(processed_dataset_path: str, chunk_size: int = 100000, n_jobs: int = 1):
+    """
+    Apply dataset transformations for specific model. The fields are read as strings, as in the process and
+    split stages, and the types are decided once for the whole dataset, so the transformed dataset
+    does not depend on chunk_size (see transform_frame).
 
     :param processed_dataset_path: path to the processed dataset
     :type processed_dataset_path: str
-    :return: transformed dataset of any type
-    """    
-    with open(processed_dataset_path, 'r') as f:
-        return f.read() + ' transformed '
+    :param chunk_size: number of rows transformed at once
+    :type chunk_size: int
+    :param n_jobs: number of worker processes, non-positive value means all the CPUs
+    :type n_jobs: int
+    :return: transformed dataset
+    :rtype: pandas.DataFrame
+    """
+    frame = pd.read_csv(processed_dataset_path, dtype=str, keep_default_na=False)
+    return transform_frame(frame, chunk_size, n_jobs)
 
 
 def transform_local(config_path: str):
     """
     Run data transformation phase on the processed dataset, that is stored on local filesystem. 
     The source dataset is assumed to be stored in /data/interim, and the transformed datased is to be
-    stored in /data/processed folder.
+    stored in /data/processed folder in columnar format (see features/columnar.py).
 
     :param config_path: path to configuration file
     :type config_path: str
     """    
+    with open(config_path, 'r') as f:
+        config = yaml.safe_load(f)
+        chunk_size = config['dataset']['chunk_size']
+        n_jobs = config['dataset']['n_jobs']
+
     with ContextualizedDirectory() as directory:
         tuning_dataset_path = directory.interim.joinpath('dataset_tune.csv')
         validation_dataset_path = directory.interim.joinpath('dataset_validate.csv')
 
-        tuning_dataset_path_transformed = directory.processed.joinpath('dataset_tune.bin')
-        validation_dataset_path_transformed = directory.processed.joinpath('dataset_validate.bin')
+        tuning_dataset_path_transformed = directory.processed.joinpath('dataset_tune')
+        validation_dataset_path_transformed = directory.processed.joinpath('dataset_validate')
         
-        tuning_transformed = transform_dataset(tuning_dataset_path)
-        validation_transformed = transform_dataset(validation_dataset_path)
+        tuning_transformed = transform_dataset(tuning_dataset_path, chunk_size, n_jobs)
+        validation_transformed = transform_dataset(validation_dataset_path, chunk_size, n_jobs)
 
-        joblib.dump(tuning_transformed, tuning_dataset_path_transformed)
-        joblib.dump(validation_transformed, validation_dataset_path_transformed)
+        save_columnar(tuning_transformed, tuning_dataset_path_transformed)
+        save_columnar(validation_transformed, validation_dataset_path_transformed)
 
 
+@profile_stage('transform')
 def transform_mlflow(config_path: str, run_id: str):
     """
     Run transformation phase on the dataset, that is stored in MLFlow. All the intermediate results
@@ -59,41 +138,55 @@ def transform_mlflow(config_path: str, run_id: str):
     :param run_id: id of run
     :type run_id: str
     """    
+    import mlflow
+    from mlflow.tracking import MlflowClient
+
     with open(config_path, 'r') as f:
         config = yaml.safe_load(f)
         experiment_name = config['experiment']
+        chunk_size = config['dataset']['chunk_size']
+        n_jobs = config['dataset']['n_jobs']
+        reuse_stages = config.get('pipeline', {}).get('reuse_stages', False)
 
     client = MlflowClient()
+    cache = get_artifact_cache()
 
     with ContextualizedDirectory() as directory:
         tuning_dataset_path = directory.interim.joinpath('dataset_tune.csv')
         validation_dataset_path = directory.interim.joinpath('dataset_validate.csv')
 
-        tuning_dataset_path_transformed = directory.processed.joinpath('dataset_tune.bin')
-        validation_dataset_path_transformed = directory.processed.joinpath('dataset_validate.bin')
+        tuning_dataset_path_transformed = directory.processed.joinpath('dataset_tune')
+        validation_dataset_path_transformed = directory.processed.joinpath('dataset_validate')
 
         mlflow.set_experiment(experiment_name)
         with mlflow.start_run(run_id=run_id) as run:
-            client.download_artifacts(run.info.run_id, 'interim/dataset_tune.csv', directory.data)
-            client.download_artifacts(run.info.run_id, 'interim/dataset_validate.csv', directory.data)
+            stage = StageFingerprint(
+                client, run.info.run_id, 'transform', ['interim/dataset_tune.csv', 'interim/dataset_validate.csv'],
+                ['processed/dataset_tune', 'processed/dataset_validate'],
+                params={'chunk_size': chunk_size}, enabled=reuse_stages
+            )
+            if stage.reuse(directory.data, cache) is not None:
+                return
+
+            download_artifacts(
+                client, run.info.run_id, ['interim/dataset_tune.csv', 'interim/dataset_validate.csv'], directory.data, cache
+            )
+
+            tuning_transformed = transform_dataset(tuning_dataset_path, chunk_size, n_jobs)
+            validation_transformed = transform_dataset(validation_dataset_path, chunk_size, n_jobs)
 
-            tuning_transformed = transform_dataset(tuning_dataset_path)
-            validation_transformed = transform_dataset(validation_dataset_path)
+            save_columnar(tuning_transformed, tuning_dataset_path_transformed)
+            save_columnar(validation_transformed, validation_dataset_path_transformed)
 
-            joblib.dump(tuning_transformed, tuning_dataset_path_transformed)
-            joblib.dump(validation_transformed, validation_dataset_path_transformed)
+            upload_artifacts(client, run.info.run_id, [
+                (tuning_dataset_path_transformed, 'processed/dataset_tune'),
+                (validation_dataset_path_transformed, 'processed/dataset_validate'),
+            ], cache)
+            stage.record()
 
-            mlflow.log_artifact(tuning_dataset_path_transformed, 'processed')
-            mlflow.log_artifact(validation_dataset_path_transformed, 'processed')
 
+main = config_command(transform_local)
 
-@logger.catch()
-@click.command()
-@click.option('--config', type=click.Path(exists=True), help='path to config file', default='config/config_local.yml')
-def main(config):
-    transform_local(config)
-    #transform_mlflow(config, MLFLOW_RUN_ID)
-                
 
 if __name__ == '__main__':
     main()
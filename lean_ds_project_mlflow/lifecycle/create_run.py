@@ -1,9 +1,10 @@
 import yaml
-import mlflow
 
 def create_run(config_path: str):
+    import mlflow
+
     with open(config_path, 'r') as f:
-        config = yaml.load(f)
+        config = yaml.safe_load(f)
         
         experiment_name = config['experiment']
         code_version = config['version']
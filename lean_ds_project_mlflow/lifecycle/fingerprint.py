@@ -0,0 +1,137 @@
+import json
+import typing
+import hashlib
+import pathlib
+
+from loguru import logger
+
+from lean_ds_project_mlflow.cache import LocalCache
+from lean_ds_project_mlflow.artifacts import CHECKSUM_TAG, download_artifacts, upload_artifacts
+
+FINGERPRINT_TAG = 'fingerprint.{stage}'
+
+
+def stage_fingerprint(stage: str, input_checksums: typing.Dict[str, str], params: typing.Dict[str, typing.Any],
+                      code_version: str) -> str:
+    """
+    Fingerprint of the stage: hash of the checksums of its input artifacts, the config values it depends on
+    and the version of the code.
+
+    :param stage: name of the stage
+    :type stage: str
+    :param input_checksums: checksums of the input artifacts
+    :type input_checksums: typing.Dict[str, str]
+    :param params: config values the stage depends on
+    :type params: typing.Dict[str, typing.Any]
+    :param code_version: version of the code
+    :type code_version: str
+    :return: hex digest
+    :rtype: str
+    """
+    payload = json.dumps({
+        'stage': stage,
+        'inputs': input_checksums,
+        'params': params,
+        'code': code_version,
+    }, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+class StageFingerprint():
+    """
+    Skips the stage of the pipeline if a previous run has already executed it with the same fingerprint:
+    the outputs of that run are copied to the current one instead.
+
+    Checksums of the inputs are taken from the tags that upload_artifacts sets for every logged artifact,
+    the version of the code is the "code" param logged by create_run.
+
+    >>> stage = StageFingerprint(client, run_id, 'process', ['raw/dataset.csv'], ['interim/dataset.csv'], params)
+    >>> if stage.reuse(directory.data, cache) is None:
+    >>>     ...  # run the stage
+    >>>     stage.record()
+    """
+    def __init__(self, client, run_id: str, stage: str, inputs: typing.Sequence[str], outputs: typing.Sequence[str],
+                 params: typing.Dict[str, typing.Any] = None, enabled: bool = True):
+        """
+        :param client: MLFlow client
+        :type client: MlflowClient
+        :param run_id: id of the current run
+        :type run_id: str
+        :param stage: name of the stage
+        :type stage: str
+        :param inputs: artifact paths of the inputs
+        :type inputs: typing.Sequence[str]
+        :param outputs: artifact paths of the outputs
+        :type outputs: typing.Sequence[str]
+        :param params: config values the stage depends on
+        :type params: typing.Dict[str, typing.Any], optional
+        :param enabled: if False, the stage is never skipped, but the fingerprint is still recorded
+        :type enabled: bool
+        """
+        self.client = client
+        self.run_id = run_id
+        self.stage = stage
+        self.outputs = outputs
+        self.enabled = enabled
+
+        run = client.get_run(run_id)
+        self.experiment_id = run.info.experiment_id
+        checksums = {path: run.data.tags.get(CHECKSUM_TAG.format(path=path)) for path in inputs}
+
+        missing = [path for path, checksum in checksums.items() if checksum is None]
+        if missing:
+            logger.info(f'Checksums of {missing} are unknown, stage {stage} can not be fingerprinted.')
+            self.fingerprint = None
+        else:
+            self.fingerprint = stage_fingerprint(stage, checksums, params or {}, run.data.params.get('code'))
+
+    def find(self):
+        """
+        Find the latest previous run with the same fingerprint of the stage.
+
+        :return: run or None
+        :rtype: typing.Optional[mlflow.entities.Run]
+        """
+        if self.fingerprint is None:
+            return None
+
+        tag = FINGERPRINT_TAG.format(stage=self.stage)
+        runs = self.client.search_runs(
+            experiment_ids=[self.experiment_id],
+            filter_string=f"tags.`{tag}` = '{self.fingerprint}'",
+            order_by=['attributes.start_time DESC'],
+            max_results=2,
+        )
+        return next((run for run in runs if run.info.run_id != self.run_id), None)
+
+    def reuse(self, directory: pathlib.Path, cache: LocalCache = None):
+        """
+        Copy the outputs of the previous run with the same fingerprint to the current run.
+
+        :param directory: local directory for the copied artifacts
+        :type directory: pathlib.Path
+        :param cache: artifact cache, defaults to None
+        :type cache: LocalCache, optional
+        :return: previous run or None if the stage has to be executed
+        :rtype: typing.Optional[mlflow.entities.Run]
+        """
+        if not self.enabled:
+            return None
+
+        previous = self.find()
+        if previous is None:
+            return None
+
+        previous_id = previous.info.run_id
+        local_paths = download_artifacts(self.client, previous_id, self.outputs, directory, cache)
+        upload_artifacts(self.client, self.run_id, list(zip(local_paths, self.outputs)), cache)
+        self.record()
+        logger.info(f'Stage {self.stage} is unchanged since run {previous_id}, its outputs are reused.')
+        return previous
+
+    def record(self):
+        """
+        Record the fingerprint of the successfully finished stage in the current run.
+        """
+        if self.fingerprint is not None:
+            self.client.set_tag(self.run_id, FINGERPRINT_TAG.format(stage=self.stage), self.fingerprint)
@@ -1,24 +1,248 @@
 import os
+import json
+import time
+import uuid
 import yaml
 import typing
-import requests
+import pathlib
+import tempfile
+import concurrent.futures
 
 from loguru import logger
 
-def submit_metrics(config_path, metrics: typing.Dict[str, float]):
+# statuses meaning that the service did not record the metric, such requests are retried and spooled
+UNPROCESSED_STATUSES = (429, 503)
+DEFAULT_SPOOL_PATH = os.path.join(tempfile.gettempdir(), 'lean_ds_project_mlflow', 'metrics_spool.jsonl')
+
+
+def is_unsent(error: Exception) -> bool:
+    """
+    Check if the failed request did not reach the service: the connection was not established or the
+    service rejected the request without recording it. Resending such a request can not duplicate the metric,
+    unlike the one that timed out or lost the connection after being sent.
+
+    :param error: exception raised by requests
+    :type error: Exception
+    :return: True if the request can be safely resent
+    :rtype: bool
+    """
+    import requests
+    from urllib3.exceptions import ConnectTimeoutError, MaxRetryError, NewConnectionError
+
+    if isinstance(error, requests.ConnectTimeout):
+        return True
+    if isinstance(error, requests.HTTPError):
+        return error.response is not None and error.response.status_code in UNPROCESSED_STATUSES
+    if not isinstance(error, requests.ConnectionError):
+        return False
+    reason = error.args[0] if error.args else None
+    if isinstance(reason, MaxRetryError):
+        reason = reason.reason
+    return isinstance(reason, (NewConnectionError, ConnectTimeoutError))
+
+
+def is_alive(pid: int) -> bool:
+    if pid == os.getpid():
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class MetricsClient():
+    """
+    Client of the metrics tracking service. Every metric is posted to {uri}/train_validation, at most
+    max_workers at once, through one session with a pool of keep-alive connections. Failed connections
+    and requests rejected with 429 and 503 statuses are retried with exponential backoff.
+
+    Metrics that did not reach the service are appended to the spool file and resent by the next submit.
+    Metrics whose request failed after it was sent (read timeout, other error statuses) may have been recorded,
+    they are reported as failed but not spooled, so replaying the spool never duplicates a metric.
+    """
+    def __init__(self, uri: str, timeout: float = 10, retries: int = 3, backoff: float = 0.5,
+                 max_workers: int = 8, spool_path: str = DEFAULT_SPOOL_PATH):
+        """
+        :param uri: uri of the metrics tracking service
+        :type uri: str
+        :param timeout: connect and read timeout of a request in seconds
+        :type timeout: float
+        :param retries: number of retries of a failed request
+        :type retries: int
+        :param backoff: backoff factor of the retries in seconds
+        :type backoff: float
+        :param max_workers: number of concurrent requests
+        :type max_workers: int
+        :param spool_path: file for the metrics that failed to be sent
+        :type spool_path: str
+        """
+        # requests is imported by the client, so importing the lifecycle package by the stages does not load it
+        import requests
+        from requests.adapters import HTTPAdapter
+        from urllib3.util.retry import Retry
+
+        self.uri = uri.rstrip('/')
+        self.timeout = timeout
+        self.max_workers = max_workers
+        self.spool_path = pathlib.Path(spool_path)
+
+        # read and other errors are not retried, the request may have been recorded already
+        retry = Retry(
+            total=retries, read=False, other=False, backoff_factor=backoff,
+            status_forcelist=UNPROCESSED_STATUSES, allowed_methods=frozenset(['POST']), raise_on_status=False,
+        )
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_workers, max_retries=retry)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    def close(self):
+        self.session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, type, value, traceback):
+        self.close()
+
+    def _post_one(self, model: str, metric: str, value: float):
+        response = self.session.post(f'{self.uri}/train_validation', params={
+            'model': model,
+            'metric': metric,
+            'value': value
+        }, timeout=self.timeout)
+        response.raise_for_status()
+        logger.info(response.content)
+
+    def _post_each(self, model: str, metrics: typing.Dict[str, float]) -> typing.Tuple[dict, dict]:
+        import requests
+
+        failed, unsent = dict(), dict()
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            futures = {pool.submit(self._post_one, model, metric, value): metric for metric, value in metrics.items()}
+            for future in concurrent.futures.as_completed(futures):
+                metric = futures[future]
+                try:
+                    future.result()
+                except requests.RequestException as e:
+                    failed[metric] = metrics[metric]
+                    if is_unsent(e):
+                        logger.warning(f'Unable to submit metric {metric} of model {model}: {e!r}')
+                        unsent[metric] = metrics[metric]
+                    else:
+                        logger.error(
+                            f'Metric {metric} of model {model} may have been recorded ({e!r}), '
+                            'it is not spooled to avoid a duplicate.'
+                        )
+        return failed, unsent
+
+    def submit(self, model: str, metrics: typing.Dict[str, float]) -> typing.Dict[str, float]:
+        """
+        Send the metrics of the model, the ones that did not reach the service are spooled.
+
+        :param model: name of the model
+        :type model: str
+        :param metrics: metrics
+        :type metrics: typing.Dict[str, float]
+        :return: metrics that failed to be sent
+        :rtype: typing.Dict[str, float]
+        """
+        if not metrics:
+            return dict()
+
+        failed, unsent = self._post_each(model, metrics)
+        self.spool(model, unsent)
+        return failed
+
+    def spool(self, model: str, metrics: typing.Dict[str, float]):
+        """
+        Append the metrics to the spool file.
+
+        :param model: name of the model
+        :type model: str
+        :param metrics: metrics
+        :type metrics: typing.Dict[str, float]
+        """
+        if not metrics:
+            return
+        self.spool_path.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.spool_path, 'a') as f:
+            f.write(json.dumps({'model': model, 'metrics': metrics, 'timestamp': time.time()}) + '\n')
+        logger.warning(f'{len(metrics)} metrics of model {model} are spooled to {self.spool_path}.')
+
+    def _take_spooled(self) -> typing.List[pathlib.Path]:
+        # the spool file and the files taken by the processes that crashed while resending them ({name}.{pid}.*)
+        candidates = [self.spool_path]
+        for path in self.spool_path.parent.glob(f'{self.spool_path.name}.*'):
+            pid = path.name[len(self.spool_path.name) + 1:].split('.')[0]
+            if pid.isdigit() and not is_alive(int(pid)):
+                candidates.append(path)
+
+        taken = []
+        for path in candidates:
+            target = self.spool_path.with_name(f'{self.spool_path.name}.{os.getpid()}.{uuid.uuid4().hex[:8]}')
+            try:
+                # taking over is atomic, every file is resent by one process only
+                os.replace(path, target)
+            except FileNotFoundError:
+                continue
+            taken.append(target)
+        return taken
+
+    def resend_spooled(self) -> int:
+        """
+        Resend the spooled metrics. The spool file is taken over before sending, so the metrics that
+        fail again are spooled anew. Files left by a process that crashed while resending are taken over as well,
+        the entries which were resent are removed from the taken file one by one.
+
+        :return: number of metrics that were sent
+        :rtype: int
+        """
+        sent = 0
+        for taken in self._take_spooled():
+            with open(taken, 'r') as f:
+                entries = [json.loads(line) for line in f if line.strip()]
+            for i, entry in enumerate(entries):
+                sent += len(entry['metrics']) - len(self.submit(entry['model'], entry['metrics']))
+                with open(taken, 'w') as f:
+                    f.writelines(json.dumps(rest) + '\n' for rest in entries[i + 1:])
+            taken.unlink()
+        if sent:
+            logger.info(f'{sent} spooled metrics are submitted.')
+        return sent
+
+
+def submit_metrics(config_path: str, metrics: typing.Dict[str, float]) -> typing.Dict[str, float]:
+    """
+    Submit validation metrics of the model to the metrics tracking service (METRICS_TRACKING_URI
+    environment variable), the metrics spooled by the previous runs are resent first.
+
+    :param config_path: path to configuration file
+    :type config_path: str
+    :param metrics: metrics
+    :type metrics: typing.Dict[str, float]
+    :return: metrics that failed to be sent
+    :rtype: typing.Dict[str, float]
+    """
     with open(config_path, 'r') as f:
-        config = yaml.load(f)
-        
+        config = yaml.safe_load(f)
+
         service_name = config['service']
-    
+        submit_config = config.get('submit_metrics', {})
+
     # this variable should be accessible from airflow instance
     metrics_uri = os.getenv('METRICS_TRACKING_URI')
-    
-    for metric in metrics.keys():
-        result = requests.post(metrics_uri+'/train_validation', params={
-            'model': service_name,
-            'metric': metric,
-            'value': metrics[metric]
-        })
-        
-        logger.info(result.content)
+
+    with MetricsClient(
+        metrics_uri,
+        timeout=submit_config.get('timeout_s', 10),
+        retries=submit_config.get('retries', 3),
+        backoff=submit_config.get('backoff_s', 0.5),
+        max_workers=submit_config.get('max_workers', 8),
+        spool_path=submit_config.get('spool_path') or DEFAULT_SPOOL_PATH,
+    ) as client:
+        client.resend_spooled()
+        return client.submit(service_name, metrics)
@@ -1,12 +1,10 @@
 import os
 import json
 import yaml
-import click
-import mlflow
-import mlflow.pyfunc
 
 from loguru import logger
 from lean_ds_project_mlflow import ContextualizedDirectory
+from lean_ds_project_mlflow.cli import config_command
 
 def upload_local_model_mlflow(config_path):
     """
@@ -15,6 +13,9 @@ def upload_local_model_mlflow(config_path):
     :param config_path: path to configuration file
     :type config_path: str
     """    
+    import mlflow
+    import mlflow.pyfunc
+
     with open(config_path, 'r') as f:
         config = yaml.safe_load(f)
         experiment_name = config['experiment']
@@ -42,11 +43,8 @@ def upload_local_model_mlflow(config_path):
                 registered_model_name=experiment_name
             )
 
-@logger.catch()
-@click.command()
-@click.option('--config', type=click.Path(exists=True), help='path to config file', default='config/config_local.yml')
-def main(config):
-    upload_local_model_mlflow(config)
+main = config_command(upload_local_model_mlflow)
+
 
 if __name__ == '__main__':
     main()
@@ -0,0 +1,169 @@
+import time
+import typing
+
+import numpy as np
+
+from loguru import logger
+
+# number of elements of the resampled arrays held in memory at once during bootstrap
+BOOTSTRAP_BLOCK_ELEMENTS = 10_000_000
+
+
+def broadcast_predictions(predictions, rows: int) -> np.ndarray:
+    """
+    Convert the result of model.predict to an array with one prediction per row. Scalar predictions
+    (like the ones returned by the template model) are broadcast to all the rows.
+
+    :param predictions: result of model.predict
+    :param rows: number of rows passed to the model
+    :type rows: int
+    :return: predictions
+    :rtype: numpy.ndarray
+    """
+    predictions = np.asarray(predictions)
+    if predictions.ndim == 0:
+        return np.full(rows, predictions.item())
+    if predictions.ndim != 1:
+        # (n, 1) predictions would broadcast against (n,) true values to an (n, n) comparison
+        raise ValueError(f'Model returned predictions of shape {predictions.shape}, expected one per row.')
+    if len(predictions) != rows:
+        raise ValueError(f'Model returned {len(predictions)} predictions for {rows} rows.')
+    return predictions
+
+
+def predict_in_batches(model, dataset, batch_size: int = 100000,
+                       columns: typing.Sequence[str] = None) -> np.ndarray:
+    """
+    Run model.predict over the dataset once, batch by batch, so that only one batch of the features
+    is held in memory.
+
+    :param model: model with predict(model_input) method
+    :param dataset: dataset
+    :type dataset: ColumnarDataset
+    :param batch_size: number of rows in a batch
+    :type batch_size: int
+    :param columns: feature columns, defaults to all
+    :type columns: typing.Sequence[str], optional
+    :return: predictions, one per row
+    :rtype: numpy.ndarray
+    """
+    started = time.perf_counter()
+    batches = []
+    for batch in dataset.iter_chunks(batch_size, columns=columns):
+        batches.append(broadcast_predictions(model.predict(batch), len(batch)))
+
+    duration = time.perf_counter() - started
+    logger.info(f'Predicted {len(dataset)} rows in {duration:.1f} s, {len(dataset) / max(duration, 1e-9):.0f} rows/s.')
+    return np.concatenate(batches) if batches else np.empty(0)
+
+
+# Every metric reduces the last axis, so the same function scores a single (n,) sample
+# and a block of (resamples, n) bootstrap samples at once. The macro averages are taken over
+# labels, the true and predicted values of the whole sample, so that every bootstrap resample
+# is scored over the same classes and a class missing from a resample counts as 0.
+
+def get_labels(y_true: np.ndarray, y_pred: np.ndarray) -> np.ndarray:
+    return np.union1d(y_true, y_pred)
+
+
+def accuracy(y_true: np.ndarray, y_pred: np.ndarray, labels: np.ndarray = None) -> np.ndarray:
+    return np.mean(y_true == y_pred, axis=-1)
+
+
+def _per_class(y_true: np.ndarray, y_pred: np.ndarray, labels: np.ndarray = None):
+    if labels is None:
+        labels = get_labels(y_true, y_pred)
+    for label in labels:
+        actual, predicted = y_true == label, y_pred == label
+        tp = np.sum(actual & predicted, axis=-1)
+        yield tp, np.sum(predicted, axis=-1), np.sum(actual, axis=-1)
+
+
+def _ratio(numerator: np.ndarray, denominator: np.ndarray) -> np.ndarray:
+    return np.divide(numerator, denominator, out=np.zeros(np.shape(numerator)), where=denominator > 0)
+
+
+def precision_macro(y_true: np.ndarray, y_pred: np.ndarray, labels: np.ndarray = None) -> np.ndarray:
+    return np.mean([_ratio(tp, predicted) for tp, predicted, _ in _per_class(y_true, y_pred, labels)], axis=0)
+
+
+def recall_macro(y_true: np.ndarray, y_pred: np.ndarray, labels: np.ndarray = None) -> np.ndarray:
+    return np.mean([_ratio(tp, actual) for tp, _, actual in _per_class(y_true, y_pred, labels)], axis=0)
+
+
+def f1_macro(y_true: np.ndarray, y_pred: np.ndarray, labels: np.ndarray = None) -> np.ndarray:
+    return np.mean([
+        _ratio(2 * tp, predicted + actual) for tp, predicted, actual in _per_class(y_true, y_pred, labels)
+    ], axis=0)
+
+
+METRICS = {
+    'accuracy': accuracy,
+    'precision_macro': precision_macro,
+    'recall_macro': recall_macro,
+    'f1_macro': f1_macro,
+}
+
+
+def compute_metrics(y_true: np.ndarray, y_pred: np.ndarray, metrics: typing.Sequence[str]) -> typing.Dict[str, float]:
+    """
+    Compute the metrics from the true values and the predictions.
+
+    :param y_true: true values
+    :type y_true: numpy.ndarray
+    :param y_pred: predictions
+    :type y_pred: numpy.ndarray
+    :param metrics: names of the metrics, keys of METRICS
+    :type metrics: typing.Sequence[str]
+    :return: metrics
+    :rtype: typing.Dict[str, float]
+    """
+    unknown = set(metrics) - set(METRICS)
+    if unknown:
+        raise ValueError(f'Unknown metrics {unknown}, expected a subset of {list(METRICS)}.')
+    labels = get_labels(y_true, y_pred)
+    return {name: float(METRICS[name](y_true, y_pred, labels)) for name in metrics}
+
+
+def bootstrap_intervals(y_true: np.ndarray, y_pred: np.ndarray, metrics: typing.Sequence[str],
+                        n_resamples: int = 1000, confidence: float = 0.95,
+                        seed: int = 42) -> typing.Dict[str, typing.Tuple[float, float]]:
+    """
+    Percentile bootstrap confidence intervals of the metrics. Resamples are drawn and scored as
+    (resamples, rows) blocks, the size of a block is bounded by BOOTSTRAP_BLOCK_ELEMENTS.
+
+    :param y_true: true values
+    :type y_true: numpy.ndarray
+    :param y_pred: predictions
+    :type y_pred: numpy.ndarray
+    :param metrics: names of the metrics, keys of METRICS
+    :type metrics: typing.Sequence[str]
+    :param n_resamples: number of bootstrap resamples
+    :type n_resamples: int
+    :param confidence: confidence level of the intervals
+    :type confidence: float
+    :param seed: fixed random seed
+    :type seed: int
+    :return: lower and upper bounds of every metric
+    :rtype: typing.Dict[str, typing.Tuple[float, float]]
+    """
+    rows = len(y_true)
+    if rows == 0 or n_resamples <= 0:
+        return dict()
+
+    labels = get_labels(y_true, y_pred)
+    rng = np.random.default_rng(seed)
+    block = max(1, BOOTSTRAP_BLOCK_ELEMENTS // rows)
+    samples = {name: [] for name in metrics}
+    for start in range(0, n_resamples, block):
+        indices = rng.integers(0, rows, size=(min(block, n_resamples - start), rows))
+        resampled_true, resampled_pred = y_true[indices], y_pred[indices]
+        for name in metrics:
+            samples[name].append(METRICS[name](resampled_true, resampled_pred, labels))
+
+    alpha = (1 - confidence) / 2
+    intervals = dict()
+    for name, values in samples.items():
+        low, high = np.quantile(np.concatenate(values), [alpha, 1 - alpha])
+        intervals[name] = (float(low), float(high))
+    return intervals
@@ -0,0 +1,187 @@
+import os
+import json
+import time
+import yaml
+import click
+import typing
+import pathlib
+import functools
+import itertools
+
+import pandas as pd
+
+from loguru import logger
+from lean_ds_project_mlflow.features.parallel import map_partitions
+from lean_ds_project_mlflow.models.evaluation import broadcast_predictions
+from lean_ds_project_mlflow.models.registry import get_model_cache, load_model_uri, load_registered_model
+
+PROGRESS_SUFFIX = '.progress'
+PREDICTION_COLUMN = 'prediction'
+
+# model of the worker process, loaded once by _init_worker
+_worker = dict()
+
+
+def read_chunks(path: pathlib.Path, chunk_size: int, skip_chunks: int = 0) -> typing.Iterator[pd.DataFrame]:
+    """
+    Read CSV or Parquet (by the extension of the file) in chunks of chunk_size rows. Reading Parquet
+    requires pyarrow.
+
+    :param path: path to input file
+    :type path: pathlib.Path
+    :param chunk_size: number of rows in a chunk
+    :type chunk_size: int
+    :param skip_chunks: number of chunks to skip from the start of the file
+    :type skip_chunks: int
+    :return: iterator over chunks
+    :rtype: typing.Iterator[pandas.DataFrame]
+    """
+    path = pathlib.Path(path)
+    if path.suffix.lower() in ('.parquet', '.pq'):
+        try:
+            import pyarrow.parquet as pq
+        except ImportError as e:
+            raise ImportError('Reading Parquet input requires pyarrow to be installed.') from e
+        chunks = (batch.to_pandas() for batch in pq.ParquetFile(path).iter_batches(batch_size=chunk_size))
+    else:
+        chunks = pd.read_csv(path, chunksize=chunk_size)
+
+    # skipped chunks are parsed and dropped: rows can not be skipped by lines, a quoted CSV field may span
+    # several of them, and chunks of the same file are always the same
+    yield from itertools.islice(chunks, skip_chunks, None)
+
+
+def _init_worker(model_uri: str, version: typing.Optional[str]):
+    # forked workers inherit the model resolved by predict_file
+    if _worker.get('uri') != model_uri:
+        _worker.update(model=load_model_uri(model_uri, get_model_cache()), version=version, uri=model_uri)
+
+
+def _predict_chunk(chunk: pd.DataFrame, keep_columns: bool = False) -> pd.DataFrame:
+    predictions = broadcast_predictions(_worker['model'].predict(chunk), len(chunk))
+    result = chunk.reset_index(drop=True) if keep_columns else pd.DataFrame(index=pd.RangeIndex(len(chunk)))
+    result[PREDICTION_COLUMN] = predictions
+    return result
+
+
+def read_progress(output_path: pathlib.Path, input_path: pathlib.Path, chunk_size: int) -> dict:
+    """
+    Read the progress of the interrupted run. The progress is valid only for the same input and chunk size,
+    the model it was scored with is checked by predict_file.
+
+    :return: number of written chunks and rows, size of the output file after them
+    :rtype: dict
+    """
+    progress_path = pathlib.Path(f'{output_path}{PROGRESS_SUFFIX}')
+    empty = {'input': str(input_path), 'chunk_size': chunk_size, 'chunks': 0, 'rows': 0, 'bytes': 0}
+    if not progress_path.exists() or not pathlib.Path(output_path).exists():
+        return empty
+
+    with open(progress_path, 'r') as f:
+        progress = json.load(f)
+    if progress.get('input') != str(input_path) or progress.get('chunk_size') != chunk_size:
+        logger.warning(f'Progress file {progress_path} belongs to another input or chunk size, starting over.')
+        return empty
+    return progress
+
+
+def write_progress(output_path: pathlib.Path, progress: dict):
+    progress_path = pathlib.Path(f'{output_path}{PROGRESS_SUFFIX}')
+    tmp_path = progress_path.with_name(progress_path.name + '.tmp')
+    with open(tmp_path, 'w') as f:
+        json.dump(progress, f)
+    os.replace(tmp_path, progress_path)
+
+
+def predict_file(input_path: str, output_path: str, name: str, stage: str, chunk_size: int = 100000,
+                 n_jobs: int = 1, keep_columns: bool = False) -> int:
+    """
+    Score the input file with the latest version of the registered model in the stage. The version is
+    resolved once and all the chunks are scored by it. The input is read in chunks that are predicted in
+    a process pool (the model is loaded once per worker process) and written to the output CSV in the
+    input order.
+
+    After every chunk the number of written chunks and the size of the output are stored in the progress
+    file next to the output ({output}.progress) along with the version of the model. A restarted run
+    truncates the output to the last completed chunk and continues from the next one. It refuses to resume
+    if the stage has another version of the model now. The progress file is removed on success.
+
+    :param input_path: path to input CSV or Parquet file
+    :type input_path: str
+    :param output_path: path to output CSV file
+    :type output_path: str
+    :param name: name of the registered model
+    :type name: str
+    :param stage: stage of the model
+    :type stage: str
+    :param chunk_size: number of rows in a chunk
+    :type chunk_size: int
+    :param n_jobs: number of worker processes, 0 means all the CPUs
+    :type n_jobs: int
+    :param keep_columns: write the input columns along with the predictions
+    :type keep_columns: bool
+    :return: number of scored rows
+    :rtype: int
+    """
+    input_path, output_path = pathlib.Path(input_path).resolve(), pathlib.Path(output_path)
+    model, version, model_uri = load_registered_model(name, stage, cache=get_model_cache())
+    _worker.update(model=model, version=version, uri=model_uri)
+
+    progress = read_progress(output_path, input_path, chunk_size)
+    if progress['chunks']:
+        previous = progress.get('model_version'), progress.get('model_uri')
+        if (previous[0] != version) or (version is None and previous[1] != model_uri):
+            raise ValueError(
+                f'Output {output_path} is partially scored by model {name} version {previous[0]} ({previous[1]}), '
+                f'but the stage {stage} has version {version} ({model_uri}) now. Remove the output and '
+                f'{output_path}{PROGRESS_SUFFIX} to start over.'
+            )
+        logger.info(f'Resuming from chunk {progress["chunks"]}, {progress["rows"]} rows are already scored.')
+    progress.update(model_version=version, model_uri=model_uri)
+
+    started = time.perf_counter()
+    rows = 0
+    chunks = read_chunks(input_path, chunk_size, skip_chunks=progress['chunks'])
+    with open(output_path, 'a+b') as f:
+        # drop the chunk that was being written when the previous run was interrupted
+        f.truncate(progress['bytes'])
+        for result in map_partitions(functools.partial(_predict_chunk, keep_columns=keep_columns), chunks, n_jobs,
+                                     initializer=_init_worker, initargs=(model_uri, version)):
+            f.write(result.to_csv(header=progress['bytes'] == 0, index=False).encode())
+            f.flush()
+            os.fsync(f.fileno())
+
+            rows += len(result)
+            progress.update(chunks=progress['chunks'] + 1, rows=progress['rows'] + len(result), bytes=f.tell())
+            write_progress(output_path, progress)
+
+    pathlib.Path(f'{output_path}{PROGRESS_SUFFIX}').unlink(missing_ok=True)
+    duration = time.perf_counter() - started
+    logger.info(f'Scored {rows} rows in {duration:.1f} s, {rows / max(duration, 1e-9):.0f} rows/s, '
+                f'{progress["rows"]} rows in total are written to {output_path}.')
+    return rows
+
+
+@logger.catch()
+@click.command()
+@click.option('--config', type=click.Path(exists=True), help='path to config file', default='config/config_local.yml')
+@click.option('--input', 'input_path', type=click.Path(exists=True), required=True, help='input CSV or Parquet file')
+@click.option('--output', 'output_path', type=click.Path(), required=True, help='output CSV file')
+@click.option('--chunk-size', type=int, default=None, help='number of rows in a chunk')
+@click.option('--n-jobs', type=int, default=None, help='number of worker processes, 0 means all the CPUs')
+@click.option('--keep-columns', is_flag=True, help='write the input columns along with the predictions')
+def main(config, input_path, output_path, chunk_size, n_jobs, keep_columns):
+    with open(config, 'r') as f:
+        config = yaml.safe_load(f)
+    batch_config = config.get('batch_inference', {})
+
+    predict_file(
+        input_path, output_path, config['service'], config['working_stage'],
+        chunk_size=chunk_size or batch_config.get('chunk_size', 100000),
+        n_jobs=batch_config.get('n_jobs', 0) if n_jobs is None else n_jobs,
+        keep_columns=keep_columns,
+    )
+
+
+if __name__ == '__main__':
+    main()
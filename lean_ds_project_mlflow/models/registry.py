@@ -0,0 +1,158 @@
+import os
+import typing
+
+from loguru import logger
+
+from lean_ds_project_mlflow.cache import LocalCache
+
+
+def get_model_cache() -> typing.Optional[LocalCache]:
+    """
+    Model cache configured with MODEL_CACHE_DIR and MODEL_CACHE_SIZE_MB environment variables.
+
+    :return: cache or None if MODEL_CACHE_DIR is not set
+    :rtype: typing.Optional[LocalCache]
+    """
+    directory = os.getenv('MODEL_CACHE_DIR')
+    if not directory:
+        return None
+    return LocalCache(directory, max_size_mb=float(os.getenv('MODEL_CACHE_SIZE_MB', 2048)))
+
+
+def get_latest_version(name: str, stage: str) -> typing.Optional[str]:
+    """
+    Get the latest version of the registered model in the given stage.
+
+    :param name: name of the registered model
+    :type name: str
+    :param stage: stage of the model (Staging, Production...)
+    :type stage: str
+    :return: version of the model or None if there is no model in the stage
+    :rtype: typing.Optional[str]
+    """
+    from mlflow.tracking import MlflowClient
+
+    versions = MlflowClient().get_latest_versions(name, stages=[stage])
+    if not versions:
+        return None
+    return max(versions, key=lambda version: int(version.version)).version
+
+
+def load_model_version(name: str, version: str, cache: LocalCache = None, stage: str = None):
+    """
+    Load the version of the registered model. With the cache, the model is downloaded only once and
+    every subsequent load reuses the unpacked copy. The model is loaded while the cache entry is leased,
+    the returned uri points to the registry, so the entry may be evicted afterwards (see load_model_uri).
+
+    :param name: name of the registered model
+    :type name: str
+    :param version: version of the model
+    :type version: str
+    :param cache: local model cache, defaults to None
+    :type cache: LocalCache, optional
+    :param stage: stage the version was resolved from, stored in the cache to be used when registry is unavailable
+    :type stage: str, optional
+    :return: model and its registry uri (models:/name/version)
+    :rtype: tuple
+    """
+    import mlflow.pyfunc
+    from mlflow.tracking.artifact_utils import _download_artifact_from_uri
+
+    model_uri = f'models:/{name}/{version}'
+    if cache is None:
+        return mlflow.pyfunc.load_model(model_uri=model_uri), model_uri
+
+    key = f'models/{name}/{version}'
+    with cache.acquire(key, verify=True) as path:
+        if path is not None:
+            logger.info(f'Model {name} version {version} is found in the local cache.')
+            return mlflow.pyfunc.load_model(model_uri=str(path)), model_uri
+
+    with cache.staging() as staging:
+        local_path = _download_artifact_from_uri(model_uri, output_path=str(staging))
+        cache.put(key, local_path, meta={'name': name, 'version': version, 'stage': stage})
+
+    with cache.acquire(key) as path:
+        return mlflow.pyfunc.load_model(model_uri=str(path)), model_uri
+
+
+def load_model_uri(model_uri: str, cache: LocalCache = None):
+    """
+    Load the model by uri. Registry uris of a version (models:/name/version) go through the cache like
+    load_model_version does, so a worker that loads the model later never reads a cache entry
+    that has been evicted in the meantime.
+
+    :param model_uri: uri returned by load_model_version or load_registered_model
+    :type model_uri: str
+    :param cache: local model cache, defaults to None
+    :type cache: LocalCache, optional
+    :return: model
+    """
+    import mlflow.pyfunc
+
+    parts = model_uri.split('/')
+    if model_uri.startswith('models:/') and len(parts) == 3 and parts[2].isdigit():
+        return load_model_version(parts[1], parts[2], cache=cache)[0]
+    return mlflow.pyfunc.load_model(model_uri=model_uri)
+
+
+def load_cached_model(name: str, stage: str, cache: LocalCache):
+    """
+    Load the latest cached version of the model that was resolved from the given stage. Used when
+    the model registry is not available.
+
+    :return: model, version and uri or None if there is no such model in the cache
+    :rtype: typing.Optional[tuple]
+    """
+    import mlflow.pyfunc
+
+    versions = [
+        manifest['meta']['version'] for manifest in cache.manifests()
+        if manifest['meta'].get('name') == name and manifest['meta'].get('stage') == stage
+    ]
+    for version in sorted(versions, key=int, reverse=True):
+        with cache.acquire(f'models/{name}/{version}', verify=True) as path:
+            if path is not None:
+                return mlflow.pyfunc.load_model(model_uri=str(path)), version, f'models:/{name}/{version}'
+    return None
+
+
+def load_registered_model(name: str, stage: str, cache: LocalCache = None, fallback_uri: str = '/models'):
+    """
+    Load the latest version of the registered model in the stage. If the registry is not available,
+    the latest cached version is used, and the model stored in fallback_uri otherwise.
+
+    :param name: name of the registered model
+    :type name: str
+    :param stage: stage of the model
+    :type stage: str
+    :param cache: local model cache, defaults to None
+    :type cache: LocalCache, optional
+    :param fallback_uri: uri of the model to be used when neither registry nor cache are available
+    :type fallback_uri: str
+    :return: model, version (None for the fallback model) and uri
+    :rtype: tuple
+    """
+    import mlflow.pyfunc
+
+    try:
+        logger.info('Trying to load model from MLFLow...')
+        version = get_latest_version(name, stage)
+        if version is None:
+            raise LookupError(f'There is no version of model {name} in stage {stage}.')
+        model, model_uri = load_model_version(name, version, cache=cache, stage=stage)
+        logger.info(f'Model from MLFlow has been loaded, version {version}.')
+        return model, version, model_uri
+    except Exception as e:
+        logger.info("Unable to load model from MLFlow due to following reason,")
+        logger.exception(e)
+
+    if cache is not None:
+        cached = load_cached_model(name, stage, cache)
+        if cached is not None:
+            logger.info(f'Cached model has been loaded, version {cached[1]}.')
+            return cached
+
+    model = mlflow.pyfunc.load_model(model_uri=fallback_uri)
+    logger.info('Local model has been loaded.')
+    return model, None, fallback_uri
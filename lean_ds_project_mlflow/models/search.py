@@ -0,0 +1,356 @@
+import math
+import time
+import random
+import typing
+import itertools
+import collections
+import concurrent.futures
+
+import numpy as np
+import pandas as pd
+
+from loguru import logger
+from lean_ds_project_mlflow.features.split import uniform_hash
+from lean_ds_project_mlflow.features.parallel import get_n_jobs
+from lean_ds_project_mlflow.features.columnar import FrameDataset
+
+STRATEGIES = ('grid', 'random', 'halving')
+
+Trial = collections.namedtuple('Trial', ['number', 'params', 'resource', 'score', 'duration'])
+
+# datasets and functions of the worker process, set once by _init_worker instead of being pickled with every trial
+_worker = dict()
+
+
+def expand_grid(space: typing.Dict[str, typing.Any]) -> typing.List[dict]:
+    """
+    All the combinations of the parameter values. A parameter given as a range (dict with low and high)
+    is not supported by the grid, a parameter given as a scalar is fixed.
+
+    :param space: search space, parameter name to the list of its values
+    :type space: typing.Dict[str, typing.Any]
+    :return: candidates
+    :rtype: typing.List[dict]
+    """
+    names = sorted(space)
+    values = []
+    for name in names:
+        if isinstance(space[name], dict):
+            raise ValueError(f'Parameter {name} is a range, grid search requires the list of its values.')
+        values.append(space[name] if isinstance(space[name], list) else [space[name]])
+    return [dict(zip(names, combination)) for combination in itertools.product(*values)]
+
+
+def sample_space(space: typing.Dict[str, typing.Any], n_trials: int, seed: int) -> typing.List[dict]:
+    """
+    Random candidates. A parameter given as a list is sampled uniformly from its values, a parameter given
+    as a range {low, high, log, integer} is sampled uniformly (or log-uniformly) from the range.
+
+    :param space: search space
+    :type space: typing.Dict[str, typing.Any]
+    :param n_trials: number of candidates
+    :type n_trials: int
+    :param seed: fixed random seed
+    :type seed: int
+    :return: candidates
+    :rtype: typing.List[dict]
+    """
+    rng = random.Random(seed)
+
+    def sample(value):
+        if isinstance(value, list):
+            return rng.choice(value)
+        if not isinstance(value, dict):
+            return value
+        low, high = value['low'], value['high']
+        if value.get('log', False):
+            result = math.exp(rng.uniform(math.log(low), math.log(high)))
+        else:
+            result = rng.uniform(low, high)
+        return int(round(result)) if value.get('integer', False) else result
+
+    return [{name: sample(space[name]) for name in sorted(space)} for _ in range(n_trials)]
+
+
+def holdout_split(frame: pd.DataFrame, holdout: float, seed: int) -> typing.Tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    Split the tune dataset into the part the candidates are trained on and the holdout they are scored on.
+    The assignment is the seeded hash of the row index, so it is the same for all the candidates and runs.
+
+    :param frame: tune dataset
+    :type frame: pandas.DataFrame
+    :param holdout: share of the holdout rows
+    :type holdout: float
+    :param seed: fixed random seed
+    :type seed: int
+    :return: train and holdout datasets
+    :rtype: typing.Tuple[pandas.DataFrame, pandas.DataFrame]
+    """
+    mask = uniform_hash(pd.Series(np.arange(len(frame))), seed) < holdout
+    return frame[~mask].reset_index(drop=True), frame[mask].reset_index(drop=True)
+
+
+def subsample(frame: pd.DataFrame, resource: float, seed: int) -> pd.DataFrame:
+    """
+    Seeded random subsample of the resource share of the rows, the rows keep their order. The subsample
+    is the beginning of a fixed permutation of the rows, so it is the same for all the candidates of a round
+    of successive halving and the subsample of a larger share contains the one of a smaller share.
+
+    :param frame: dataset
+    :type frame: pandas.DataFrame
+    :param resource: share of the rows
+    :type resource: float
+    :param seed: fixed random seed
+    :type seed: int
+    :return: subsample
+    :rtype: pandas.DataFrame
+    """
+    rows = max(1, int(round(len(frame) * resource)))
+    if rows >= len(frame):
+        return frame
+    order = np.random.default_rng(seed).permutation(len(frame))[:rows]
+    return frame.iloc[np.sort(order)]
+
+
+def _init_worker(fit: typing.Callable, score: typing.Callable, train_frame: pd.DataFrame,
+                 holdout_frame: pd.DataFrame, seed: int):
+    _worker.update(fit=fit, score=score, train=train_frame, holdout=FrameDataset(holdout_frame), seed=seed)
+
+
+def _evaluate(params: dict, resource: float) -> typing.Tuple[float, float]:
+    started = time.perf_counter()
+    clr = _worker['fit'](FrameDataset(subsample(_worker['train'], resource, _worker['seed'])), params)
+    score = _worker['score'](_worker['holdout'], clr)
+    return score, time.perf_counter() - started
+
+
+class HyperparameterSearch():
+    """
+    Search for the parameters of the model that score best on the holdout part of the tune dataset.
+    Candidates are trained in parallel in a process pool, the datasets are sent to every worker once.
+
+    Strategies:
+
+    * grid - all the combinations of the values of the search space;
+    * random - n_trials candidates sampled from the search space;
+    * halving - successive halving: n_trials random candidates are trained on a random min_resource share
+      of the rows (see subsample), the best 1 / halving_factor of them are trained again on halving_factor times more rows
+      and so on until the whole dataset is used.
+
+    Grid and random search stop early if the best score has not improved during early_stopping_rounds trials.
+    All the strategies stop submitting candidates once budget_s seconds are spent.
+
+    >>> search = HyperparameterSearch(strategy='random', space={'alpha': {'low': 0.01, 'high': 1, 'log': True}})
+    >>> best = search.run(dataset, train, score, on_trial=log_trial(client, experiment_id, run_id))
+    """
+    def __init__(self, strategy: str, space: typing.Dict[str, typing.Any], n_trials: int = 20, n_jobs: int = 0,
+                 holdout: float = 0.2, budget_s: float = None, early_stopping_rounds: int = None,
+                 halving_factor: int = 3, min_resource: float = 0.1, seed: int = 42):
+        """
+        :param strategy: one of STRATEGIES
+        :type strategy: str
+        :param space: search space, parameter name to the list of its values or to a range {low, high, log, integer}
+        :type space: typing.Dict[str, typing.Any]
+        :param n_trials: number of candidates of random search and successive halving
+        :type n_trials: int
+        :param n_jobs: number of worker processes, 0 means all the CPUs
+        :type n_jobs: int
+        :param holdout: share of the tune dataset the candidates are scored on
+        :type holdout: float
+        :param budget_s: wall-clock budget in seconds, defaults to None (unlimited)
+        :type budget_s: float, optional
+        :param early_stopping_rounds: number of trials without improvement before the search stops, defaults to None
+        :type early_stopping_rounds: int, optional
+        :param halving_factor: reduction factor of successive halving
+        :type halving_factor: int
+        :param min_resource: share of the rows used in the first round of successive halving
+        :type min_resource: float
+        :param seed: fixed random seed
+        :type seed: int
+        """
+        if strategy not in STRATEGIES:
+            raise ValueError(f'Unknown search strategy {strategy}, expected one of {STRATEGIES}.')
+        self.strategy = strategy
+        self.space = space or {}
+        self.n_trials = n_trials
+        self.n_jobs = get_n_jobs(n_jobs)
+        self.holdout = holdout
+        self.budget_s = budget_s
+        self.early_stopping_rounds = early_stopping_rounds
+        self.halving_factor = halving_factor
+        self.min_resource = min_resource
+        self.seed = seed
+
+    @classmethod
+    def from_config(cls, config: dict, seed: int = 42):
+        """
+        Create the search from the training.search section of the config.
+
+        :param config: search config
+        :type config: dict
+        :param seed: fixed random seed
+        :type seed: int
+        :return: search or None if the strategy is not set
+        :rtype: typing.Optional[HyperparameterSearch]
+        """
+        config = dict(config or {})
+        if not config.get('strategy'):
+            return None
+        return cls(seed=seed, **config)
+
+    def candidates(self) -> typing.List[dict]:
+        if self.strategy == 'grid':
+            return expand_grid(self.space)
+        return sample_space(self.space, self.n_trials, self.seed)
+
+    def run(self, dataset, fit: typing.Callable, score: typing.Callable,
+            on_trial: typing.Callable[[Trial], None] = None) -> Trial:
+        """
+        Run the search.
+
+        :param dataset: tune dataset
+        :type dataset: ColumnarDataset
+        :param fit: picklable function that trains the model: fit(dataset, params) -> model
+        :type fit: typing.Callable
+        :param score: picklable function that scores the model, the higher the better: score(dataset, model) -> float
+        :type score: typing.Callable
+        :param on_trial: called with every finished trial, e.g. to log it, defaults to None
+        :type on_trial: typing.Callable[[Trial], None], optional
+        :return: the best trial
+        :rtype: Trial
+        """
+        train_frame, holdout_frame = holdout_split(dataset.to_frame(), self.holdout, self.seed)
+        self._started = time.monotonic()
+        self._on_trial = on_trial
+        self._trials = []
+
+        if self.n_jobs == 1:
+            _init_worker(fit, score, train_frame, holdout_frame, self.seed)
+            pool = None
+        else:
+            pool = concurrent.futures.ProcessPoolExecutor(
+                max_workers=self.n_jobs, initializer=_init_worker, initargs=(fit, score, train_frame, holdout_frame, self.seed)
+            )
+        try:
+            if self.strategy == 'halving':
+                best = self._halving(pool)
+            else:
+                best = self._evaluate_all(pool, self.candidates(), 1.0, self.early_stopping_rounds)
+        finally:
+            if pool is not None:
+                pool.shutdown(cancel_futures=True)
+
+        if best is None:
+            raise RuntimeError('No candidate was evaluated within the budget of the search.')
+        logger.info(f'Search finished: {len(self._trials)} trials in {time.monotonic() - self._started:.1f} s, '
+                    f'best score {best.score:.4f} with {best.params}')
+        return best
+
+    def _out_of_budget(self) -> bool:
+        return self.budget_s is not None and time.monotonic() - self._started > self.budget_s
+
+    def _record(self, params: dict, resource: float, score: float, duration: float) -> Trial:
+        trial = Trial(len(self._trials), params, resource, score, duration)
+        self._trials.append(trial)
+        logger.debug(f'Trial {trial.number}: score {score:.4f} on {resource:.0%} of rows with {params}')
+        if self._on_trial is not None:
+            self._on_trial(trial)
+        return trial
+
+    def _evaluate_all(self, pool, candidates: typing.List[dict], resource: float,
+                      early_stopping_rounds: int = None) -> typing.Optional[Trial]:
+        """
+        Evaluate the candidates keeping at most 2 * n_jobs of them in flight, so that the search can stop
+        early or on the budget without training the rest.
+        """
+        best, since_best, stopped = None, 0, False
+        pending = collections.deque()
+        candidates = iter(candidates)
+
+        def collect(params, score, duration):
+            nonlocal best, since_best
+            trial = self._record(params, resource, score, duration)
+            if best is None or trial.score > best.score:
+                best, since_best = trial, 0
+            else:
+                since_best += 1
+
+        def stop():
+            nonlocal stopped
+            if stopped:
+                return True
+            if self._out_of_budget():
+                logger.info(f'Search budget of {self.budget_s} s is exhausted.')
+                stopped = True
+            elif early_stopping_rounds and since_best >= early_stopping_rounds:
+                logger.info(f'Search stopped early: no improvement during {since_best} trials.')
+                stopped = True
+            return stopped
+
+        for params in candidates:
+            if stop():
+                break
+            if pool is None:
+                collect(params, *_evaluate(params, resource))
+                continue
+            pending.append((params, pool.submit(_evaluate, params, resource)))
+            if len(pending) >= 2 * self.n_jobs:
+                params, future = pending.popleft()
+                collect(params, *future.result())
+
+        while pending:
+            params, future = pending.popleft()
+            if stop():
+                future.cancel()
+                continue
+            collect(params, *future.result())
+        return best
+
+    def _halving(self, pool) -> typing.Optional[Trial]:
+        candidates = self.candidates()
+        resource = min(1.0, self.min_resource)
+        best = None
+        while candidates:
+            round_start = len(self._trials)
+            best = self._evaluate_all(pool, candidates, resource) or best
+            scored = sorted(self._trials[round_start:], key=lambda trial: trial.score, reverse=True)
+            if resource >= 1.0 or len(scored) <= 1 or self._out_of_budget():
+                break
+            candidates = [trial.params for trial in scored[:max(1, len(scored) // self.halving_factor)]]
+            resource = min(1.0, resource * self.halving_factor)
+        return best
+
+
+def log_trial(client, experiment_id: str, parent_run_id: str) -> typing.Callable[[Trial], None]:
+    """
+    Callback of HyperparameterSearch.run that logs every trial as a nested run of the parent run.
+
+    :param client: MLFlow client
+    :type client: MlflowClient
+    :param experiment_id: id of the experiment
+    :type experiment_id: str
+    :param parent_run_id: id of the parent run
+    :type parent_run_id: str
+    :return: callback
+    :rtype: typing.Callable[[Trial], None]
+    """
+    from mlflow.entities import Metric, Param
+
+    def callback(trial: Trial):
+        run = client.create_run(experiment_id, tags={
+            'mlflow.parentRunId': parent_run_id,
+            'mlflow.runName': f'trial-{trial.number}',
+        })
+        timestamp = int(time.time() * 1000)
+        client.log_batch(
+            run.info.run_id,
+            metrics=[
+                Metric('score', trial.score, timestamp, 0),
+                Metric('duration_s', trial.duration, timestamp, 0),
+            ],
+            params=[Param(name, str(value)) for name, value in trial.params.items()]
+                   + [Param('resource', str(trial.resource))],
+        )
+        client.set_terminated(run.info.run_id)
+
+    return callback
@@ -1,15 +1,27 @@
 import os
+import time
 import yaml
-import click
-import joblib
+import types
+import typing
 import mlflow
+import functools
 import pathlib
 import tempfile
 import mlflow.pyfunc
 
+import numpy as np
+import pandas as pd
+
 from loguru import logger
-from mlflow.tracking import MlflowClient
 from lean_ds_project_mlflow import ContextualizedDirectory
+from lean_ds_project_mlflow.cli import config_command
+from lean_ds_project_mlflow.artifacts import get_artifact_cache, download_artifacts, upload_artifacts
+from lean_ds_project_mlflow.profiling import profile_stage
+from lean_ds_project_mlflow.lifecycle.fingerprint import StageFingerprint
+from lean_ds_project_mlflow.features.columnar import load_columnar
+from lean_ds_project_mlflow.models.search import HyperparameterSearch, log_trial
+from lean_ds_project_mlflow.models.registry import get_model_cache, get_latest_version, load_model_version
+from lean_ds_project_mlflow.models.evaluation import METRICS, predict_in_batches, compute_metrics
 
 
 class CustomPythonModel(mlflow.pyfunc.PythonModel):
@@ -18,45 +30,263 @@ class CustomPythonModel(mlflow.pyfunc.PythonModel):
     it serializable even with extra dependencies like references to another classes out
     of scope of this class.
     """    
-    def __init__(self):
+    # defaults of the models pickled before hyperparameters and incremental training were introduced
+    params = types.MappingProxyType({})
+    n_rows_seen = 0
+    last_row_hash = None
+
+    def __init__(self, params: dict = None):
         super().__init__()
+        self.params = params or {}
+        self.n_rows_seen = 0
+        self.last_row_hash = None
+
+    def partial_fit(self, chunk):
+        """
+        Update the model with the next chunk of the training data.
+
+        :param chunk: chunk of the dataset
+        :type chunk: pandas.DataFrame
+        :return: the model itself
+        :rtype: CustomPythonModel
+        """
+        if len(chunk):
+            self.n_rows_seen += len(chunk)
+            self.last_row_hash = row_hash(chunk)
+        return self
 
     def predict(self, context, model_input):
         return 42
 
 
-def train(dataset):
+def row_hash(frame) -> str:
+    """
+    Hash of the last row of the frame, used to check that the rows seen by a warm-started model are
+    still the first rows of the dataset.
+
+    :param frame: non-empty frame
+    :type frame: pandas.DataFrame
+    :return: hash
+    :rtype: str
+    """
+    return str(pd.util.hash_pandas_object(frame.iloc[-1:], index=False).iloc[0])
+
+
+class PythonModelPredictor():
+    """
+    Wrapper that gives in-memory PythonModel the interface of the model loaded with mlflow.pyfunc.load_model.
+    """
+    def __init__(self, python_model: mlflow.pyfunc.PythonModel):
+        self.python_model = python_model
+
+    def predict(self, model_input):
+        return self.python_model.predict(None, model_input)
+
+
+def train(dataset, params: dict = None):
     """
     Train machine learning model
     :param dataset: dataset for training the model
-    :type dataset: any
+    :type dataset: ColumnarDataset
+    :param params: hyperparameters of the model, defaults to None
+    :type params: dict, optional
     :return: model
     :rtype: mlflow.pyfunc.PythonModel
     """    
-    model = CustomPythonModel()
+    model = CustomPythonModel(params)
     return model
 
 
+def train_incremental(dataset, chunk_size: int = 100000, params: dict = None,
+                      model: mlflow.pyfunc.PythonModel = None) -> mlflow.pyfunc.PythonModel:
+    """
+    Train the model out-of-core: the dataset is streamed chunk by chunk into partial_fit of the model,
+    so memory usage does not depend on the size of the dataset. The warm-started model consumes only
+    the rows after the first n_rows_seen ones, i.e. the data appended to the dataset since it was trained.
+
+    This assumes the dataset is append-only: its first n_rows_seen rows are the ones the model has seen,
+    in the same order. The last seen row is compared with the row of the dataset at the same position,
+    the model is trained from scratch if they differ (rows were changed, removed or reordered).
+
+    :param dataset: dataset for training the model
+    :type dataset: ColumnarDataset
+    :param chunk_size: number of rows in a chunk
+    :type chunk_size: int
+    :param params: hyperparameters of a new model, defaults to None
+    :type params: dict, optional
+    :param model: previously trained model to be updated, defaults to None
+    :type model: mlflow.pyfunc.PythonModel, optional
+    :return: model
+    :rtype: mlflow.pyfunc.PythonModel
+    """
+    if model is None:
+        model = CustomPythonModel(params)
+    if not hasattr(model, 'partial_fit'):
+        raise TypeError(f'{type(model).__name__} does not support incremental training (partial_fit).')
+
+    start = model.n_rows_seen
+    if start > len(dataset):
+        logger.warning(f'Model has seen {start} rows, but the dataset has only {len(dataset)}, training from scratch.')
+        model, start = CustomPythonModel(model.params), 0
+    elif start and model.last_row_hash is None:
+        logger.warning(f'Model does not record its last seen row, the dataset is assumed to extend its {start} rows.')
+    elif start and row_hash(next(dataset.iter_chunks(1, start=start - 1))) != model.last_row_hash:
+        logger.warning(f'First {start} rows of the dataset are not the rows the model has seen, training from scratch.')
+        model, start = CustomPythonModel(model.params), 0
+
+    started = time.perf_counter()
+    for chunk in dataset.iter_chunks(chunk_size, start=start):
+        model.partial_fit(chunk)
+    duration = time.perf_counter() - started
+    rows = len(dataset) - start
+    logger.info(f'Model is updated with {rows} rows (skipped {start} seen rows) in {duration:.1f} s, '
+                f'{rows / max(duration, 1e-9):.0f} rows/s.')
+    return model
+
+
+def unwrap_python_model(model) -> mlflow.pyfunc.PythonModel:
+    """
+    Get the PythonModel instance from the model loaded with mlflow.pyfunc.load_model.
+
+    :param model: loaded model
+    :type model: mlflow.pyfunc.PyFuncModel
+    :return: python model
+    :rtype: mlflow.pyfunc.PythonModel
+    """
+    if hasattr(model, 'unwrap_python_model'):
+        return model.unwrap_python_model()
+    return model._model_impl.python_model
+
+
+def load_warm_start(name: str, version: str, stage: str) -> mlflow.pyfunc.PythonModel:
+    """
+    Load the version of the registered model to continue its training. The version is resolved with
+    get_latest_version before, so that the model is downloaded only if the stage is not reused.
+
+    :param name: name of the registered model
+    :type name: str
+    :param version: version of the model
+    :type version: str
+    :param stage: stage the version was resolved from
+    :type stage: str
+    :return: model
+    :rtype: mlflow.pyfunc.PythonModel
+    """
+    model, _ = load_model_version(name, version, cache=get_model_cache(), stage=stage)
+    logger.info(f'Training is warm-started from model {name} version {version}.')
+    return unwrap_python_model(model)
+
+
+def score(dataset, clr: mlflow.pyfunc.PythonModel, target_column: str, metric: str = 'accuracy',
+          batch_size: int = 100000) -> float:
+    """
+    Score of the trained model used to compare the candidates of hyperparameter search: the metric
+    of its predictions of the holdout dataset.
+
+    :param dataset: holdout dataset
+    :type dataset: ColumnarDataset
+    :param clr: trained model
+    :type clr: mlflow.pyfunc.PythonModel
+    :param target_column: column with the true values
+    :type target_column: str
+    :param metric: name of the metric, one of evaluation.METRICS
+    :type metric: str
+    :param batch_size: number of rows predicted at once
+    :type batch_size: int
+    :return: value of the metric
+    :rtype: float
+    """
+    features = [column for column in dataset.columns if column != target_column]
+    y_pred = predict_in_batches(PythonModelPredictor(clr), dataset, batch_size, features)
+    return compute_metrics(np.asarray(dataset[target_column]), y_pred, [metric])[metric]
+
+
+def search_and_train(dataset, config: dict, on_trial: typing.Callable = None) -> mlflow.pyfunc.PythonModel:
+    """
+    Search for the best parameters if training.search is configured and train the model with them
+    on the whole tune dataset. The candidates are scored with training.search.metric on the holdout,
+    so the search requires validation.target_column.
+
+    :param dataset: dataset for training the model
+    :type dataset: ColumnarDataset
+    :param config: configuration
+    :type config: dict
+    :param on_trial: called with every trial of the search, defaults to None
+    :type on_trial: typing.Callable, optional
+    :return: model
+    :rtype: mlflow.pyfunc.PythonModel
+    """
+    search_config = dict(config.get('training', {}).get('search') or {})
+    metric = search_config.pop('metric', 'accuracy')
+    search = HyperparameterSearch.from_config(search_config, seed=config.get('dataset', {}).get('seed', 42))
+    if search is None:
+        return train(dataset)
+
+    validation_config = config.get('validation', {})
+    if validation_config.get('target_column') is None:
+        raise ValueError('Hyperparameter search requires validation.target_column to score the candidates.')
+    if metric not in METRICS:
+        raise ValueError(f'Unknown search metric {metric}, expected one of {list(METRICS)}.')
+
+    scorer = functools.partial(
+        score, target_column=validation_config['target_column'], metric=metric,
+        batch_size=validation_config.get('batch_size', 100000)
+    )
+    best = search.run(dataset, train, scorer, on_trial=on_trial)
+    return train(dataset, best.params)
+
+
+def train_model(dataset, config: dict, on_trial: typing.Callable = None,
+                warm_start: mlflow.pyfunc.PythonModel = None) -> mlflow.pyfunc.PythonModel:
+    """
+    Train the model in the mode set by the config: out-of-core if training.incremental is enabled,
+    with hyperparameter search otherwise.
+
+    :param dataset: dataset for training the model
+    :type dataset: ColumnarDataset
+    :param config: configuration
+    :type config: dict
+    :param on_trial: called with every trial of the search, defaults to None
+    :type on_trial: typing.Callable, optional
+    :param warm_start: model to continue training in incremental mode, defaults to None
+    :type warm_start: mlflow.pyfunc.PythonModel, optional
+    :return: model
+    :rtype: mlflow.pyfunc.PythonModel
+    """
+    incremental = config.get('training', {}).get('incremental', {})
+    if not incremental.get('enabled', False):
+        return search_and_train(dataset, config, on_trial)
+
+    if config.get('training', {}).get('search', {}).get('strategy'):
+        logger.warning('Hyperparameter search is not supported in incremental mode and is skipped.')
+    return train_incremental(dataset, incremental.get('chunk_size', 100000), model=warm_start)
+
+
 def train_local(config_path: str = None):
     """
-    Train a model and register it in MLFlow. Optionally, gridsearch for parameters along with
-    validation phase can be moved into this method.
+    Train a model and register it in MLFlow. Parameters are searched for if training.search
+    is configured.
 
-    :param config_path: path to configuration file (unused)
+    :param config_path: path to configuration file
     :type config_path: str
     """
+    config = dict()
+    if config_path is not None:
+        with open(config_path, 'r') as f:
+            config = yaml.safe_load(f)
 
     with ContextualizedDirectory() as directory:
         ContextualizedDirectory.clear_directory(directory.models)
-        transformed_dataset_path = directory.processed.joinpath('dataset_tune.bin')
-        dataset = joblib.load(transformed_dataset_path)
+        transformed_dataset_path = directory.processed.joinpath('dataset_tune')
+        dataset = load_columnar(transformed_dataset_path)
         
-        clr = train(dataset)
+        clr = train_model(dataset, config)
         mlflow.pyfunc.save_model(
             path=directory.models,
             python_model=clr,
         )
 
+@profile_stage('train')
 def train_mlflow(config_path: str, run_id: str):
     """
     Train a model and register it in existing MLFlow run. Suitable for automatic retraning.
@@ -66,34 +296,64 @@ def train_mlflow(config_path: str, run_id: str):
     :param run_id: id of existing run
     :type run_id: str
     """    
+    from mlflow.tracking import MlflowClient
+
     with open(config_path, 'r') as f:
         config = yaml.safe_load(f)
         service_name = config['service']
         experiment_name = config['experiment']
+        reuse_stages = config.get('pipeline', {}).get('reuse_stages', False)
+        incremental = config.get('training', {}).get('incremental', {})
 
     client = MlflowClient()
-    
+    cache = get_artifact_cache()
+
+    # only the version is resolved for the fingerprint, the model is loaded if the stage runs
+    warm_start_version = None
+    if incremental.get('enabled', False) and incremental.get('warm_start', False):
+        warm_start_version = get_latest_version(service_name, config['working_stage'])
+        if warm_start_version is None:
+            logger.info(f'There is no version of model {service_name} in stage {config["working_stage"]}, '
+                        f'training from scratch.')
+
     with ContextualizedDirectory() as directory:
-        transformed_dataset_path = directory.processed.joinpath('dataset_tune.bin')
+        transformed_dataset_path = directory.processed.joinpath('dataset_tune')
         mlflow.set_experiment(experiment_name)
         with mlflow.start_run(run_id=run_id) as run:
-            client.download_artifacts(run.info.run_id, 'processed/dataset_tune.bin', directory.data)
-            dataset = joblib.load(transformed_dataset_path)
-            clr = train(dataset)
-            mlflow.log_param("algorithm", "test")
-            mlflow.pyfunc.log_model(
-                artifact_path='models',
-                python_model=clr, 
-                registered_model_name=service_name
+            stage = StageFingerprint(
+                client, run.info.run_id, 'train', ['processed/dataset_tune'], ['models'],
+                {'training': config.get('training'), 'seed': config['dataset']['seed'],
+                 'warm_start_version': warm_start_version}, enabled=reuse_stages
             )
+            # the model of the reused run is already registered, the registry is left as is
+            if stage.reuse(directory.data, cache) is not None:
+                return
+
+            warm_start = None
+            if warm_start_version is not None:
+                warm_start = load_warm_start(service_name, warm_start_version, config['working_stage'])
+            download_artifacts(client, run.info.run_id, ['processed/dataset_tune'], directory.data, cache)
+            dataset = load_columnar(transformed_dataset_path)
+            # every trial is logged as a nested run, only the best model is registered
+            clr = train_model(
+                dataset, config, on_trial=log_trial(client, run.info.experiment_id, run.info.run_id),
+                warm_start=warm_start
+            )
+            mlflow.log_param("algorithm", "test")
+            if warm_start_version is not None:
+                mlflow.log_param("warm_start_version", warm_start_version)
+            mlflow.log_params({f'model.{name}': value for name, value in clr.params.items()})
+
+            # the model is saved and logged explicitly (instead of log_model) to record its checksum
+            ContextualizedDirectory.clear_directory(directory.models)
+            mlflow.pyfunc.save_model(path=directory.models, python_model=clr)
+            upload_artifacts(client, run.info.run_id, [(directory.models, 'models')], cache)
+            mlflow.register_model(f'runs:/{run.info.run_id}/models', service_name)
+            stage.record()
+
 
+main = config_command(train_local)
 
-@logger.catch()
-@click.command()
-@click.option('--config', type=click.Path(exists=True), help='path to config file', default='config/config_local.yml')
-def main(config):
-    train_local(config)
-                
 
 if __name__ == '__main__':
     main()
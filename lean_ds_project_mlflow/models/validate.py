@@ -1,15 +1,17 @@
 import os
 import json
 import yaml
-import click
 import typing
-import joblib
-import mlflow
-import mlflow.pyfunc
+import numpy as np
 
 from loguru import logger
-from mlflow.tracking import MlflowClient
 from lean_ds_project_mlflow import ContextualizedDirectory
+from lean_ds_project_mlflow.cli import config_command
+from lean_ds_project_mlflow.artifacts import get_artifact_cache, download_artifacts, upload_artifacts
+from lean_ds_project_mlflow.profiling import profile_stage
+from lean_ds_project_mlflow.lifecycle.fingerprint import StageFingerprint
+from lean_ds_project_mlflow.features.columnar import load_columnar
+from lean_ds_project_mlflow.models.evaluation import predict_in_batches, compute_metrics, bootstrap_intervals
 
 
 def get_accuracy(X, y, clr) -> float:
@@ -24,7 +26,50 @@ def get_accuracy(X, y, clr) -> float:
     """    
     import random
     return random.random()
-        
+
+
+def evaluate(dataset, clr, config: dict = None) -> typing.Dict[str, float]:
+    """
+    Calculate all the validation metrics of the classifier. The classifier predicts the validation dataset
+    once in batches of validation.batch_size rows, all the metrics and their bootstrap confidence intervals
+    ({metric}-ci-low, {metric}-ci-high) are computed from these predictions. If validation.target_column
+    is not set (as in the template dataset), the metrics are mocked.
+
+    :param dataset: validation dataset
+    :type dataset: ColumnarDataset
+    :param clr: classifier to be validated
+    :param config: configuration, defaults to None
+    :type config: dict, optional
+    :return: metrics
+    :rtype: typing.Dict[str, float]
+    """
+    config = config or {}
+    validation_config = config.get('validation', {})
+    target_column = validation_config.get('target_column')
+
+    metrics = dict()
+    if target_column is None:
+        metrics[f'accuracy-1'] = get_accuracy(dataset, None, clr)
+        metrics[f'accuracy-2'] = get_accuracy(dataset, None, clr)
+        return metrics
+
+    features = [column for column in dataset.columns if column != target_column]
+    y_pred = predict_in_batches(clr, dataset, validation_config.get('batch_size', 100000), features)
+    y_true = np.asarray(dataset[target_column])
+
+    names = validation_config.get('metrics', ['accuracy'])
+    metrics.update(compute_metrics(y_true, y_pred, names))
+
+    bootstrap_config = validation_config.get('bootstrap', {})
+    intervals = bootstrap_intervals(
+        y_true, y_pred, names, bootstrap_config.get('n_resamples', 1000), bootstrap_config.get('confidence', 0.95),
+        config.get('dataset', {}).get('seed', 42)
+    )
+    for name, (low, high) in intervals.items():
+        metrics[f'{name}-ci-low'] = low
+        metrics[f'{name}-ci-high'] = high
+    return metrics
+
 
 def validate_local(config_path: str):
     """
@@ -34,20 +79,24 @@ def validate_local(config_path: str):
     :param config_path: path to config file
     :type config_path: str
     """    
+    import mlflow.pyfunc
+
+    with open(config_path, 'r') as f:
+        config = yaml.safe_load(f)
+
     with ContextualizedDirectory() as directory:
-        transformed_dataset_path = directory.processed.joinpath('dataset_validate.bin')
+        transformed_dataset_path = directory.processed.joinpath('dataset_validate')
         metrics_path = directory.reports.joinpath('metrics.json')
 
-        dataset = joblib.load(transformed_dataset_path)
+        dataset = load_columnar(transformed_dataset_path)
         clr = mlflow.pyfunc.load_model(model_uri=str(directory.models))
 
-        metrics = dict()
-        metrics[f'accuracy-1'] = get_accuracy(dataset, None, clr)
-        metrics[f'accuracy-2'] = get_accuracy(dataset, None, clr)
+        metrics = evaluate(dataset, clr, config)
         
         json.dump(metrics, open(metrics_path, 'w'))
 
 
+@profile_stage('validate')
 def validate_mlflow(config_path: str, run_id: str) -> typing.Dict[str, float]:
     """
     Validate the classifier built on the previous step and store the data in MLFlow. Data for validation as well as the model
@@ -56,38 +105,54 @@ def validate_mlflow(config_path: str, run_id: str) -> typing.Dict[str, float]:
     :param config_path: path to configuration file
     :type config_path: str
     """
+    import mlflow
+    import mlflow.pyfunc
+    from mlflow.tracking import MlflowClient
+
     with open(config_path, 'r') as f:
         config = yaml.safe_load(f)
         experiment_name = config['experiment']
+        reuse_stages = config.get('pipeline', {}).get('reuse_stages', False)
 
     client = MlflowClient()
+    cache = get_artifact_cache()
 
     with ContextualizedDirectory() as directory:
-        transformed_dataset_path = directory.processed.joinpath('dataset_validate.bin')
+        transformed_dataset_path = directory.processed.joinpath('dataset_validate')
+        metrics_path = directory.reports.joinpath('metrics.json')
         mlflow.set_experiment(experiment_name)
         with mlflow.start_run(run_id=run_id) as run:
-            client.download_artifacts(run.info.run_id, 'processed/dataset_validate.bin', directory.data)
-            dataset = joblib.load(transformed_dataset_path)
-            model = mlflow.pyfunc.load_model(
-                model_uri=f"runs:/{run_id}/models"
+            stage = StageFingerprint(
+                client, run.info.run_id, 'validate', ['processed/dataset_validate', 'models'],
+                ['reports/metrics.json'], {'validation': config.get('validation'), 'seed': config['dataset']['seed']},
+                enabled=reuse_stages
             )
+            if stage.reuse(directory.data, cache) is not None:
+                with open(directory.data.joinpath('reports/metrics.json'), 'r') as f:
+                    metrics = json.load(f)
+                for key, val in metrics.items():
+                    mlflow.log_metric(key, val)
+                return metrics
+
+            _, model_path = download_artifacts(
+                client, run.info.run_id, ['processed/dataset_validate', 'models'], directory.data, cache
+            )
+            dataset = load_columnar(transformed_dataset_path)
+            model = mlflow.pyfunc.load_model(model_uri=str(model_path))
 
-            metrics = dict()
-            
-            metrics[f'accuracy-1'] = get_accuracy(dataset, None, model)
-            metrics[f'accuracy-2'] = get_accuracy(dataset, None, model)
+            metrics = evaluate(dataset, model, config)
 
             for key, val in metrics.items():
                 mlflow.log_metric(key, val)
 
+            json.dump(metrics, open(metrics_path, 'w'))
+            upload_artifacts(client, run.info.run_id, [(metrics_path, 'reports/metrics.json')], cache)
+            stage.record()
+
             return metrics
 
 
-@logger.catch()
-@click.command()
-@click.option('--config', type=click.Path(exists=True), help='path to config file', default='config/config_local.yml')
-def main(config):
-    validate_local(config)
+main = config_command(validate_local)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,141 @@
+import json
+import yaml
+import typing
+import pandas as pd
+
+from loguru import logger
+from lean_ds_project_mlflow import ContextualizedDirectory
+from lean_ds_project_mlflow.artifacts import get_artifact_cache, upload_artifacts
+from lean_ds_project_mlflow.data.download import dowload_dataset
+from lean_ds_project_mlflow.features.parallel import map_partitions
+from lean_ds_project_mlflow.features.process import clean_chunk, read_raw_chunks, read_raw_header
+from lean_ds_project_mlflow.features.split import split_chunks
+from lean_ds_project_mlflow.features.transform import transform_frame
+from lean_ds_project_mlflow.features.columnar import FrameDataset, save_columnar
+from lean_ds_project_mlflow.models.train import PythonModelPredictor, train_model
+from lean_ds_project_mlflow.models.validate import evaluate
+
+CHECKPOINTS = ('interim', 'processed', 'models', 'reports')
+
+
+def prepare_datasets(raw_dataset_path: str, dataset_config: dict) -> typing.Tuple[pd.DataFrame, ...]:
+    """
+    Run the process, split and transform stages on the raw dataset in memory. The stages' own chunk functions
+    are applied to the data read the same way, so the datasets are identical to the files the stages store.
+
+    :param raw_dataset_path: path to raw dataset
+    :type raw_dataset_path: str
+    :param dataset_config: dataset section of the configuration file
+    :type dataset_config: dict
+    :return: processed, tuning and validation datasets as strings, transformed tuning and validation datasets
+    :rtype: typing.Tuple[pandas.DataFrame, ...]
+    """
+    chunk_size = dataset_config['chunk_size']
+    n_jobs = dataset_config['n_jobs']
+
+    cleaned = list(map_partitions(clean_chunk, read_raw_chunks(raw_dataset_path, chunk_size), n_jobs))
+    if not cleaned:
+        cleaned = [read_raw_header(raw_dataset_path)]
+    subsets = list(split_chunks(
+        cleaned, dataset_config['validate'], dataset_config['seed'],
+        dataset_config.get('key_column'), dataset_config.get('stratify_column')
+    ))
+
+    processed = pd.concat(cleaned, ignore_index=True)
+    tune = pd.concat([tune for tune, _ in subsets], ignore_index=True)
+    validation = pd.concat([validation for _, validation in subsets], ignore_index=True)
+    return (
+        processed, tune, validation,
+        transform_frame(tune, chunk_size, n_jobs), transform_frame(validation, chunk_size, n_jobs)
+    )
+
+
+def run_pipeline(config_path: str, checkpoints: typing.Sequence[str] = (), run_id: str = None) -> typing.Dict[str, float]:
+    """
+    Run all the stages (download, process, split, transform, train, validate) in one process passing the data
+    between them in memory. Only the raw dataset is stored, intermediate results are stored to the usual
+    local paths for the stages listed in checkpoints and additionally logged to the MLFlow run if run_id is given.
+
+    :param config_path: path to configuration file
+    :type config_path: str
+    :param checkpoints: intermediate results to be stored, subset of CHECKPOINTS
+    :type checkpoints: typing.Sequence[str]
+    :param run_id: id of MLFlow run for the checkpoints, defaults to None
+    :type run_id: str, optional
+    :return: validation metrics
+    :rtype: typing.Dict[str, float]
+    """
+    import mlflow
+    import mlflow.pyfunc
+    from mlflow.tracking import MlflowClient
+
+    unknown = set(checkpoints) - set(CHECKPOINTS)
+    if unknown:
+        raise ValueError(f'Unknown checkpoints {unknown}, expected a subset of {CHECKPOINTS}.')
+
+    with open(config_path, 'r') as f:
+        config = yaml.safe_load(f)
+        service_name = config['service']
+        experiment_name = config['experiment']
+        dataset_config = config['dataset']
+
+    with ContextualizedDirectory() as directory:
+        raw_dataset_path = directory.raw.joinpath('dataset.csv')
+        dowload_dataset(raw_dataset_path)
+        processed, tune, validation, tune_transformed, validation_transformed = prepare_datasets(
+            raw_dataset_path, dataset_config
+        )
+
+        clr = train_model(FrameDataset(tune_transformed), config)
+        metrics = evaluate(FrameDataset(validation_transformed), PythonModelPredictor(clr), config)
+        logger.info(f'Pipeline is finished, metrics: {metrics}')
+
+        artifacts = []
+        if 'interim' in checkpoints:
+            for frame, name in [(processed, 'dataset.csv'), (tune, 'dataset_tune.csv'),
+                                (validation, 'dataset_validate.csv')]:
+                frame.to_csv(directory.interim.joinpath(name), index=False)
+                artifacts.append((directory.interim.joinpath(name), f'interim/{name}'))
+        if 'processed' in checkpoints:
+            for frame, name in [(tune_transformed, 'dataset_tune'), (validation_transformed, 'dataset_validate')]:
+                save_columnar(frame, directory.processed.joinpath(name))
+                artifacts.append((directory.processed.joinpath(name), f'processed/{name}'))
+        if 'models' in checkpoints and run_id is None:
+            ContextualizedDirectory.clear_directory(directory.models)
+            mlflow.pyfunc.save_model(path=directory.models, python_model=clr)
+        if 'reports' in checkpoints:
+            json.dump(metrics, open(directory.reports.joinpath('metrics.json'), 'w'))
+
+        if run_id is not None:
+            mlflow.set_experiment(experiment_name)
+            with mlflow.start_run(run_id=run_id) as run:
+                upload_artifacts(MlflowClient(), run.info.run_id, artifacts, get_artifact_cache())
+                if 'models' in checkpoints:
+                    mlflow.pyfunc.log_model(
+                        artifact_path='models',
+                        python_model=clr,
+                        registered_model_name=service_name
+                    )
+                if 'reports' in checkpoints:
+                    for key, val in metrics.items():
+                        mlflow.log_metric(key, val)
+
+    return metrics
+
+
+def main(args: typing.Sequence[str] = None):
+    import click
+
+    @logger.catch()
+    @click.command()
+    @click.option('--config', type=click.Path(exists=True), help='path to config file', default='config/config_local.yml')
+    @click.option('--checkpoint', type=click.Choice(CHECKPOINTS), multiple=True, help='intermediate results to be stored')
+    @click.option('--run-id', type=str, default=None, help='id of MLFlow run to log the checkpoints to')
+    def command(config, checkpoint, run_id):
+        run_pipeline(config, checkpoint, run_id)
+
+    return command(args)
+
+
+if __name__ == '__main__':
+    main()
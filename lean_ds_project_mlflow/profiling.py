@@ -0,0 +1,190 @@
+import io
+import time
+import yaml
+import pstats
+import typing
+import pathlib
+import cProfile
+import resource
+import tempfile
+import functools
+
+from loguru import logger
+
+from lean_ds_project_mlflow.artifacts import TRANSFER_STATS
+
+# name of the MLFlow metric of the stage
+PROFILE_METRIC = 'profile.{stage}.{name}'
+
+
+def read_proc_io() -> typing.Dict[str, int]:
+    """
+    I/O counters of the current process from /proc/self/io: rchar and wchar are the bytes passed to
+    read / write calls (including the ones served by the page cache), read_bytes and write_bytes are
+    the bytes fetched from / sent to the storage. Empty on systems without procfs.
+
+    :return: counters
+    :rtype: typing.Dict[str, int]
+    """
+    try:
+        with open('/proc/self/io', 'r') as f:
+            return {key: int(value) for key, value in (line.split(':') for line in f if ':' in line)}
+    except OSError:
+        return dict()
+
+
+def _reset_peak_rss() -> bool:
+    # writing 5 to clear_refs resets the peak RSS (VmHWM) of the process, Linux 4.0+
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+        return True
+    except OSError:
+        return False
+
+
+def _peak_rss_mb() -> float:
+    try:
+        with open('/proc/self/status', 'r') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    # lifetime peak, in kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+class StageProfiler():
+    """
+    Measures the resources used by a stage of the pipeline and logs them as metrics of the MLFlow run
+    (profile.{stage}.{metric}):
+
+    * wall_s, cpu_s - wall and CPU time of the process, children_cpu_s - CPU time of the finished
+      child processes (e.g. process pool workers);
+    * transfer_s, transfer_mb - wall time and size of the artifact transfers (see artifacts.TRANSFER_STATS),
+      compute_s - the rest of the wall time;
+    * peak_rss_mb - peak resident memory of the process during the stage (lifetime peak if it can not be reset);
+    * read_mb, write_mb - bytes read and written by the process, storage_read_mb and storage_write_mb - the part
+      of them that reached the storage.
+
+    With profile=True the stage is run under cProfile and the stats (binary .prof and text summary)
+    are logged as artifacts to profile/{stage}.
+
+    >>> with StageProfiler('train', run_id):
+    >>>     ...
+    """
+    def __init__(self, stage: str, run_id: str = None, profile: bool = False, client=None):
+        """
+        :param stage: name of the stage
+        :type stage: str
+        :param run_id: id of MLFlow run for the metrics, they are only logged to the console if None
+        :type run_id: str, optional
+        :param profile: run the stage under cProfile and log its stats
+        :type profile: bool
+        :param client: MLFlow client, created if not given
+        :type client: MlflowClient, optional
+        """
+        self.stage = stage
+        self.run_id = run_id
+        self.profile = profile
+        self.client = client
+        self.metrics = dict()
+        self._profiler = None
+
+    def __enter__(self):
+        self._peak_reset = _reset_peak_rss()
+        self._io = read_proc_io()
+        self._transfer = TRANSFER_STATS.snapshot()
+        self._self_usage = resource.getrusage(resource.RUSAGE_SELF)
+        self._children_usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+        if self.profile:
+            self._profiler = cProfile.Profile()
+            self._profiler.enable()
+        self._started = time.perf_counter()
+        return self
+
+    def __exit__(self, type, value, traceback):
+        wall = time.perf_counter() - self._started
+        if self._profiler is not None:
+            self._profiler.disable()
+
+        self_usage = resource.getrusage(resource.RUSAGE_SELF)
+        children_usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+        transfer_s, transfer_bytes = TRANSFER_STATS.snapshot()
+        transfer_s, transfer_bytes = transfer_s - self._transfer[0], transfer_bytes - self._transfer[1]
+        io_counters = read_proc_io()
+
+        self.metrics = {
+            'wall_s': wall,
+            'cpu_s': (self_usage.ru_utime + self_usage.ru_stime)
+                     - (self._self_usage.ru_utime + self._self_usage.ru_stime),
+            'children_cpu_s': (children_usage.ru_utime + children_usage.ru_stime)
+                              - (self._children_usage.ru_utime + self._children_usage.ru_stime),
+            'transfer_s': transfer_s,
+            'transfer_mb': transfer_bytes / 2 ** 20,
+            'compute_s': max(wall - transfer_s, 0.),
+            'peak_rss_mb': _peak_rss_mb(),
+        }
+        for name, counter in [('read_mb', 'rchar'), ('write_mb', 'wchar'),
+                              ('storage_read_mb', 'read_bytes'), ('storage_write_mb', 'write_bytes')]:
+            if counter in io_counters:
+                self.metrics[name] = (io_counters[counter] - self._io.get(counter, 0)) / 2 ** 20
+
+        status = 'failed' if type is not None else 'finished'
+        logger.info(f'Stage {self.stage} {status}: ' + ', '.join(f'{k}={v:.2f}' for k, v in self.metrics.items()))
+        if self.run_id is not None:
+            # profiling must never fail the stage itself
+            try:
+                self._log()
+            except Exception as e:
+                logger.warning(f'Unable to log profile of stage {self.stage}: {e!r}')
+        return False
+
+    def _log(self):
+        from mlflow.entities import Metric
+        from mlflow.tracking import MlflowClient
+
+        client = self.client or MlflowClient()
+        timestamp = int(time.time() * 1000)
+        client.log_batch(self.run_id, metrics=[
+            Metric(PROFILE_METRIC.format(stage=self.stage, name=name), value, timestamp, 0)
+            for name, value in self.metrics.items()
+        ])
+
+        if self._profiler is None:
+            return
+        with tempfile.TemporaryDirectory() as directory:
+            stats_path = pathlib.Path(directory).joinpath(f'{self.stage}.prof')
+            self._profiler.dump_stats(str(stats_path))
+            summary = io.StringIO()
+            pstats.Stats(self._profiler, stream=summary).sort_stats('cumulative').print_stats(50)
+            stats_path.with_suffix('.txt').write_text(summary.getvalue())
+            client.log_artifacts(self.run_id, directory, f'profile/{self.stage}')
+
+
+def profile_stage(stage: str) -> typing.Callable:
+    """
+    Decorator of the stage entry point func(config_path, run_id) that runs it under StageProfiler.
+    cProfile is enabled by pipeline.profile of the config.
+
+    >>> @profile_stage('train')
+    >>> def train_mlflow(config_path: str, run_id: str):
+    >>>     ...
+
+    :param stage: name of the stage
+    :type stage: str
+    :return: decorator
+    :rtype: typing.Callable
+    """
+    def decorator(func: typing.Callable) -> typing.Callable:
+        @functools.wraps(func)
+        def wrapper(config_path: str, run_id: str = None, *args, **kwargs):
+            with open(config_path, 'r') as f:
+                config = yaml.safe_load(f)
+            profile = config.get('pipeline', {}).get('profile', False)
+
+            with StageProfiler(stage, run_id, profile=profile):
+                return func(config_path, run_id, *args, **kwargs)
+        return wrapper
+    return decorator
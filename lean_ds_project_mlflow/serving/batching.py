@@ -0,0 +1,195 @@
+import time
+import asyncio
+import typing
+
+from loguru import logger
+
+
+def is_frame(model_input) -> bool:
+    """
+    Check if the model input is a pandas DataFrame and can be stacked with the inputs of other requests.
+
+    :param model_input: input of a single request
+    :return: True for DataFrames
+    :rtype: bool
+    """
+    import pandas as pd
+
+    return isinstance(model_input, pd.DataFrame)
+
+
+def stack_frames(inputs: typing.List[typing.Any]):
+    """
+    Stack per-request model inputs into a single frame that is passed to the model at once.
+    Only DataFrames are stacked, see is_frame.
+
+    :param inputs: list of pandas DataFrames, one per request
+    :type inputs: typing.List[pandas.DataFrame]
+    :return: stacked frame and number of rows that belongs to every request
+    :rtype: tuple
+    """
+    import pandas as pd
+
+    sizes = [len(frame) for frame in inputs]
+    return pd.concat(inputs, ignore_index=True), sizes
+
+
+def unstack_predictions(predictions, sizes: typing.List[int]) -> list:
+    """
+    Split predictions of the stacked frame back to the requests. Scalar predictions (like the ones
+    returned by the template model) are considered to be valid for every request.
+
+    :param predictions: result of model.predict on the stacked frame
+    :param sizes: number of rows that belongs to every request
+    :type sizes: typing.List[int]
+    :return: list of predictions, one per request
+    :rtype: list
+    """
+    if not hasattr(predictions, '__len__') or isinstance(predictions, (str, bytes, dict)):
+        return [predictions] * len(sizes)
+
+    if len(predictions) != sum(sizes):
+        raise ValueError(f'Model returned {len(predictions)} predictions for {sum(sizes)} rows.')
+
+    results = []
+    offset = 0
+    for size in sizes:
+        if hasattr(predictions, 'iloc'):
+            results.append(predictions.iloc[offset:offset + size])
+        else:
+            results.append(predictions[offset:offset + size])
+        offset += size
+    return results
+
+
+class MicroBatcher():
+    """
+    Collects concurrent prediction requests and runs them through the model as a single batch.
+    A batch is flushed as soon as it holds max_batch_size requests or when the oldest request has
+    been waiting for max_wait_ms milliseconds.
+
+    Inputs rejected by can_stack (lists, dicts, arrays) are predicted one by one. If the stacked batch
+    fails, its requests are retried one by one, so a bad input fails only its own request.
+    """
+    def __init__(self, predict: typing.Callable[[typing.Any], typing.Awaitable], max_batch_size: int = 32,
+                 max_wait_ms: float = 5, stack: typing.Callable = stack_frames,
+                 unstack: typing.Callable = unstack_predictions, can_stack: typing.Callable = is_frame,
+                 observe_batch: typing.Callable[[int], None] = None):
+        """
+        :param predict: coroutine function that runs the model on the stacked input
+        :type predict: typing.Callable
+        :param max_batch_size: maximal number of requests in a batch
+        :type max_batch_size: int
+        :param max_wait_ms: maximal time the first request of a batch waits for the others
+        :type max_wait_ms: float
+        :param can_stack: function that checks if an input can be stacked with the others
+        :type can_stack: typing.Callable
+        :param observe_batch: callback that receives the size of every flushed batch, defaults to None
+        :type observe_batch: typing.Callable, optional
+        """
+        self.predict_batch = predict
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max_wait_ms / 1000.
+        self.stack = stack
+        self.unstack = unstack
+        self.can_stack = can_stack
+        self.observe_batch = observe_batch
+
+        self._queue = None
+        self._worker = None
+        self._getter = None
+
+    def _ensure_worker(self):
+        if self._worker is None or self._worker.done():
+            self._queue = asyncio.Queue()
+            self._getter = None
+            self._worker = asyncio.get_running_loop().create_task(self._run())
+
+    async def predict(self, model_input):
+        """
+        Enqueue a single model input and wait for its prediction.
+
+        :param model_input: input of a single request
+        :return: prediction for this request
+        """
+        self._ensure_worker()
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((model_input, future))
+        return await future
+
+    async def _get(self, timeout: float = None):
+        # the pending get is kept across calls: cancelling it on a timeout (as asyncio.wait_for does) may
+        # drop an item that was already taken from the queue on Python < 3.12
+        if self._getter is None:
+            self._getter = asyncio.get_running_loop().create_task(self._queue.get())
+        done, _ = await asyncio.wait({self._getter}, timeout=timeout)
+        if not done:
+            return None
+        item = self._getter.result()
+        self._getter = None
+        return item
+
+    async def _collect(self) -> list:
+        batch = [await self._get()]
+        deadline = time.monotonic() + self.max_wait
+
+        while len(batch) < self.max_batch_size:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            item = await self._get(timeout)
+            if item is None:
+                break
+            batch.append(item)
+        return batch
+
+    @staticmethod
+    def _resolve(future, prediction=None, error: Exception = None):
+        if future.done():
+            return
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(prediction)
+
+    async def _predict_single(self, model_input, future):
+        try:
+            prediction = await self.predict_batch(model_input)
+        except Exception as e:
+            logger.exception(e)
+            self._resolve(future, error=e)
+            return
+        self._resolve(future, prediction)
+
+    async def _predict_stacked(self, batch: list):
+        inputs = [model_input for model_input, _ in batch]
+        futures = [future for _, future in batch]
+        try:
+            stacked, sizes = self.stack(inputs)
+            predictions = self.unstack(await self.predict_batch(stacked), sizes)
+        except Exception as e:
+            if len(batch) == 1:
+                logger.exception(e)
+                self._resolve(futures[0], error=e)
+                return
+            logger.warning(f'Batch of {len(batch)} requests failed ({e!r}), predicting them one by one.')
+            for model_input, future in batch:
+                await self._predict_single(model_input, future)
+            return
+
+        for future, prediction in zip(futures, predictions):
+            self._resolve(future, prediction)
+
+    async def _run(self):
+        while True:
+            batch = await self._collect()
+            if self.observe_batch is not None:
+                self.observe_batch(len(batch))
+
+            stackable, single = [], []
+            for item in batch:
+                (stackable if self.can_stack(item[0]) else single).append(item)
+            if stackable:
+                await self._predict_stacked(stackable)
+            for model_input, future in single:
+                await self._predict_single(model_input, future)
@@ -0,0 +1,183 @@
+import os
+import time
+import asyncio
+import typing
+import concurrent.futures
+
+from loguru import logger
+
+BACKENDS = ('inline', 'thread', 'process')
+
+# model of the process pool worker, loaded once by _init_worker
+_worker_model = None
+
+
+def _init_worker(model_uri: str):
+    global _worker_model
+    from lean_ds_project_mlflow.models.registry import get_model_cache, load_model_uri
+
+    # workers start lazily, the cached copy is leased only while this worker loads it
+    _worker_model = load_model_uri(model_uri, get_model_cache())
+
+
+def _predict_in_worker(model_input, submitted_at: float, model=None):
+    started_at = time.time()
+    return started_at - submitted_at, (_worker_model if model is None else model).predict(model_input)
+
+
+class ExecutorStats():
+    """
+    Queue depth and wait time of the inference executor, used for sizing the pool.
+    """
+    def __init__(self, workers: int = None):
+        self.workers = workers
+        self.submitted = 0
+        self.completed = 0
+        self.running = 0
+        self.wait_time_total = 0.
+        self.wait_time_max = 0.
+
+    @property
+    def in_flight(self) -> int:
+        return self.submitted - self.completed
+
+    @property
+    def queue_depth(self) -> int:
+        if self.workers is not None:
+            # start of a task in the pool is recorded when it finishes, the depth is estimated from the pool size
+            return max(0, self.in_flight - self.workers)
+        return self.in_flight - self.running
+
+    def as_dict(self) -> typing.Dict[str, float]:
+        return {
+            'submitted': self.submitted,
+            'completed': self.completed,
+            'in_flight': self.in_flight,
+            'queue_depth': self.queue_depth,
+            'wait_time_avg': self.wait_time_total / self.completed if self.completed else 0.,
+            'wait_time_max': self.wait_time_max,
+        }
+
+
+class InferenceExecutor():
+    """
+    Runs blocking model.predict calls outside of the event loop.
+
+    Backends:
+        * inline - predict is called on the event loop (no overhead, blocks the loop);
+        * thread - thread pool, suitable for models which release GIL (numpy, sklearn);
+        * process - process pool, every worker loads the model from model_uri once at startup
+          (registry uris are loaded through the model cache, see load_model_uri).
+    """
+    def __init__(self, backend: str = 'inline', max_workers: int = None, model_uri: str = None):
+        """
+        :param backend: one of inline, thread, process
+        :type backend: str
+        :param max_workers: size of the pool, defaults to the number of CPUs
+        :type max_workers: int, optional
+        :param model_uri: uri of the model to be loaded by process workers
+        :type model_uri: str, optional
+        """
+        if backend not in BACKENDS:
+            raise ValueError(f'Unknown inference backend {backend}, expected one of {BACKENDS}.')
+        if backend == 'process' and model_uri is None:
+            raise ValueError('Process backend requires model_uri to load the model in workers.')
+
+        self.backend = backend
+        self.max_workers = max_workers
+        self.model_uri = model_uri
+        self._pool = self._create_pool()
+        self.stats = ExecutorStats(workers=self._pool_size())
+
+    def _pool_size(self) -> typing.Optional[int]:
+        if self.backend == 'thread':
+            # default size of ThreadPoolExecutor
+            return self.max_workers or min(32, (os.cpu_count() or 1) + 4)
+        if self.backend == 'process':
+            return self.max_workers or os.cpu_count()
+        return None
+
+    def _create_pool(self):
+        if self.backend == 'thread':
+            return concurrent.futures.ThreadPoolExecutor(
+                max_workers=self.max_workers, thread_name_prefix='inference'
+            )
+        if self.backend == 'process':
+            return concurrent.futures.ProcessPoolExecutor(
+                max_workers=self.max_workers, initializer=_init_worker, initargs=(self.model_uri,)
+            )
+        return None
+
+    def _record_start(self, wait_time: float):
+        self.stats.running += 1
+        self.stats.wait_time_total += wait_time
+        self.stats.wait_time_max = max(self.stats.wait_time_max, wait_time)
+
+    def _record_finish(self, wait_time: float = None):
+        if wait_time is not None:
+            self._record_start(wait_time)
+        self.stats.running -= 1
+        self.stats.completed += 1
+
+    async def predict(self, model, model_input):
+        """
+        Run model.predict with the configured backend.
+
+        :param model: model to be used by inline and thread backends (process workers use their own copy)
+        :param model_input: input of the model
+        :return: predictions
+        """
+        self.stats.submitted += 1
+
+        if self.backend == 'inline':
+            self._record_start(0.)
+            try:
+                return model.predict(model_input)
+            finally:
+                self._record_finish()
+
+        loop = asyncio.get_running_loop()
+        submitted_at = time.time()
+        # thread workers get the model of the caller, process workers use their own copy
+        args = (model_input, submitted_at) + ((model,) if self.backend == 'thread' else ())
+
+        # stats are updated on the event loop only: the start is recorded together with the finish,
+        # so a cancelled task (which may never start) is counted exactly once
+        wait_time = time.time() - submitted_at
+        try:
+            wait_time, predictions = await loop.run_in_executor(self._pool, _predict_in_worker, *args)
+            return predictions
+        finally:
+            self._record_finish(wait_time)
+
+    def reload(self, model_uri: str):
+        """
+        Replace the process pool with workers that load the model from model_uri. Tasks that
+        were already submitted are finished by the old workers.
+
+        :param model_uri: uri of the new model
+        :type model_uri: str
+        """
+        if self.backend != 'process':
+            return
+
+        old_pool = self._pool
+        self.model_uri = model_uri
+        self._pool = self._create_pool()
+        old_pool.shutdown(wait=False)
+        logger.info(f'Inference workers are restarted with the model {model_uri}.')
+
+    async def report(self, interval: float):
+        """
+        Periodically log the executor stats.
+
+        :param interval: interval between reports in seconds
+        :type interval: float
+        """
+        while True:
+            await asyncio.sleep(interval)
+            logger.info(f'Inference executor ({self.backend}): {self.stats.as_dict()}')
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=True)
@@ -0,0 +1,194 @@
+import time
+import typing
+import threading
+import contextlib
+import collections
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from loguru import logger
+
+
+def _format_labels(labelnames: typing.Sequence[str], labelvalues: typing.Sequence[str], **extra) -> str:
+    pairs = list(zip(labelnames, labelvalues)) + list(extra.items())
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{value}"' for name, value in pairs) + '}'
+
+
+class Metric():
+    kind = 'untyped'
+
+    def __init__(self, name: str, documentation: str, labelnames: typing.Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def header(self) -> typing.List[str]:
+        return [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.kind}']
+
+    def render(self) -> typing.List[str]:
+        raise NotImplementedError()
+
+
+class Counter(Metric):
+    """
+    Monotonically increasing counter, optionally split by labels.
+    """
+    kind = 'counter'
+
+    def __init__(self, name: str, documentation: str, labelnames: typing.Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values = collections.defaultdict(float)
+
+    def inc(self, value: float = 1, *labelvalues: str):
+        with self._lock:
+            self._values[labelvalues] += value
+
+    def render(self) -> typing.List[str]:
+        with self._lock:
+            values = dict(self._values)
+        return self.header() + [
+            f'{self.name}{_format_labels(self.labelnames, labels)} {value}' for labels, value in values.items()
+        ]
+
+
+class Gauge(Metric):
+    """
+    Value that can go up and down. If function is given, the value is taken from it at scrape time.
+    """
+    kind = 'gauge'
+
+    def __init__(self, name: str, documentation: str, function: typing.Callable[[], float] = None):
+        super().__init__(name, documentation)
+        self.function = function
+        self._value = 0.
+
+    def set(self, value: float):
+        self._value = value
+
+    def inc(self, value: float = 1):
+        with self._lock:
+            self._value += value
+
+    def dec(self, value: float = 1):
+        self.inc(-value)
+
+    def render(self) -> typing.List[str]:
+        value = self.function() if self.function is not None else self._value
+        return self.header() + [f'{self.name} {value}']
+
+
+class Summary(Metric):
+    """
+    Distribution of observed values. Quantiles are calculated at scrape time over a sliding window of
+    the latest observations, so recording an observation is a single append.
+    """
+    kind = 'summary'
+
+    def __init__(self, name: str, documentation: str, labelnames: typing.Sequence[str] = (),
+                 quantiles: typing.Sequence[float] = (0.5, 0.95, 0.99), window: int = 4096):
+        super().__init__(name, documentation, labelnames)
+        self.quantiles = quantiles
+        self.window = window
+        self._windows = dict()
+        self._sums = collections.defaultdict(float)
+        self._counts = collections.defaultdict(int)
+
+    def observe(self, value: float, *labelvalues: str):
+        with self._lock:
+            if labelvalues not in self._windows:
+                self._windows[labelvalues] = collections.deque(maxlen=self.window)
+            self._windows[labelvalues].append(value)
+            self._sums[labelvalues] += value
+            self._counts[labelvalues] += 1
+
+    @contextlib.contextmanager
+    def time(self, *labelvalues: str):
+        started_at = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started_at, *labelvalues)
+
+    def render(self) -> typing.List[str]:
+        with self._lock:
+            windows = {labels: sorted(values) for labels, values in self._windows.items()}
+            sums = dict(self._sums)
+            counts = dict(self._counts)
+
+        lines = self.header()
+        for labels, values in windows.items():
+            for quantile in self.quantiles:
+                value = values[min(len(values) - 1, int(quantile * len(values)))]
+                lines.append(f'{self.name}{_format_labels(self.labelnames, labels, quantile=quantile)} {value}')
+            lines.append(f'{self.name}_sum{_format_labels(self.labelnames, labels)} {sums[labels]}')
+            lines.append(f'{self.name}_count{_format_labels(self.labelnames, labels)} {counts[labels]}')
+        return lines
+
+
+class Registry():
+    """
+    Collection of metrics rendered in Prometheus text exposition format.
+    """
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric: Metric) -> Metric:
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+
+REQUEST_LATENCY = REGISTRY.register(Summary(
+    'prediction_stage_latency_seconds', 'Latency of the request processing stages.', labelnames=('stage',)
+))
+IN_FLIGHT = REGISTRY.register(Gauge('prediction_requests_in_flight', 'Number of requests being processed.'))
+ERRORS = REGISTRY.register(Counter(
+    'prediction_errors_total', 'Number of failed requests by exception type.', labelnames=('type',)
+))
+MODEL_LOAD_TIME = REGISTRY.register(Gauge('model_load_seconds', 'Load time of the currently served model.'))
+BATCH_SIZE = REGISTRY.register(Summary('prediction_batch_size', 'Number of requests in a micro-batch.'))
+
+
+def start_metrics_server(port: int, registry: Registry = REGISTRY, host: str = '0.0.0.0') -> ThreadingHTTPServer:
+    """
+    Serve metrics of the registry on http://host:port/metrics in a background thread.
+
+    :param port: port of the server
+    :type port: int
+    :param registry: registry to be served, defaults to REGISTRY
+    :type registry: Registry
+    :param host: host of the server
+    :type host: str
+    :return: server
+    :rtype: ThreadingHTTPServer
+    """
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split('?')[0] != '/metrics':
+                self.send_response(404)
+                self.end_headers()
+                return
+
+            body = registry.render().encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-type', 'text/plain; version=0.0.4')
+            self.send_header('Content-length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    threading.Thread(target=server.serve_forever, name='metrics', daemon=True).start()
+    logger.info(f'Metrics are served on http://{host}:{port}/metrics')
+    return server
@@ -0,0 +1,111 @@
+import time
+import asyncio
+import typing
+
+import pandas as pd
+from loguru import logger
+
+from lean_ds_project_mlflow.cache import LocalCache
+from lean_ds_project_mlflow.models.registry import get_latest_version, load_model_version
+
+# values of the columns of the input schema in the generated sample, by mlflow.types.DataType name
+SAMPLE_VALUES = {
+    'boolean': False, 'integer': 0, 'long': 0, 'float': 0., 'double': 0., 'string': '', 'binary': b'',
+    'datetime': pd.Timestamp(0),
+}
+
+
+def signature_sample(model):
+    """
+    One-row input of the model with default values of the columns of its signature.
+
+    :param model: pyfunc model
+    :type model: mlflow.pyfunc.PyFuncModel
+    :return: sample or None if the model has no column-based input signature
+    :rtype: typing.Optional[pandas.DataFrame]
+    """
+    metadata = getattr(model, 'metadata', None)
+    schema = metadata.get_input_schema() if metadata is not None else None
+    if schema is None or schema.is_tensor_spec() or not schema.has_input_names():
+        return None
+    return pd.DataFrame([{column.name: SAMPLE_VALUES.get(column.type.name) for column in schema.inputs}])
+
+
+class ModelWatcher():
+    """
+    Polls MLFlow model registry and loads the new version of the model as soon as it appears in the
+    watched stage. The model is loaded and warmed up in a thread, so the requests are served by the
+    current model meanwhile. Afterwards on_swap is called with the new model, the callback is expected
+    to replace the reference to the model in one assignment: requests that already took the old
+    reference are finished by the old model.
+    """
+    def __init__(self, name: str, stage: str, version: typing.Optional[str],
+                 on_swap: typing.Callable[[typing.Any, str, str, float], None],
+                 interval: float = 60, warmup_input: typing.Any = None, cache: LocalCache = None):
+        """
+        :param name: name of the registered model
+        :type name: str
+        :param stage: watched stage
+        :type stage: str
+        :param version: version of the currently loaded model, None if the model was not loaded from registry
+        :type version: typing.Optional[str]
+        :param on_swap: callback that receives the new model, its version, uri and load time
+        :type on_swap: typing.Callable
+        :param interval: polling interval in seconds
+        :type interval: float
+        :param warmup_input: input of the warm-up prediction, if None a sample of the model signature is used
+        :param cache: local model cache, defaults to None
+        :type cache: LocalCache, optional
+        """
+        self.name = name
+        self.stage = stage
+        self.version = version
+        self.on_swap = on_swap
+        self.interval = interval
+        self.warmup_input = warmup_input
+        self.cache = cache
+
+    def _load(self, version: str):
+        started_at = time.monotonic()
+        model, model_uri = load_model_version(self.name, version, cache=self.cache, stage=self.stage)
+        loaded_at = time.monotonic()
+        # a model that fails the warm-up raises here and is not swapped in
+        warmup_input = self.warmup_input if self.warmup_input is not None else signature_sample(model)
+        if warmup_input is not None:
+            model.predict(warmup_input)
+        else:
+            logger.warning(f'Model {self.name} version {version} has no input signature, warm-up is skipped.')
+        return model, model_uri, loaded_at - started_at, time.monotonic() - loaded_at
+
+    async def check(self) -> bool:
+        """
+        Load and swap the model if there is a new version in the watched stage.
+
+        :return: whether the model has been swapped
+        :rtype: bool
+        """
+        loop = asyncio.get_running_loop()
+
+        version = await loop.run_in_executor(None, get_latest_version, self.name, self.stage)
+        if version is None or version == self.version:
+            return False
+
+        logger.info(f'New version {version} of model {self.name} is found in stage {self.stage}, loading...')
+        model, model_uri, load_time, warmup_time = await loop.run_in_executor(None, self._load, version)
+
+        self.on_swap(model, version, model_uri, load_time)
+        logger.info(
+            f'Model {self.name} is swapped from version {self.version} to {version}: '
+            f'load took {load_time:.3f}s, warm-up took {warmup_time:.3f}s.'
+        )
+        self.version = version
+        return True
+
+    async def run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.check()
+            except Exception as e:
+                logger.info('Unable to reload the model due to following reason,')
+                logger.exception(e)
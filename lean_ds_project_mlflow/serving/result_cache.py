@@ -0,0 +1,105 @@
+import json
+import time
+import asyncio
+import typing
+import hashlib
+import collections
+
+
+def input_key(data, model_version: typing.Optional[str]) -> str:
+    """
+    Canonical hash of the request payload and the version of the model.
+
+    :param data: deserialized message payload
+    :param model_version: version of the model
+    :type model_version: typing.Optional[str]
+    :return: hex digest
+    :rtype: str
+    """
+    payload = json.dumps([model_version, data], sort_keys=True, separators=(',', ':'), default=str)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+class PredictionCache():
+    """
+    LRU cache of predictions with TTL. Concurrent requests with the same key share a single computation,
+    which runs in its own task, so cancelling one of the requests does not cancel it for the others.
+    """
+    def __init__(self, max_size: int = 10000, ttl_s: float = 60):
+        """
+        :param max_size: maximal number of cached predictions
+        :type max_size: int
+        :param ttl_s: time to live of cached prediction in seconds
+        :type ttl_s: float
+        """
+        self.max_size = max_size
+        self.ttl = ttl_s
+
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+        self._items = collections.OrderedDict()
+        self._in_flight = dict()
+        self._generation = 0
+
+    def clear(self):
+        """
+        Drop all the cached predictions, computations in flight are not shared with new requests anymore.
+        """
+        self._generation += 1
+        self._items.clear()
+        self._in_flight.clear()
+
+    def stats(self) -> typing.Dict[str, int]:
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'coalesced': self.coalesced,
+            'size': len(self._items),
+        }
+
+    async def get_or_compute(self, key: str, compute: typing.Callable[[], typing.Awaitable]):
+        """
+        Return cached prediction for the key or compute it.
+
+        :param key: key of the request, see input_key
+        :type key: str
+        :param compute: coroutine function that computes the prediction
+        :type compute: typing.Callable
+        :return: prediction
+        """
+        item = self._items.get(key)
+        if item is not None:
+            expires_at, prediction = item
+            if expires_at > time.monotonic():
+                self._items.move_to_end(key)
+                self.hits += 1
+                return prediction
+            del self._items[key]
+
+        task = self._in_flight.get(key)
+        if task is not None:
+            self.coalesced += 1
+            return await asyncio.shield(task)
+
+        self.misses += 1
+        task = asyncio.get_running_loop().create_task(self._compute(key, compute, self._generation))
+        # the exception is delivered to the waiters, retrieve it to avoid "never retrieved" warnings
+        task.add_done_callback(lambda done: done.cancelled() or done.exception())
+        self._in_flight[key] = task
+        # the computation is shared: a cancelled request stops waiting, but the computation goes on for the others
+        return await asyncio.shield(task)
+
+    async def _compute(self, key: str, compute: typing.Callable[[], typing.Awaitable], generation: int):
+        try:
+            prediction = await compute()
+        finally:
+            if self._in_flight.get(key) is asyncio.current_task():
+                del self._in_flight[key]
+
+        if generation == self._generation:
+            self._items[key] = (time.monotonic() + self.ttl, prediction)
+            while len(self._items) > self.max_size:
+                self._items.popitem(last=False)
+        return prediction
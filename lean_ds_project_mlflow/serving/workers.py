@@ -0,0 +1,165 @@
+import os
+import gc
+import time
+import signal
+import typing
+
+from loguru import logger
+
+
+def read_memory(pid: typing.Union[int, str] = 'self') -> typing.Dict[str, int]:
+    """
+    Memory of the process in bytes from /proc/{pid}/smaps_rollup: rss, pss (shared pages divided by the
+    number of processes mapping them), shared and private. private is the cost of an extra worker, pages
+    of the model inherited from the master stay shared until they are written to.
+
+    :param pid: id of the process, defaults to the current one
+    :type pid: typing.Union[int, str]
+    :return: memory by kind, empty if smaps_rollup is not available (not Linux)
+    :rtype: typing.Dict[str, int]
+    """
+    fields = {
+        'Rss': 'rss', 'Pss': 'pss',
+        'Shared_Clean': 'shared', 'Shared_Dirty': 'shared',
+        'Private_Clean': 'private', 'Private_Dirty': 'private',
+    }
+    memory = dict()
+    try:
+        with open(f'/proc/{pid}/smaps_rollup', 'r') as f:
+            for line in f:
+                key, _, value = line.partition(':')
+                if key in fields:
+                    memory[fields[key]] = memory.get(fields[key], 0) + int(value.split()[0]) * 1024
+    except OSError:
+        return dict()
+    return memory
+
+
+class WorkerSupervisor():
+    """
+    Pre-fork worker pool: the master process loads everything the workers share (e.g. the model) and forks
+    n_workers processes running target(index). The objects allocated before the fork are frozen out of
+    the garbage collector, so collections in the workers do not write to their pages and the pages stay
+    shared copy-on-write.
+
+    The master restarts the workers that exit, with exponential backoff for workers that crash right
+    after the start, and forwards SIGTERM and SIGINT to the workers on shutdown.
+    """
+    def __init__(self, target: typing.Callable[[int], typing.Any], n_workers: int, restart_delay: float = 1.,
+                 max_restart_delay: float = 30., min_uptime: float = 10., shutdown_timeout: float = 30.):
+        """
+        :param target: function run by the worker with the index of the worker
+        :type target: typing.Callable[[int], typing.Any]
+        :param n_workers: number of workers
+        :type n_workers: int
+        :param restart_delay: delay before a worker is restarted, in seconds
+        :type restart_delay: float
+        :param max_restart_delay: maximal delay of the backoff, in seconds
+        :type max_restart_delay: float
+        :param min_uptime: workers that exit sooner after the start double their restart delay, in seconds
+        :type min_uptime: float
+        :param shutdown_timeout: time the workers have to exit after SIGTERM before they are killed, in seconds
+        :type shutdown_timeout: float
+        """
+        if n_workers < 1:
+            raise ValueError(f'Number of workers must be positive, got {n_workers}.')
+        self.target = target
+        self.n_workers = n_workers
+        self.restart_delay = restart_delay
+        self.max_restart_delay = max_restart_delay
+        self.min_uptime = min_uptime
+        self.shutdown_timeout = shutdown_timeout
+        self.workers = dict()  # pid -> (index, started at)
+        self.delays = [restart_delay] * n_workers
+        self.pending = dict()  # index -> time of restart
+        self.stopping_at = None
+
+    def _spawn(self, index: int):
+        pid = os.fork()
+        if pid == 0:
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            signal.signal(signal.SIGINT, signal.SIG_DFL)
+            code = 0
+            try:
+                self.target(index)
+            except SystemExit as e:
+                code = e.code if isinstance(e.code, int) else 1
+            except BaseException:
+                logger.exception(f'Worker {index} failed.')
+                code = 1
+            finally:
+                os._exit(code)
+
+        self.workers[pid] = (index, time.monotonic())
+        logger.info(f'Worker {index} started with pid {pid}.')
+
+    def _stop(self, signum, frame):
+        if self.stopping_at is None:
+            logger.info(f'Stopping {len(self.workers)} workers.')
+            self.stopping_at = time.monotonic()
+        self.pending.clear()
+        for pid in list(self.workers):
+            try:
+                os.kill(pid, signum)
+            except ProcessLookupError:
+                pass
+
+    def _reap(self):
+        while self.workers:
+            pid, status = os.waitpid(-1, os.WNOHANG)
+            if pid == 0:
+                return
+            if pid not in self.workers:
+                continue
+            index, started_at = self.workers.pop(pid)
+            if self.stopping_at is not None:
+                continue
+
+            uptime = time.monotonic() - started_at
+            if uptime < self.min_uptime:
+                self.delays[index] = min(self.delays[index] * 2, self.max_restart_delay)
+            else:
+                self.delays[index] = self.restart_delay
+            logger.warning(
+                f'Worker {index} (pid {pid}) exited with code {os.waitstatus_to_exitcode(status)} after '
+                f'{uptime:.1f}s, restarting in {self.delays[index]:.1f}s.'
+            )
+            self.pending[index] = time.monotonic() + self.delays[index]
+
+    def run(self, poll_interval: float = 0.1):
+        """
+        Fork the workers and supervise them until they exit after SIGTERM or SIGINT.
+
+        :param poll_interval: interval of checking the workers, in seconds
+        :type poll_interval: float
+        """
+        # objects of the master (the model) are moved to the permanent generation and never collected
+        gc.collect()
+        gc.freeze()
+        memory = read_memory()
+        if memory:
+            logger.info(f'Master memory before fork: {memory["rss"] / 2 ** 20:.0f} MB RSS.')
+
+        signal.signal(signal.SIGTERM, self._stop)
+        signal.signal(signal.SIGINT, self._stop)
+        for index in range(self.n_workers):
+            self._spawn(index)
+
+        while self.workers or self.pending:
+            self._reap()
+            now = time.monotonic()
+            for index, restart_at in list(self.pending.items()):
+                if restart_at <= now:
+                    del self.pending[index]
+                    self._spawn(index)
+
+            if self.stopping_at is not None and now - self.stopping_at > self.shutdown_timeout:
+                logger.warning(f'{len(self.workers)} workers did not stop in {self.shutdown_timeout}s, killing.')
+                for pid in list(self.workers):
+                    try:
+                        os.kill(pid, signal.SIGKILL)
+                    except ProcessLookupError:
+                        pass
+                self.stopping_at = now
+            time.sleep(poll_interval)
+        logger.info('All workers stopped.')
@@ -0,0 +1,47 @@
+import os
+import json
+import functools
+
+import pandas as pd
+
+from lean_ds_project_mlflow.models.registry import get_model_cache, load_registered_model
+from lean_ds_project_mlflow.serving.reload import signature_sample
+
+# results of the performance tests, reported by test.py along with the test output
+PERFORMANCE_RESULTS = dict()
+
+
+@functools.lru_cache(maxsize=None)
+def get_model():
+    """
+    Load the model under test once per process. test.py calls it before forking the workers, so all
+    the test modules share the same preloaded model.
+
+    :return: model
+    :rtype: mlflow.pyfunc.PyFuncModel
+    """
+    print('Loading the model...')
+    experiment_name = os.getenv("MLFLOW_MODEL_NAME")
+    model_stage = os.getenv("MLFLOW_MODEL_STAGE")
+
+    model, _, _ = load_registered_model(experiment_name, model_stage, cache=get_model_cache())
+    return model
+
+
+def get_sample(model) -> pd.DataFrame:
+    """
+    One-row input of the model for the performance tests: the record from PERF_SAMPLE (test.performance.sample
+    of the config) if it is set, a row of default values of the columns of the model signature otherwise.
+
+    :param model: model under test
+    :type model: mlflow.pyfunc.PyFuncModel
+    :return: sample
+    :rtype: pandas.DataFrame
+    """
+    if os.getenv('PERF_SAMPLE'):
+        return pd.DataFrame([json.loads(os.getenv('PERF_SAMPLE'))])
+
+    sample = signature_sample(model)
+    if sample is None:
+        raise ValueError('Model has no column-based input signature, set test.performance.sample in the config.')
+    return sample
@@ -1,8 +1,5 @@
-import os
-import yaml
 import unittest
-from loguru import logger
-import mlflow.pyfunc
+from lean_ds_project_mlflow.test.fixtures import get_model
 
 class TestDemo(unittest.TestCase):
     """
@@ -10,24 +7,9 @@ class TestDemo(unittest.TestCase):
     """    
     @classmethod
     def setUpClass(cls):
-        print('Loading the model...')
-        experiment_name = os.getenv("MLFLOW_MODEL_NAME")
-        model_stage = os.getenv("MLFLOW_MODEL_STAGE")
+        cls.model = get_model()
+        assert cls.model is not None, "Unable to load model neither from MLflow nor locally."
 
-        try:
-            logger.info('Trying to load model from MLFLow...')
-            cls.model = mlflow.pyfunc.load_model(
-                model_uri=f"models:/{experiment_name}/{model_stage}"
-            )
-            logger.info('Model from MLFlow has been loaded.')
-        except Exception as e:
-            logger.info("Unable to load model from MLFlow due to following reason,")
-            logger.exception(e)
-            cls.model = mlflow.pyfunc.load_model(model_uri='/models')
-            logger.info('Local model has been loaded.')
-        finally:
-            assert cls.model is not None, "Unable to load model neither from MLflow nor locally."
-    
     def test_sanity(self):
         self.assertTrue(True)
 
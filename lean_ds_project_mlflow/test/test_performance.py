@@ -0,0 +1,48 @@
+import os
+import time
+import unittest
+
+import numpy as np
+
+from lean_ds_project_mlflow.test.fixtures import get_model, get_sample, PERFORMANCE_RESULTS
+
+
+class TestPerformance(unittest.TestCase):
+    """
+    Benchmark category: latency and throughput of the model against the thresholds set by test.py
+    (test.performance section of the config).
+    """
+    @classmethod
+    def setUpClass(cls):
+        cls.model = get_model()
+        cls.n_requests = int(os.getenv('PERF_N_REQUESTS', 200))
+        cls.batch_size = int(os.getenv('PERF_BATCH_SIZE', 1000))
+        cls.max_latency_p95_ms = float(os.getenv('PERF_MAX_LATENCY_P95_MS', 50))
+        cls.min_throughput = float(os.getenv('PERF_MIN_THROUGHPUT_ROWS_PER_S', 1000))
+        cls.sample = get_sample(cls.model)
+
+    def test_latency_p95(self):
+        self.model.predict(self.sample)  # warm-up
+
+        latencies = []
+        for _ in range(self.n_requests):
+            started = time.perf_counter()
+            self.model.predict(self.sample)
+            latencies.append(time.perf_counter() - started)
+
+        p50, p95 = np.percentile(latencies, [50, 95]) * 1000
+        PERFORMANCE_RESULTS.update(latency_p50_ms=p50, latency_p95_ms=p95)
+        self.assertLessEqual(p95, self.max_latency_p95_ms, f'p95 latency {p95:.2f} ms')
+
+    def test_batch_throughput(self):
+        batch = self.sample.loc[self.sample.index.repeat(self.batch_size)].reset_index(drop=True)
+        self.model.predict(batch)  # warm-up
+
+        repeats = max(1, self.n_requests // 20)
+        started = time.perf_counter()
+        for _ in range(repeats):
+            self.model.predict(batch)
+        throughput = repeats * self.batch_size / (time.perf_counter() - started)
+
+        PERFORMANCE_RESULTS.update(throughput_rows_per_s=throughput)
+        self.assertGreaterEqual(throughput, self.min_throughput, f'throughput {throughput:.0f} rows/s')
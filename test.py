@@ -1,24 +1,30 @@
 import io
 import os
+import json
 import yaml
 import click
 import unittest
-import contextlib
-from http.server import BaseHTTPRequestHandler, HTTPServer
+import threading
+import multiprocessing
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 
 HOST = "0.0.0.0"
 PORT = 5428
 
-tests_failed = False
-tests_output = None
+tests_status = "running"
+tests_output = "running\n"
+
+# test modules discovered before the workers are forked, workers get them by index
+test_modules = []
 
 
 class Server(BaseHTTPRequestHandler):
     def do_GET(self):
-        global tests_failed
-        global tests_output
-
-        if not tests_failed:
+        # the status is not successful (2xx) until the tests have passed, so readiness checks wait for them
+        if tests_status == "running":
+            self.send_response(503)
+            self.send_header("Retry-After", "5")
+        elif tests_status == "passed":
             self.send_response(200)
         else:
             self.send_response(500)
@@ -28,37 +34,91 @@ class Server(BaseHTTPRequestHandler):
         self.wfile.write(bytes(tests_output, "utf-8"))
 
 
+def run_module(index: int):
+    """
+    Run the test module in the worker process.
+
+    :return: output, number of failed tests, performance results
+    :rtype: tuple
+    """
+    from lean_ds_project_mlflow.test.fixtures import PERFORMANCE_RESULTS
+
+    with io.StringIO() as buf:
+        result = unittest.TextTestRunner(verbosity=2, stream=buf).run(test_modules[index])
+        output = buf.getvalue()
+    return output, len(result.failures) + len(result.errors), dict(PERFORMANCE_RESULTS)
+
+
+def run_tests(import_dir: str, workers: int) -> tuple:
+    """
+    Discover the test modules and run them in parallel worker processes. The model is loaded before
+    the workers are forked, so all of them share it.
+
+    :return: output, number of failed tests, performance results
+    :rtype: tuple
+    """
+    from lean_ds_project_mlflow.test.fixtures import get_model
+
+    test_modules.extend(unittest.TestLoader().discover(f'{import_dir}/test'))
+    try:
+        get_model()
+    except Exception as e:
+        # the tests that need the model report the error themselves
+        print(f'Unable to preload the model: {e!r}')
+
+    context = multiprocessing.get_context('fork')
+    with context.Pool(processes=max(1, min(workers, len(test_modules)))) as pool:
+        results = pool.map(run_module, range(len(test_modules)))
+
+    performance = dict()
+    for _, _, module_performance in results:
+        performance.update(module_performance)
+    return "".join(output for output, _, _ in results), sum(failed for _, failed, _ in results), performance
+
+
 @click.command()
 @click.option('--config', type=click.Path(exists=True), help='path to config file', default='config/config.yml')
 def main(config):
-    global tests_failed
+    global tests_status
     global tests_output
 
     with open(config, 'r') as f:
         config = yaml.safe_load(f)
         service = config['service']
+        test_config = config.get('test', {})
+        performance_config = test_config.get('performance', {})
 
         #if 'mlflow_uri' in config.keys():
         #    os.environ['MLFLOW_TRACKING_URI'] = config['mlflow_uri']
 
         os.environ["MLFLOW_MODEL_NAME"] = config['experiment']
         os.environ["MLFLOW_MODEL_STAGE"] = config['working_stage']
+        os.environ["PERF_N_REQUESTS"] = str(performance_config.get('n_requests', 200))
+        os.environ["PERF_BATCH_SIZE"] = str(performance_config.get('batch_size', 1000))
+        os.environ["PERF_MAX_LATENCY_P95_MS"] = str(performance_config.get('max_latency_p95_ms', 50))
+        os.environ["PERF_MIN_THROUGHPUT_ROWS_PER_S"] = str(performance_config.get('min_throughput_rows_per_s', 1000))
+        if performance_config.get('sample'):
+            os.environ["PERF_SAMPLE"] = json.dumps(performance_config['sample'])
 
     import_dir = service.replace('-', '_')
 
-    loader = unittest.TestLoader()
-    suite = loader.discover(f'{import_dir}/test')
-    with io.StringIO() as buf:
-        with contextlib.redirect_stdout(buf):
-            result = unittest.TextTestRunner(verbosity=2, stream=buf).run(suite)
-        tests_output = buf.getvalue()
-    
-    if result.failures or result.errors:
-        tests_failed = True
-    
-    webServer = HTTPServer((HOST, PORT), Server)
+    # the health server is up while the tests are running
+    webServer = ThreadingHTTPServer((HOST, PORT), Server)
+    threading.Thread(target=webServer.serve_forever, daemon=True).start()
     print("Server started http://%s:%s" % (HOST, PORT))
-    webServer.serve_forever()
+
+    try:
+        output, failed, performance = run_tests(import_dir, test_config.get('workers') or os.cpu_count() or 1)
+    except Exception as e:
+        output, failed, performance = f'Unable to run the tests: {e!r}\n', 1, dict()
+
+    if performance:
+        output += "\nPerformance:\n" + "".join(f"{key}: {value:.2f}\n" for key, value in sorted(performance.items()))
+    tests_output = output
+    tests_status = "failed" if failed else "passed"
+    print(tests_output)
+
+    threading.Event().wait()
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,123 @@
+import os
+import pathlib
+import tempfile
+import unittest
+
+from lean_ds_project_mlflow.cache import LocalCache
+from lean_ds_project_mlflow.artifacts import (
+    TRANSFER_STATS, download_artifact, download_artifacts, upload_artifact, upload_artifacts
+)
+
+
+class ArtifactStoreTestCase(unittest.TestCase):
+    """
+    Run of a local MLflow file store and the artifact cache.
+    """
+    def setUp(self):
+        from mlflow.tracking import MlflowClient
+
+        self.tempdir = tempfile.TemporaryDirectory()
+        self.directory = pathlib.Path(self.tempdir.name)
+        self.environ = dict(os.environ)
+        os.environ['MLFLOW_ALLOW_FILE_STORE'] = 'true'
+
+        self.client = MlflowClient(tracking_uri=self.directory.joinpath('mlruns').as_uri())
+        experiment_id = self.client.create_experiment('test-artifacts')
+        self.run_id = self.client.create_run(experiment_id).info.run_id
+        self.cache = LocalCache(self.directory.joinpath('cache'))
+
+    def tearDown(self):
+        os.environ.clear()
+        os.environ.update(self.environ)
+        self.tempdir.cleanup()
+
+
+class TestArtifactCache(ArtifactStoreTestCase):
+    """
+    Artifacts of a local MLflow file store passed through the artifact cache.
+    """
+    def upload(self, content: str, cache: LocalCache = None):
+        local_path = self.directory.joinpath('upload', 'dataset.csv')
+        local_path.parent.mkdir(parents=True, exist_ok=True)
+        local_path.write_text(content)
+        upload_artifact(self.client, self.run_id, local_path, 'interim/dataset.csv', cache)
+
+    def download(self, name: str) -> str:
+        path = download_artifact(
+            self.client, self.run_id, 'interim/dataset.csv', self.directory.joinpath(name), self.cache
+        )
+        return path.read_text()
+
+    def test_download_is_cached(self):
+        self.upload('a,b\n1,2\n')
+        self.assertEqual(self.download('first'), 'a,b\n1,2\n')
+        self.assertEqual(len(self.cache.manifests()), 1)
+        self.assertEqual(self.download('second'), 'a,b\n1,2\n')
+        self.assertEqual(len(self.cache.manifests()), 1)
+
+    def test_artifact_logged_again(self):
+        self.upload('a,b\n1,2\n', self.cache)
+        self.assertEqual(self.download('first'), 'a,b\n1,2\n')
+
+        # e.g. retry of the task that logged the artifact
+        self.upload('a,b\n3,4\n')
+        self.assertEqual(self.download('second'), 'a,b\n3,4\n')
+
+
+class FlakyClient():
+    """
+    Client which download of every artifact fails the given number of times.
+    """
+    def __init__(self, failures: int):
+        self.failures = failures
+        self.attempts = dict()
+
+    def download_artifacts(self, run_id, artifact_path, directory):
+        self.attempts[artifact_path] = self.attempts.get(artifact_path, 0) + 1
+        if self.attempts[artifact_path] <= self.failures:
+            raise ConnectionError('connection reset')
+        path = pathlib.Path(directory).joinpath(artifact_path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(artifact_path)
+        return str(path)
+
+
+class TestArtifactTransfer(ArtifactStoreTestCase):
+    """
+    Concurrent transfers of several artifacts and retries of the failed ones.
+    """
+    def test_round_trip(self):
+        artifacts = []
+        for i in range(6):
+            local_path = self.directory.joinpath('upload', f'part-{i}.csv')
+            local_path.parent.mkdir(parents=True, exist_ok=True)
+            local_path.write_text(f'x\n{i}\n')
+            artifacts.append((local_path, f'interim/part-{i}.csv'))
+
+        seconds, size = TRANSFER_STATS.snapshot()
+        upload_artifacts(self.client, self.run_id, artifacts, self.cache, max_workers=3)
+        paths = download_artifacts(
+            self.client, self.run_id, [path for _, path in artifacts], self.directory.joinpath('download'),
+            self.cache, max_workers=3
+        )
+        # the order of the paths is kept
+        self.assertEqual([path.read_text() for path in paths], [f'x\n{i}\n' for i in range(6)])
+        self.assertEqual(len(self.cache.manifests()), 6)
+        self.assertGreater(TRANSFER_STATS.snapshot()[0], seconds)
+        self.assertEqual(TRANSFER_STATS.snapshot()[1], size + 2 * sum(len(f'x\n{i}\n') for i in range(6)))
+
+    def test_failed_download_is_retried(self):
+        client = FlakyClient(failures=2)
+        paths = download_artifacts(client, 'run', ['a.csv', 'b.csv'], self.directory, retries=2, backoff=0)
+        self.assertEqual([path.read_text() for path in paths], ['a.csv', 'b.csv'])
+        self.assertEqual(client.attempts, {'a.csv': 3, 'b.csv': 3})
+
+    def test_retries_are_limited(self):
+        client = FlakyClient(failures=3)
+        with self.assertRaises(ConnectionError):
+            download_artifacts(client, 'run', ['a.csv'], self.directory, retries=2, backoff=0)
+        self.assertEqual(client.attempts, {'a.csv': 3})
+
+
+if __name__ == '__main__':
+    unittest.main()
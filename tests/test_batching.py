@@ -0,0 +1,60 @@
+import asyncio
+import unittest
+
+import pandas as pd
+
+from lean_ds_project_mlflow.serving.batching import MicroBatcher
+
+
+class TestMicroBatcher(unittest.TestCase):
+    """
+    Mixed batches and failures of single requests.
+    """
+    @staticmethod
+    async def predict(model_input):
+        if isinstance(model_input, pd.DataFrame):
+            if 'x' not in model_input or model_input['x'].isna().any():
+                raise KeyError('x')
+            return model_input['x'] * 2
+        if isinstance(model_input, dict):
+            return [model_input['x'] * 2]
+        raise TypeError(f'Unsupported input {type(model_input)}.')
+
+    def run_batch(self, inputs, max_wait_ms=50):
+        batches = []
+
+        async def run():
+            batcher = MicroBatcher(self.predict, max_batch_size=len(inputs), max_wait_ms=max_wait_ms,
+                                   observe_batch=batches.append)
+            return await asyncio.gather(*(batcher.predict(x) for x in inputs), return_exceptions=True)
+
+        return asyncio.run(run()), batches
+
+    def test_non_frame_input_is_predicted_alone(self):
+        results, batches = self.run_batch([pd.DataFrame({'x': [1, 2]}), {'x': 3}, pd.DataFrame({'x': [4]})])
+        self.assertEqual(batches, [3])
+        self.assertEqual(results[0].tolist(), [2, 4])
+        self.assertEqual(results[1], [6])
+        self.assertEqual(results[2].tolist(), [8])
+
+    def test_failure_is_isolated(self):
+        results, _ = self.run_batch([pd.DataFrame({'x': [1]}), pd.DataFrame({'y': [2]}), [5]])
+        self.assertEqual(results[0].tolist(), [2])
+        self.assertIsInstance(results[1], KeyError)
+        self.assertIsInstance(results[2], TypeError)
+
+    def test_items_are_not_lost_on_timeout(self):
+        async def run():
+            batcher = MicroBatcher(self.predict, max_batch_size=4, max_wait_ms=0.01)
+            tasks = []
+            for i in range(200):
+                tasks.append(asyncio.ensure_future(batcher.predict({'x': i})))
+                if i % 7 == 0:
+                    await asyncio.sleep(0)
+            return await asyncio.wait_for(asyncio.gather(*tasks), 10)
+
+        self.assertEqual(asyncio.run(run()), [[i * 2] for i in range(200)])
+
+
+if __name__ == '__main__':
+    unittest.main()
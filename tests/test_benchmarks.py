@@ -0,0 +1,46 @@
+import pathlib
+import tempfile
+import unittest
+from unittest import mock
+
+import yaml
+
+from lean_ds_project_mlflow.benchmarks import stages
+
+
+class TestStageBenchmark(unittest.TestCase):
+    """
+    Throughput of the stages and the exit code of the regression gate.
+    """
+    def setUp(self):
+        self.tempdir = tempfile.TemporaryDirectory()
+        self.directory = pathlib.Path(self.tempdir.name)
+        with open('config/config_local.yml', 'r') as f:
+            self.config = yaml.safe_load(f)
+        self.config['dataset'].update(n_jobs=1, validate=0.25)
+
+    def tearDown(self):
+        self.tempdir.cleanup()
+
+    def test_rows_are_the_rows_processed_by_the_stage(self):
+        results = {result['stage']: result for result in stages.benchmark_size(self.config, 400, self.directory)}
+        tune = stages.count_rows(self.directory.joinpath('processed', 'dataset_tune'))
+        validation = stages.count_rows(self.directory.joinpath('processed', 'dataset_validate'))
+
+        self.assertEqual(tune + validation, 400)
+        self.assertEqual(results['process']['rows'], 400)
+        self.assertEqual(results['split']['rows'], 400)
+        self.assertEqual(results['train']['rows'], tune)
+        self.assertEqual(results['validate']['rows'], validation)
+        for result in results.values():
+            self.assertAlmostEqual(result['rows_per_s'], result['rows'] / result['wall_s'], places=3)
+
+    def test_failing_stage_fails_the_command(self):
+        # the exception propagates, so the process exits with a non-zero code
+        with mock.patch.object(stages, 'run_benchmark', side_effect=RuntimeError('stage failed')):
+            with self.assertRaisesRegex(RuntimeError, 'stage failed'):
+                stages.main(['--output', str(self.directory.joinpath('report.json'))])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,69 @@
+import tempfile
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from lean_ds_project_mlflow.features.columnar import FrameDataset, save_columnar, load_columnar
+
+
+class TestColumnar(unittest.TestCase):
+    """
+    Round trip of a dataset through the columnar format.
+    """
+    def setUp(self):
+        self.tempdir = tempfile.TemporaryDirectory()
+        self.frame = pd.DataFrame({
+            'number': [1.5, np.nan, 3.0],
+            'text': np.array(['x', None, 'nan'], dtype=object),
+            'complete': np.array(['p', 'q', 'r'], dtype=object),
+        })
+
+    def tearDown(self):
+        self.tempdir.cleanup()
+
+    def test_missing_values_are_restored(self):
+        save_columnar(self.frame, self.tempdir.name)
+        dataset = load_columnar(self.tempdir.name)
+
+        text = dataset.to_frame()['text']
+        self.assertEqual(text.isna().tolist(), [False, True, False])
+        # the string 'nan' is data, not a missing value
+        self.assertEqual(text[2], 'nan')
+        self.assertEqual(dataset.to_frame(start=1)['text'].isna().tolist(), [True, False])
+        self.assertTrue(np.isnan(dataset.to_frame()['number'][1]))
+
+    def test_columns_without_missing_values_have_no_mask(self):
+        schema = save_columnar(self.frame, self.tempdir.name)
+        masks = {column['name']: 'mask' in column for column in schema['columns']}
+        self.assertEqual(masks, {'number': False, 'text': True, 'complete': False})
+
+    def test_extension_dtypes(self):
+        frame = pd.DataFrame({
+            'string': pd.array(['x', None, 'z'], dtype='string'),
+            'integer': pd.array([1, None, 3], dtype='Int64'),
+            'complete': pd.array([1, 2, 3], dtype='Int64'),
+            'flag': pd.array([True, False, True], dtype='boolean'),
+            'category': pd.Categorical(['a', 'b', None]),
+        })
+        save_columnar(frame, self.tempdir.name)
+        for dataset in [load_columnar(self.tempdir.name), FrameDataset(frame)]:
+            loaded = dataset.to_frame()
+            self.assertEqual(loaded['string'].isna().tolist(), [False, True, False])
+            self.assertEqual(loaded['string'][2], 'z')
+            self.assertEqual(loaded['integer'].dtype, np.float64)
+            self.assertTrue(np.isnan(loaded['integer'][1]))
+            self.assertEqual(loaded['complete'].dtype, np.int64)
+            self.assertEqual(loaded['flag'].dtype, np.bool_)
+            self.assertEqual(loaded['category'].isna().tolist(), [False, False, True])
+
+    def test_unsupported_dtype(self):
+        frame = pd.DataFrame({'period': pd.period_range('2020-01', periods=3, freq='M')})
+        with self.assertRaisesRegex(TypeError, 'period'):
+            save_columnar(frame, self.tempdir.name)
+        with self.assertRaisesRegex(TypeError, 'period'):
+            FrameDataset(frame)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,54 @@
+import pathlib
+import unittest
+import importlib.util
+from unittest import mock
+
+ROOT = pathlib.Path(__file__).resolve().parents[1]
+
+
+def load_dag_module():
+    spec = importlib.util.spec_from_file_location('dag', ROOT.joinpath('dag.py'))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+@unittest.skipUnless(importlib.util.find_spec('airflow'), 'Airflow is not installed.')
+class TestDag(unittest.TestCase):
+    """
+    Parsing of the DAG and virtualenvs of its tasks.
+    """
+    @classmethod
+    def setUpClass(cls):
+        # airflow reads its configuration on import, the DAG file itself must not read anything
+        import airflow.decorators  # noqa: F401
+
+        with mock.patch('builtins.open', side_effect=AssertionError('DAG file reads files at parse time')):
+            cls.module = load_dag_module()
+        cls.dag = cls.module.lean_ds_project_mlflow
+
+    def test_tasks(self):
+        self.assertEqual(set(self.dag.task_ids), {
+            'create_run', 'download_data', 'process', 'split', 'transform', 'train', 'validate', 'submit_metrics'
+        })
+
+    def test_tasks_share_cached_virtualenv(self):
+        for task in self.dag.tasks:
+            self.assertEqual(task.venv_cache_path, self.module.VENV_CACHE_PATH, task.task_id)
+            self.assertEqual(task.python_version, self.module.PYTHON_VERSION, task.task_id)
+            self.assertEqual(task.requirements, self.module.REQUIREMENTS_TEMPLATE, task.task_id)
+
+    def test_requirements_are_rendered(self):
+        import jinja2
+
+        env = jinja2.Environment(loader=jinja2.FileSystemLoader(str(ROOT)))
+        env.filters.update(self.dag.user_defined_filters)
+        rendered = env.from_string(self.module.REQUIREMENTS_TEMPLATE).render()
+
+        requirements = ROOT.joinpath('requirements.txt').read_text()
+        self.assertEqual(rendered, self.module.pip_installable(requirements))
+        self.assertFalse([line for line in rendered.splitlines() if line.startswith('git')])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,49 @@
+import unittest
+
+import numpy as np
+from sklearn.metrics import accuracy_score, precision_score, recall_score, f1_score
+
+from lean_ds_project_mlflow.models.evaluation import compute_metrics, bootstrap_intervals, broadcast_predictions
+
+METRICS = ['accuracy', 'precision_macro', 'recall_macro', 'f1_macro']
+
+
+class TestEvaluation(unittest.TestCase):
+    """
+    The vectorized metrics against scikit-learn.
+    """
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        self.y_true = rng.integers(0, 3, 500)
+        # predictions contain labels missing from the true values
+        self.y_pred = rng.integers(0, 5, 500)
+
+    def test_metrics_match_sklearn(self):
+        metrics = compute_metrics(self.y_true, self.y_pred, METRICS)
+        expected = {
+            'accuracy': accuracy_score(self.y_true, self.y_pred),
+            'precision_macro': precision_score(self.y_true, self.y_pred, average='macro', zero_division=0),
+            'recall_macro': recall_score(self.y_true, self.y_pred, average='macro', zero_division=0),
+            'f1_macro': f1_score(self.y_true, self.y_pred, average='macro', zero_division=0),
+        }
+        for name in METRICS:
+            self.assertAlmostEqual(metrics[name], expected[name], places=10, msg=name)
+
+    def test_bootstrap_intervals_contain_metrics(self):
+        metrics = compute_metrics(self.y_true, self.y_pred, METRICS)
+        intervals = bootstrap_intervals(self.y_true, self.y_pred, METRICS, n_resamples=200)
+        for name in METRICS:
+            low, high = intervals[name]
+            self.assertLessEqual(low, metrics[name], name)
+            self.assertGreaterEqual(high, metrics[name], name)
+
+    def test_broadcast_predictions(self):
+        np.testing.assert_array_equal(broadcast_predictions(1, 3), [1, 1, 1])
+        with self.assertRaises(ValueError):
+            broadcast_predictions(np.zeros((3, 1)), 3)
+        with self.assertRaises(ValueError):
+            broadcast_predictions(np.zeros(2), 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,92 @@
+import os
+import asyncio
+import pathlib
+import tempfile
+import threading
+import unittest
+from unittest import mock
+
+import mlflow.pyfunc
+import pandas as pd
+
+from lean_ds_project_mlflow.models.train import CustomPythonModel
+from lean_ds_project_mlflow.serving import executor as executor_module
+from lean_ds_project_mlflow.serving.executor import InferenceExecutor
+
+
+class BlockingModel():
+    def __init__(self):
+        self.release = threading.Event()
+
+    def predict(self, model_input):
+        self.release.wait(5)
+        return model_input['x'] * 2
+
+
+class TestInferenceExecutor(unittest.TestCase):
+    """
+    Stats of the backends, cancellation and reload of process workers.
+    """
+    def assert_idle(self, stats, submitted):
+        self.assertEqual(stats.submitted, submitted)
+        self.assertEqual(stats.completed, submitted)
+        self.assertEqual(stats.running, 0)
+        self.assertEqual(stats.queue_depth, 0)
+
+    def test_inline(self):
+        executor = InferenceExecutor('inline')
+        model = BlockingModel()
+        model.release.set()
+        predictions = asyncio.run(executor.predict(model, pd.DataFrame({'x': [1, 2]})))
+        self.assertEqual(predictions.tolist(), [2, 4])
+        self.assert_idle(executor.stats, 1)
+
+    def test_thread_cancelled_tasks_are_counted_once(self):
+        executor = InferenceExecutor('thread', max_workers=1)
+        model = BlockingModel()
+
+        async def run():
+            tasks = [asyncio.ensure_future(executor.predict(model, pd.DataFrame({'x': [i]}))) for i in range(3)]
+            await asyncio.sleep(0.05)
+            # the first task is running, the others are queued and never start
+            tasks[1].cancel()
+            tasks[2].cancel()
+            await asyncio.sleep(0.05)
+            model.release.set()
+            return await asyncio.gather(*tasks, return_exceptions=True)
+
+        try:
+            results = asyncio.run(run())
+        finally:
+            executor.shutdown()
+        self.assertEqual(results[0].tolist(), [0])
+        self.assertTrue(all(isinstance(r, asyncio.CancelledError) for r in results[1:]))
+        self.assert_idle(executor.stats, 3)
+        self.assertEqual(executor.stats.workers, 1)
+
+    def test_process_reload(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            paths = [str(pathlib.Path(tmp).joinpath(name)) for name in ('v1', 'v2')]
+            for path in paths:
+                mlflow.pyfunc.save_model(path=path, python_model=CustomPythonModel())
+
+            executor = InferenceExecutor('process', max_workers=1, model_uri=paths[0])
+            try:
+                model_input = pd.DataFrame({'x': [1]})
+                self.assertEqual(asyncio.run(executor.predict(None, model_input)), 42)
+                executor.reload(paths[1])
+                self.assertEqual(executor.model_uri, paths[1])
+                self.assertEqual(asyncio.run(executor.predict(None, model_input)), 42)
+            finally:
+                executor.shutdown()
+        self.assert_idle(executor.stats, 2)
+
+    def test_worker_loads_through_model_cache(self):
+        with tempfile.TemporaryDirectory() as tmp, \
+                mock.patch.dict(os.environ, {'MODEL_CACHE_DIR': tmp}), \
+                mock.patch('lean_ds_project_mlflow.models.registry.load_model_uri', return_value='model') as load:
+            executor_module._init_worker('models:/model/1')
+        self.assertEqual(executor_module._worker_model, 'model')
+        model_uri, cache = load.call_args.args
+        self.assertEqual(model_uri, 'models:/model/1')
+        self.assertEqual(str(cache.directory), tmp)
@@ -0,0 +1,95 @@
+import os
+import pathlib
+import tempfile
+import unittest
+
+from lean_ds_project_mlflow.artifacts import upload_artifact
+from lean_ds_project_mlflow.lifecycle.fingerprint import FINGERPRINT_TAG, StageFingerprint
+
+
+class TestStageFingerprint(unittest.TestCase):
+    """
+    Reuse of the outputs of a stage executed by a previous run with the same inputs, params and code.
+    """
+    def setUp(self):
+        from mlflow.tracking import MlflowClient
+
+        self.tempdir = tempfile.TemporaryDirectory()
+        self.directory = pathlib.Path(self.tempdir.name)
+        self.environ = dict(os.environ)
+        os.environ['MLFLOW_ALLOW_FILE_STORE'] = 'true'
+
+        self.client = MlflowClient(tracking_uri=self.directory.joinpath('mlruns').as_uri())
+        self.experiment_id = self.client.create_experiment('test-fingerprint')
+
+    def tearDown(self):
+        os.environ.clear()
+        os.environ.update(self.environ)
+        self.tempdir.cleanup()
+
+    def log(self, run_id: str, artifact_path: str, content: str):
+        local_path = self.directory.joinpath(run_id, artifact_path)
+        local_path.parent.mkdir(parents=True, exist_ok=True)
+        local_path.write_text(content)
+        upload_artifact(self.client, run_id, local_path, artifact_path)
+
+    def create_run(self, dataset: str = 'a\n1\n', code: str = 'v1') -> str:
+        run_id = self.client.create_run(self.experiment_id).info.run_id
+        self.client.log_param(run_id, 'code', code)
+        if dataset is not None:
+            self.log(run_id, 'raw/dataset.csv', dataset)
+        return run_id
+
+    def run_stage(self, run_id: str, params: dict = None, enabled: bool = True):
+        stage = StageFingerprint(
+            self.client, run_id, 'process', ['raw/dataset.csv'], ['interim/dataset.csv'], params or {'n': 1}, enabled
+        )
+        previous = stage.reuse(self.directory.joinpath('reuse', run_id))
+        if previous is None:
+            self.log(run_id, 'interim/dataset.csv', f'processed by {run_id}')
+            stage.record()
+        return stage, previous
+
+    def output(self, run_id: str) -> str:
+        path = self.client.download_artifacts(run_id, 'interim/dataset.csv', str(self.directory.joinpath('out', run_id)))
+        return pathlib.Path(path).read_text()
+
+    def test_unchanged_stage_is_reused(self):
+        first = self.create_run()
+        self.run_stage(first)
+        second = self.create_run()
+        stage, previous = self.run_stage(second)
+
+        self.assertEqual(previous.info.run_id, first)
+        self.assertEqual(self.output(second), f'processed by {first}')
+        tags = self.client.get_run(second).data.tags
+        self.assertEqual(tags[FINGERPRINT_TAG.format(stage='process')], stage.fingerprint)
+
+    def test_changes_invalidate_fingerprint(self):
+        self.run_stage(self.create_run())
+        for run_id, params in [(self.create_run(dataset='a\n2\n'), None), (self.create_run(code='v2'), None),
+                               (self.create_run(), {'n': 2})]:
+            _, previous = self.run_stage(run_id, params)
+            self.assertIsNone(previous)
+            self.assertEqual(self.output(run_id), f'processed by {run_id}')
+
+    def test_unknown_input_checksum(self):
+        run_id = self.create_run(dataset=None)
+        stage = StageFingerprint(self.client, run_id, 'process', ['raw/dataset.csv'], ['interim/dataset.csv'])
+        self.assertIsNone(stage.fingerprint)
+        self.assertIsNone(stage.find())
+
+    def test_disabled_stage_is_recorded(self):
+        first = self.create_run()
+        self.run_stage(first)
+        second = self.create_run()
+        stage, previous = self.run_stage(second, enabled=False)
+        self.assertIsNone(previous)
+        self.assertEqual(self.output(second), f'processed by {second}')
+        # the run can still be reused by the next ones
+        self.assertEqual(stage.find().info.run_id, first)
+        self.assertIn(FINGERPRINT_TAG.format(stage='process'), self.client.get_run(second).data.tags)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,46 @@
+import unittest
+
+from lean_ds_project_mlflow.benchmarks.imports import check_budgets, measure_import, parse_importtime
+
+OUTPUT = '''import time: self [us] | cumulative | imported package
+import time:       100 |        100 | site
+import time:        50 |         50 |     _json
+import time:       200 |        250 |   json.decoder
+import time:       300 |        550 | json
+import time:        20 |         20 |     numpy._utils
+import time:       400 |        420 |   numpy
+import time:        10 |         10 |   json
+import time:       100 |        530 | project
+'''
+
+
+class TestImportBenchmark(unittest.TestCase):
+    """
+    Parsing of python -X importtime output and the import time budgets.
+    """
+    def test_parse(self):
+        self.assertEqual(parse_importtime(OUTPUT, 'json'), {'_json': 50, 'json.decoder': 250, 'json': 550})
+        # modules imported by an earlier top-level import are not repeated
+        self.assertEqual(parse_importtime(OUTPUT, 'project'), {'numpy._utils': 20, 'numpy': 420, 'json': 10,
+                                                               'project': 530})
+        self.assertIsNone(parse_importtime(OUTPUT, 'pandas'))
+
+    def test_budgets(self):
+        results = {
+            'app': {'import_ms': 1500., 'heaviest': {'mlflow': 900.}},
+            'train': {'import_ms': 100., 'heaviest': {}},
+            'broken': {'error': 'ModuleNotFoundError'},
+        }
+        exceeded = check_budgets(results, {'app': 1000, 'train': 200, 'broken': 10, 'missing': 10})
+        self.assertEqual(exceeded, ['app: 1500 ms vs budget 1000 ms (mlflow 900 ms)'])
+
+    def test_measure(self):
+        result = measure_import('lean_ds_project_mlflow.cache', repeats=1)
+        self.assertEqual(result['module'], 'lean_ds_project_mlflow.cache')
+        self.assertGreater(result['import_ms'], 0)
+        self.assertIn('loguru', result['heaviest'])
+        self.assertIn('error', measure_import('lean_ds_project_mlflow.missing', repeats=1))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,45 @@
+import os
+import pathlib
+import tempfile
+import unittest
+
+import yaml
+
+
+class TestLifecycle(unittest.TestCase):
+    """
+    The entry points of the lifecycle package are imported the way dag.py imports them.
+    """
+    def setUp(self):
+        self.tempdir = tempfile.TemporaryDirectory()
+        self.directory = pathlib.Path(self.tempdir.name)
+        self.environ = dict(os.environ)
+        os.environ['MLFLOW_TRACKING_URI'] = self.directory.joinpath('mlruns').as_uri()
+        os.environ['MLFLOW_ALLOW_FILE_STORE'] = 'true'
+
+    def tearDown(self):
+        os.environ.clear()
+        os.environ.update(self.environ)
+        self.tempdir.cleanup()
+
+    def test_exports_are_functions(self):
+        from lean_ds_project_mlflow.lifecycle import create_run, submit_metrics
+
+        self.assertTrue(callable(create_run))
+        self.assertTrue(callable(submit_metrics))
+
+    def test_create_run(self):
+        from lean_ds_project_mlflow.lifecycle import create_run
+
+        config_path = self.directory.joinpath('config.yml')
+        with open(config_path, 'w') as f:
+            yaml.safe_dump({'experiment': 'test-lifecycle', 'version': 'abc123'}, f)
+
+        run_id = create_run(config_path=str(config_path))
+
+        from mlflow.tracking import MlflowClient
+        self.assertEqual(MlflowClient().get_run(run_id).data.params['code'], 'abc123')
+
+
+if __name__ == '__main__':
+    unittest.main()
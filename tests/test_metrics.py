@@ -0,0 +1,54 @@
+import unittest
+import urllib.error
+import urllib.request
+
+from lean_ds_project_mlflow.serving.metrics import Counter, Gauge, Registry, Summary, start_metrics_server
+
+
+class TestMetrics(unittest.TestCase):
+    """
+    Rendering of the metrics in Prometheus text format and the metrics endpoint.
+    """
+    def setUp(self):
+        self.registry = Registry()
+        self.errors = self.registry.register(Counter('errors_total', 'Errors.', labelnames=('type',)))
+        self.depth = self.registry.register(Gauge('queue_depth', 'Depth.', function=lambda: 7))
+        self.latency = self.registry.register(Summary('latency_seconds', 'Latency.', labelnames=('stage',),
+                                                      quantiles=(0.5,)))
+
+    def test_render(self):
+        self.errors.inc(1, 'ValueError')
+        self.errors.inc(2, 'ValueError')
+        for value in (1, 2, 3):
+            self.latency.observe(value, 'total')
+        lines = self.registry.render().splitlines()
+
+        self.assertIn('# TYPE errors_total counter', lines)
+        self.assertIn('errors_total{type="ValueError"} 3.0', lines)
+        self.assertIn('queue_depth 7', lines)
+        self.assertIn('latency_seconds{stage="total",quantile="0.5"} 2', lines)
+        self.assertIn('latency_seconds_sum{stage="total"} 6.0', lines)
+        self.assertIn('latency_seconds_count{stage="total"} 3', lines)
+
+    def test_time_observes_failed_blocks(self):
+        with self.assertRaises(ValueError):
+            with self.latency.time('predict'):
+                raise ValueError()
+        self.assertIn('latency_seconds_count{stage="predict"} 1', self.registry.render().splitlines())
+
+    def test_server(self):
+        server = start_metrics_server(0, self.registry, host='127.0.0.1')
+        try:
+            url = f'http://127.0.0.1:{server.server_address[1]}'
+            with urllib.request.urlopen(f'{url}/metrics') as response:
+                self.assertIn('queue_depth 7', response.read().decode())
+            with self.assertRaises(urllib.error.HTTPError) as context:
+                urllib.request.urlopen(f'{url}/other')
+            self.assertEqual(context.exception.code, 404)
+        finally:
+            server.shutdown()
+            server.server_close()
+
+
+if __name__ == '__main__':
+    unittest.main()
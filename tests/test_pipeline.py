@@ -0,0 +1,69 @@
+import pathlib
+import tempfile
+import unittest
+
+import pandas as pd
+
+from lean_ds_project_mlflow.features.process import process_dataset
+from lean_ds_project_mlflow.features.split import split_dataset
+from lean_ds_project_mlflow.features.transform import transform_dataset
+from lean_ds_project_mlflow.pipeline import prepare_datasets
+
+RAW = '''id,zip,count,label,comment
+1,007,10,a,NA
+2,010,,b,"with, comma"
+,,,,
+3,100,30,a,
+4,200,40,b,1e3
+5,300,,a,None
+6,400,60,b,x
+7,500,70,a,nan
+'''
+
+
+class TestPipeline(unittest.TestCase):
+    """
+    The fused pipeline produces the same datasets as the stages run one by one.
+    """
+    def setUp(self):
+        self.tempdir = tempfile.TemporaryDirectory()
+        self.dir = pathlib.Path(self.tempdir.name)
+        self.raw = self.dir.joinpath('raw.csv')
+        self.raw.write_text(RAW)
+
+    def tearDown(self):
+        self.tempdir.cleanup()
+
+    def run_stages(self, config: dict) -> tuple:
+        paths = [self.dir.joinpath(name) for name in ('dataset.csv', 'dataset_tune.csv', 'dataset_validate.csv')]
+        process_dataset(self.raw, paths[0], config['chunk_size'])
+        split_dataset(
+            paths[0], paths[1], paths[2], config['validate'], config['seed'],
+            config.get('key_column'), config.get('stratify_column'), config['chunk_size']
+        )
+        texts = [path.read_text() for path in paths]
+        transformed = [transform_dataset(path, config['chunk_size']) for path in paths[1:]]
+        return texts, transformed
+
+    def assert_same(self, config: dict):
+        texts, transformed = self.run_stages(config)
+        frames = prepare_datasets(self.raw, config)
+
+        for text, frame in zip(texts, frames[:3]):
+            self.assertEqual(frame.to_csv(index=False), text)
+        for expected, frame in zip(transformed, frames[3:]):
+            pd.testing.assert_frame_equal(frame, expected)
+
+    def test_same_as_stages(self):
+        for chunk_size in [3, 1000]:
+            for split in [dict(), dict(key_column='zip'), dict(stratify_column='label')]:
+                with self.subTest(chunk_size=chunk_size, **split):
+                    self.assert_same(dict(chunk_size=chunk_size, n_jobs=1, validate=0.4, seed=1, **split))
+
+    def test_header_only(self):
+        self.raw.write_text('id,zip\n')
+        self.assert_same(dict(chunk_size=3, n_jobs=1, validate=0.4, seed=1))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,78 @@
+import pathlib
+import tempfile
+import unittest
+from unittest import mock
+
+import pandas as pd
+
+from lean_ds_project_mlflow.models import predict
+from lean_ds_project_mlflow.models.predict import PROGRESS_SUFFIX, predict_file
+
+
+class DoublingModel():
+    def __init__(self, fail_on: int = None):
+        self.fail_on = fail_on
+
+    def predict(self, chunk):
+        if self.fail_on is not None and self.fail_on in chunk['x'].values:
+            raise RuntimeError('worker is killed')
+        return chunk['x'] * 2
+
+
+class TestBatchPredict(unittest.TestCase):
+    """
+    Chunked scoring of a file and resuming of an interrupted run.
+    """
+    def setUp(self):
+        self.tempdir = tempfile.TemporaryDirectory()
+        self.directory = pathlib.Path(self.tempdir.name)
+        self.input_path = self.directory.joinpath('input.csv')
+        # quoted fields spanning several lines, chunks can not be skipped by lines
+        pd.DataFrame({'x': range(10), 'text': [f'line {i}\nnext' for i in range(10)]}).to_csv(self.input_path, index=False)
+
+    def tearDown(self):
+        self.tempdir.cleanup()
+
+    def predict(self, output: str, model=None, version: str = '1', **kwargs) -> int:
+        loaded = (model or DoublingModel(), version, f'models:/model/{version}')
+        with mock.patch.object(predict, 'load_registered_model', return_value=loaded):
+            return predict_file(self.input_path, self.directory.joinpath(output), 'model', 'Production',
+                                chunk_size=3, keep_columns=True, **kwargs)
+
+    def read(self, output: str) -> pd.DataFrame:
+        return pd.read_csv(self.directory.joinpath(output))
+
+    def test_predict(self):
+        self.assertEqual(self.predict('output.csv'), 10)
+        result = self.read('output.csv')
+        self.assertEqual(result['prediction'].tolist(), [x * 2 for x in range(10)])
+        self.assertEqual(result['text'].tolist(), [f'line {i}\nnext' for i in range(10)])
+        self.assertFalse(self.directory.joinpath(f'output.csv{PROGRESS_SUFFIX}').exists())
+
+    def test_process_pool_keeps_order(self):
+        self.predict('serial.csv')
+        self.predict('parallel.csv', n_jobs=2)
+        pd.testing.assert_frame_equal(self.read('parallel.csv'), self.read('serial.csv'))
+
+    def test_resume(self):
+        self.predict('expected.csv')
+        with self.assertRaises(RuntimeError):
+            self.predict('output.csv', model=DoublingModel(fail_on=7))
+        output_path = self.directory.joinpath('output.csv')
+        # the chunk being written when the run was interrupted
+        with open(output_path, 'a') as f:
+            f.write('6,"line 6\n')
+
+        self.assertEqual(self.predict('output.csv'), 4)
+        self.assertEqual(output_path.read_bytes(), self.directory.joinpath('expected.csv').read_bytes())
+        self.assertFalse(self.directory.joinpath(f'output.csv{PROGRESS_SUFFIX}').exists())
+
+    def test_resume_with_another_version(self):
+        with self.assertRaises(RuntimeError):
+            self.predict('output.csv', model=DoublingModel(fail_on=7))
+        with self.assertRaisesRegex(ValueError, 'version 1'):
+            self.predict('output.csv', version='2')
+
+
+if __name__ == '__main__':
+    unittest.main()
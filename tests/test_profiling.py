@@ -0,0 +1,91 @@
+import os
+import time
+import pathlib
+import tempfile
+import unittest
+from unittest import mock
+
+import yaml
+
+from lean_ds_project_mlflow.artifacts import TRANSFER_STATS
+from lean_ds_project_mlflow.profiling import StageProfiler, profile_stage
+
+
+def busy(seconds: float = 0.05):
+    started = time.process_time()
+    while time.process_time() - started < seconds:
+        pass
+
+
+class TestStageProfiler(unittest.TestCase):
+    """
+    Resources of a stage logged to the MLflow run.
+    """
+    def setUp(self):
+        from mlflow.tracking import MlflowClient
+
+        self.tempdir = tempfile.TemporaryDirectory()
+        self.directory = pathlib.Path(self.tempdir.name)
+        self.environ = dict(os.environ)
+        os.environ['MLFLOW_ALLOW_FILE_STORE'] = 'true'
+        os.environ['MLFLOW_TRACKING_URI'] = self.directory.joinpath('mlruns').as_uri()
+
+        self.client = MlflowClient()
+        experiment_id = self.client.create_experiment('test-profiling')
+        self.run_id = self.client.create_run(experiment_id).info.run_id
+
+    def tearDown(self):
+        os.environ.clear()
+        os.environ.update(self.environ)
+        self.tempdir.cleanup()
+
+    def test_transfer_time_is_separated(self):
+        with StageProfiler('process') as profiler:
+            busy()
+            TRANSFER_STATS.add(seconds=0.01, size=2 ** 20)
+
+        metrics = profiler.metrics
+        self.assertGreater(metrics['cpu_s'], 0.04)
+        self.assertAlmostEqual(metrics['transfer_s'], 0.01)
+        self.assertAlmostEqual(metrics['transfer_mb'], 1.)
+        self.assertAlmostEqual(metrics['compute_s'], metrics['wall_s'] - 0.01)
+        self.assertGreater(metrics['peak_rss_mb'], 0)
+
+    def test_metrics_and_stats_are_logged(self):
+        with StageProfiler('train', self.run_id, profile=True, client=self.client):
+            busy()
+
+        logged = self.client.get_run(self.run_id).data.metrics
+        self.assertGreater(logged['profile.train.cpu_s'], 0.04)
+        self.assertIn('profile.train.wall_s', logged)
+        artifacts = {a.path for a in self.client.list_artifacts(self.run_id, 'profile/train')}
+        self.assertEqual(artifacts, {'profile/train/train.prof', 'profile/train/train.txt'})
+
+    def test_failed_stage_is_profiled(self):
+        with self.assertRaises(ValueError):
+            with StageProfiler('validate', self.run_id, client=self.client):
+                raise ValueError('stage failed')
+        self.assertIn('profile.validate.wall_s', self.client.get_run(self.run_id).data.metrics)
+
+    def test_logging_errors_do_not_fail_stage(self):
+        client = mock.Mock(log_batch=mock.Mock(side_effect=ConnectionError('tracking server is down')))
+        with StageProfiler('split', self.run_id, client=client) as profiler:
+            pass
+        client.log_batch.assert_called_once()
+        self.assertIn('wall_s', profiler.metrics)
+
+    def test_decorator_reads_profile_flag(self):
+        config_path = self.directory.joinpath('config.yml')
+        with open(config_path, 'w') as f:
+            yaml.safe_dump({'pipeline': {'profile': True}}, f)
+
+        @profile_stage('transform')
+        def stage(config_path: str, run_id: str):
+            return run_id
+
+        self.assertEqual(stage(str(config_path), self.run_id), self.run_id)
+        self.assertTrue(self.client.list_artifacts(self.run_id, 'profile/transform'))
+
+
+if __name__ == '__main__':
+    unittest.main()
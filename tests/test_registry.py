@@ -0,0 +1,70 @@
+import pathlib
+import tempfile
+import unittest
+from unittest import mock
+
+from lean_ds_project_mlflow.cache import LocalCache
+from lean_ds_project_mlflow.models import registry
+
+
+def fake_download(model_uri, output_path):
+    path = pathlib.Path(output_path).joinpath('model')
+    path.mkdir()
+    path.joinpath('MLmodel').write_text(model_uri)
+    return str(path)
+
+
+def fake_load(model_uri):
+    # the content is read at load time, a missing directory fails like mlflow does
+    return pathlib.Path(model_uri).joinpath('MLmodel').read_text()
+
+
+class TestModelCache(unittest.TestCase):
+    """
+    Registered models loaded through the local cache.
+    """
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.cache = LocalCache(self.tmp.name, max_size_mb=1)
+        self.download = mock.patch('mlflow.tracking.artifact_utils._download_artifact_from_uri',
+                                   side_effect=fake_download)
+        self.load = mock.patch('mlflow.pyfunc.load_model', side_effect=fake_load)
+        self.download_mock = self.download.start()
+        self.load.start()
+
+    def tearDown(self):
+        mock.patch.stopall()
+        self.tmp.cleanup()
+
+    def test_version_is_downloaded_once(self):
+        for _ in range(2):
+            model, model_uri = registry.load_model_version('model', '1', cache=self.cache, stage='Production')
+            self.assertEqual(model, 'models:/model/1')
+            self.assertEqual(model_uri, 'models:/model/1')
+        self.assertEqual(self.download_mock.call_count, 1)
+
+    def test_uri_survives_eviction(self):
+        _, model_uri = registry.load_model_version('model', '1', cache=self.cache)
+        # a newer version of another model evicts the entry before a lazy worker loads it
+        self.cache.max_size = 0
+        registry.load_model_version('other', '1', cache=self.cache)
+        self.assertEqual([m['key'] for m in self.cache.manifests()], ['models/other/1'])
+
+        self.assertEqual(registry.load_model_uri(model_uri, self.cache), 'models:/model/1')
+        self.assertEqual(self.download_mock.call_count, 3)
+
+    def test_cached_version_is_used_without_registry(self):
+        registry.load_model_version('model', '1', cache=self.cache, stage='Production')
+        registry.load_model_version('model', '2', cache=self.cache, stage='Production')
+
+        with mock.patch.object(registry, 'get_latest_version', side_effect=ConnectionError('registry is down')):
+            model, version, model_uri = registry.load_registered_model('model', 'Production', cache=self.cache)
+        self.assertEqual((model, version, model_uri), ('models:/model/2', '2', 'models:/model/2'))
+        self.assertEqual(self.download_mock.call_count, 2)
+
+    def test_plain_uri_is_loaded_as_is(self):
+        path = pathlib.Path(self.tmp.name).joinpath('local')
+        path.mkdir()
+        path.joinpath('MLmodel').write_text('local')
+        self.assertEqual(registry.load_model_uri(str(path), self.cache), 'local')
+        self.download_mock.assert_not_called()
@@ -0,0 +1,68 @@
+import asyncio
+import unittest
+from unittest import mock
+
+import pandas as pd
+from mlflow.types import ColSpec, Schema
+
+from lean_ds_project_mlflow.serving import reload
+from lean_ds_project_mlflow.serving.reload import ModelWatcher, signature_sample
+
+
+class FakeModel():
+    def __init__(self, schema: Schema = None, fail: bool = False):
+        self.metadata = mock.Mock(get_input_schema=mock.Mock(return_value=schema))
+        self.fail = fail
+        self.inputs = []
+
+    def predict(self, model_input):
+        if self.fail:
+            raise ValueError('broken model')
+        self.inputs.append(model_input)
+        return 0
+
+
+class TestModelWatcher(unittest.TestCase):
+    """
+    Swap of a new registered version and its warm-up.
+    """
+    def check(self, model, latest='2', **kwargs):
+        swaps = []
+        watcher = ModelWatcher('model', 'Production', '1', lambda *args: swaps.append(args), **kwargs)
+        with mock.patch.object(reload, 'get_latest_version', return_value=latest), \
+                mock.patch.object(reload, 'load_model_version', return_value=(model, 'models:/model/2')):
+            swapped = asyncio.run(watcher.check())
+        return watcher, swapped, swaps
+
+    def test_new_version_is_warmed_up_and_swapped(self):
+        model = FakeModel()
+        warmup_input = pd.DataFrame({'x': [1.]})
+        watcher, swapped, swaps = self.check(model, warmup_input=warmup_input)
+        self.assertTrue(swapped)
+        self.assertEqual(watcher.version, '2')
+        self.assertIs(model.inputs[0], warmup_input)
+        self.assertEqual([swap[:3] for swap in swaps], [(model, '2', 'models:/model/2')])
+
+    def test_signature_sample_is_used_without_warmup_input(self):
+        model = FakeModel(Schema([ColSpec('double', 'x'), ColSpec('string', 'name')]))
+        self.check(model)
+        self.assertEqual(model.inputs[0].to_dict(orient='records'), [{'x': 0., 'name': ''}])
+
+    def test_failed_warmup_keeps_current_model(self):
+        watcher = ModelWatcher('model', 'Production', '1', mock.Mock(), warmup_input=pd.DataFrame({'x': [1.]}))
+        with mock.patch.object(reload, 'get_latest_version', return_value='2'), \
+                mock.patch.object(reload, 'load_model_version', return_value=(FakeModel(fail=True), 'uri')):
+            with self.assertRaises(ValueError):
+                asyncio.run(watcher.check())
+        watcher.on_swap.assert_not_called()
+        self.assertEqual(watcher.version, '1')
+
+    def test_same_version_is_not_reloaded(self):
+        model = FakeModel()
+        _, swapped, swaps = self.check(model, latest='1')
+        self.assertFalse(swapped)
+        self.assertEqual((swaps, model.inputs), ([], []))
+
+    def test_model_without_signature_has_no_sample(self):
+        self.assertIsNone(signature_sample(FakeModel()))
+        self.assertIsNone(signature_sample(object()))
@@ -0,0 +1,95 @@
+import asyncio
+import unittest
+
+from lean_ds_project_mlflow.serving.result_cache import PredictionCache, input_key
+
+
+class TestPredictionCache(unittest.TestCase):
+    """
+    Caching and coalescing of concurrent predictions.
+    """
+    def test_concurrent_requests_share_the_computation(self):
+        calls = []
+
+        async def compute():
+            calls.append(1)
+            await asyncio.sleep(0.01)
+            return 42
+
+        async def run():
+            cache = PredictionCache()
+            results = await asyncio.gather(*(cache.get_or_compute('key', compute) for _ in range(5)))
+            results.append(await cache.get_or_compute('key', compute))
+            return cache, results
+
+        cache, results = asyncio.run(run())
+        self.assertEqual(results, [42] * 6)
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(cache.stats(), {'hits': 1, 'misses': 1, 'coalesced': 4, 'size': 1})
+
+    def test_cancelled_request_does_not_cancel_the_waiters(self):
+        async def compute():
+            await asyncio.sleep(0.05)
+            return 42
+
+        async def run():
+            cache = PredictionCache()
+            first = asyncio.ensure_future(cache.get_or_compute('key', compute))
+            await asyncio.sleep(0)
+            second = asyncio.ensure_future(cache.get_or_compute('key', compute))
+            await asyncio.sleep(0.01)
+            first.cancel()
+            result = await second
+            with self.assertRaises(asyncio.CancelledError):
+                await first
+            return cache, result
+
+        cache, result = asyncio.run(run())
+        self.assertEqual(result, 42)
+        self.assertEqual(cache.stats()['size'], 1)
+
+    def test_exception_is_delivered_to_all_the_requests(self):
+        async def compute():
+            await asyncio.sleep(0.01)
+            raise ValueError('bad input')
+
+        async def run():
+            cache = PredictionCache()
+            results = await asyncio.gather(
+                *(cache.get_or_compute('key', compute) for _ in range(3)), return_exceptions=True
+            )
+            return cache, results
+
+        cache, results = asyncio.run(run())
+        self.assertTrue(all(isinstance(result, ValueError) for result in results))
+        self.assertEqual(cache.stats()['size'], 0)
+
+    def test_clear_drops_the_computation_in_flight(self):
+        async def run():
+            cache = PredictionCache()
+
+            async def compute():
+                cache.clear()
+                return 1
+
+            await cache.get_or_compute('key', compute)
+            return cache
+
+        self.assertEqual(asyncio.run(run()).stats()['size'], 0)
+
+    def test_expired_prediction_is_computed_again(self):
+        async def run():
+            cache = PredictionCache(ttl_s=0)
+            for _ in range(2):
+                await cache.get_or_compute('key', lambda: asyncio.sleep(0, 1))
+            return cache
+
+        self.assertEqual(asyncio.run(run()).stats()['misses'], 2)
+
+    def test_key_depends_on_the_model_version(self):
+        self.assertEqual(input_key({'a': 1, 'b': 2}, '1'), input_key({'b': 2, 'a': 1}, '1'))
+        self.assertNotEqual(input_key({'a': 1}, '1'), input_key({'a': 1}, '2'))
+
+
+if __name__ == '__main__':
+    unittest.main()
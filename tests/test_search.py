@@ -0,0 +1,112 @@
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from lean_ds_project_mlflow.features.columnar import FrameDataset
+from lean_ds_project_mlflow.models.search import HyperparameterSearch, subsample
+from lean_ds_project_mlflow.models.train import search_and_train
+
+
+class ThresholdModel():
+    """
+    Predicts x > threshold, the rows it was trained on are kept to check the resource of the trial.
+    """
+    def __init__(self, params: dict = None, rows: int = 0):
+        self.params = params or {}
+        self.rows = rows
+
+    def predict(self, context, model_input):
+        return (model_input['x'] > self.params['threshold']).astype(int).to_numpy()
+
+
+def fit(dataset, params: dict) -> ThresholdModel:
+    return ThresholdModel(params, len(dataset))
+
+
+def score(dataset, model: ThresholdModel) -> float:
+    y_pred = model.predict(None, dataset.to_frame())
+    return float(np.mean(y_pred == dataset['y']))
+
+
+def make_dataset(rows: int = 1000) -> FrameDataset:
+    x = np.random.default_rng(0).uniform(size=rows)
+    return FrameDataset(pd.DataFrame({'x': x, 'y': (x > 0.6).astype(int)}))
+
+
+class TestSearch(unittest.TestCase):
+    """
+    The search ranks the candidates by their scores on the holdout.
+    """
+    space = {'threshold': [0.1, 0.3, 0.6, 0.8]}
+
+    def test_grid_finds_the_best_candidate(self):
+        for n_jobs in [1, 2]:
+            search = HyperparameterSearch('grid', self.space, n_jobs=n_jobs)
+            best = search.run(make_dataset(), fit, score)
+            self.assertEqual(best.params, {'threshold': 0.6})
+            self.assertEqual(best.score, 1.0)
+
+    def test_halving_keeps_the_best_candidates(self):
+        trials = []
+        search = HyperparameterSearch('halving', {'threshold': {'low': 0.0, 'high': 1.0}}, n_trials=9, n_jobs=1,
+                                      halving_factor=3, min_resource=0.1, seed=1)
+        best = search.run(make_dataset(), fit, score, on_trial=trials.append)
+
+        np.testing.assert_allclose([trial.resource for trial in trials], [0.1] * 9 + [0.3] * 3 + [0.9])
+        first_round = sorted(trials[:9], key=lambda trial: trial.score, reverse=True)
+        self.assertEqual([trial.params for trial in trials[9:12]], [trial.params for trial in first_round[:3]])
+        self.assertEqual(best.params, trials[-1].params)
+        self.assertAlmostEqual(best.params['threshold'], 0.6, delta=0.1)
+
+    def test_search_is_deterministic(self):
+        runs = []
+        for _ in range(2):
+            trials = []
+            HyperparameterSearch('random', {'threshold': {'low': 0.0, 'high': 1.0}}, n_trials=5, n_jobs=1).run(
+                make_dataset(), fit, score, on_trial=trials.append
+            )
+            runs.append([(trial.params, trial.score) for trial in trials])
+        self.assertEqual(runs[0], runs[1])
+
+
+class TestSubsample(unittest.TestCase):
+    """
+    Rows of the rounds of successive halving.
+    """
+    def setUp(self):
+        self.frame = pd.DataFrame({'id': np.arange(1000)})
+
+    def test_subsample_is_random_and_nested(self):
+        small = subsample(self.frame, 0.1, 42)['id'].tolist()
+        large = subsample(self.frame, 0.3, 42)['id'].tolist()
+        self.assertEqual(len(small), 100)
+        self.assertNotEqual(small, list(range(100)))
+        self.assertEqual(small, sorted(small))
+        self.assertTrue(set(small) <= set(large))
+        self.assertEqual(small, subsample(self.frame, 0.1, 42)['id'].tolist())
+        self.assertNotEqual(small, subsample(self.frame, 0.1, 7)['id'].tolist())
+        self.assertEqual(len(subsample(self.frame, 1.0, 42)), 1000)
+
+
+class TestSearchAndTrain(unittest.TestCase):
+    """
+    Configuration of the search in the training stage.
+    """
+    def test_search_requires_target_column(self):
+        config = {'training': {'search': {'strategy': 'grid', 'space': {'alpha': [1, 2]}, 'n_jobs': 1}}}
+        with self.assertRaisesRegex(ValueError, 'target_column'):
+            search_and_train(make_dataset(), config)
+
+    def test_search_scores_predictions(self):
+        config = {
+            'training': {'search': {'strategy': 'grid', 'space': {'alpha': [1, 2]}, 'n_jobs': 1, 'metric': 'f1_macro'}},
+            'validation': {'target_column': 'y'},
+        }
+        # the template model predicts the same value for all the candidates, so they tie
+        model = search_and_train(make_dataset(), config)
+        self.assertEqual(model.params, {'alpha': 1})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,47 @@
+import pathlib
+import tempfile
+import unittest
+
+from lean_ds_project_mlflow.features.split import split_dataset
+
+HEADER = 'id,zip,count,label,comment'
+ROWS = [
+    f'{i},{i % 13:03d},{"" if i % 5 == 0 else i},{"ab"[i % 2]},{"NA" if i % 7 == 0 else "1e3"}'
+    for i in range(200)
+] + ['200,007,,a,"with, comma"', '201,0,nan,b,None']
+
+
+class TestSplit(unittest.TestCase):
+    """
+    The subsets contain the rows of the dataset unchanged whatever the chunk size is.
+    """
+    def setUp(self):
+        self.tempdir = tempfile.TemporaryDirectory()
+        self.dir = pathlib.Path(self.tempdir.name)
+        self.dataset = self.dir.joinpath('dataset.csv')
+        self.dataset.write_text('\n'.join([HEADER] + ROWS) + '\n')
+
+    def tearDown(self):
+        self.tempdir.cleanup()
+
+    def split(self, chunk_size: int, **kwargs) -> tuple:
+        tune, validation = self.dir.joinpath(f'tune_{chunk_size}.csv'), self.dir.joinpath(f'val_{chunk_size}.csv')
+        split_dataset(self.dataset, tune, validation, 0.3, 42, chunk_size=chunk_size, **kwargs)
+        return tune.read_text().splitlines(), validation.read_text().splitlines()
+
+    def test_rows_are_unchanged(self):
+        for kwargs in [dict(), dict(key_column='zip'), dict(stratify_column='label')]:
+            for chunk_size in [7, 1000]:
+                tune, validation = self.split(chunk_size, **kwargs)
+                self.assertEqual(tune[0], HEADER)
+                self.assertEqual(validation[0], HEADER)
+                self.assertEqual(sorted(tune[1:] + validation[1:]), sorted(ROWS), msg=f'{kwargs} {chunk_size}')
+                self.assertTrue(validation[1:])
+
+    def test_assignment_does_not_depend_on_chunk_size(self):
+        for kwargs in [dict(), dict(key_column='zip'), dict(stratify_column='label')]:
+            self.assertEqual(self.split(7, **kwargs), self.split(1000, **kwargs), msg=str(kwargs))
+
+
+if __name__ == '__main__':
+    unittest.main()
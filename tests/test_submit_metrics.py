@@ -0,0 +1,157 @@
+import json
+import time
+import pathlib
+import tempfile
+import threading
+import unittest
+from urllib.parse import urlparse, parse_qs
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from lean_ds_project_mlflow.lifecycle.submit_metrics import MetricsClient, is_alive
+
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    """
+    Stand-in of the metrics tracking service, the behaviour is set by the attributes of the server.
+    """
+    def do_POST(self):
+        url = urlparse(self.path)
+        with self.server.lock:
+            self.server.requests.append(url.path)
+            fail = self.server.failures > 0
+            if fail:
+                self.server.failures -= 1
+
+        if fail:
+            status = self.server.failure_status
+        elif url.path == '/train_validation':
+            status = 200
+            query = parse_qs(url.query)
+            with self.server.lock:
+                self.server.received.append((query['metric'][0], float(query['value'][0])))
+            # the metric is recorded, but the response comes too late
+            time.sleep(self.server.delay)
+        else:
+            status = 404
+
+        self.send_response(status)
+        self.send_header('Content-Type', 'text/plain')
+        self.end_headers()
+        self.wfile.write(b'ok')
+
+    def log_message(self, format, *args):
+        pass
+
+
+class TestSubmitMetrics(unittest.TestCase):
+    """
+    Tests of the metrics submission against a local HTTP server.
+    """
+    def setUp(self):
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), MetricsHandler)
+        self.server.lock = threading.Lock()
+        self.server.requests = []
+        self.server.received = []
+        self.server.failures = 0
+        self.server.failure_status = 503
+        self.server.delay = 0
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+
+        self.tempdir = tempfile.TemporaryDirectory()
+        self.spool_path = pathlib.Path(self.tempdir.name).joinpath('spool.jsonl')
+        self.uri = f'http://127.0.0.1:{self.server.server_address[1]}'
+        self.metrics = {f'metric-{i}': i / 10 for i in range(20)}
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.tempdir.cleanup()
+
+    def client(self, **kwargs):
+        return MetricsClient(self.uri, timeout=5, backoff=0, spool_path=self.spool_path, **kwargs)
+
+    def received(self) -> dict:
+        metrics = dict(self.server.received)
+        self.assertEqual(len(metrics), len(self.server.received), 'a metric is recorded twice')
+        return metrics
+
+    def test_submit(self):
+        with self.client(max_workers=4) as client:
+            failed = client.submit('model', self.metrics)
+        self.assertEqual(failed, {})
+        self.assertEqual(self.server.requests, ['/train_validation'] * len(self.metrics))
+        self.assertEqual(self.received(), self.metrics)
+
+    def test_retry(self):
+        self.server.failures = 2
+        with self.client(retries=3) as client:
+            failed = client.submit('model', self.metrics)
+        self.assertEqual(failed, {})
+        self.assertEqual(len(self.server.requests), len(self.metrics) + 2)
+        self.assertEqual(self.received(), self.metrics)
+
+    def test_spool_and_resend(self):
+        self.server.failures = 3
+        with self.client(retries=2, max_workers=1) as client:
+            failed = client.submit('model', self.metrics)
+        # the first metric is rejected three times, the others are sent
+        self.assertEqual(len(failed), 1)
+        self.assertTrue(self.spool_path.exists())
+        self.assertEqual(len(self.received()), len(self.metrics) - 1)
+
+        with self.client(retries=2) as client:
+            sent = client.resend_spooled()
+        self.assertEqual(sent, 1)
+        self.assertFalse(self.spool_path.exists())
+        self.assertEqual(self.received(), self.metrics)
+
+    def test_unreachable(self):
+        self.server.shutdown()
+        self.server.server_close()
+        with self.client(retries=0) as client:
+            failed = client.submit('model', self.metrics)
+        self.assertEqual(failed, self.metrics)
+        with open(self.spool_path, 'r') as f:
+            self.assertEqual(json.loads(f.readline())['metrics'], self.metrics)
+
+    def test_timeout_is_not_spooled(self):
+        self.server.delay = 1
+        metrics = {'accuracy': 0.9}
+        with MetricsClient(self.uri, timeout=0.2, retries=3, backoff=0, spool_path=self.spool_path) as client:
+            failed = client.submit('model', metrics)
+            self.assertEqual(failed, metrics)
+            self.assertEqual(client.resend_spooled(), 0)
+        # the request is neither retried nor spooled, the metric is recorded once
+        self.assertFalse(self.spool_path.exists())
+        self.assertEqual(self.received(), metrics)
+
+    def test_server_error_is_not_spooled(self):
+        self.server.failures = 1
+        self.server.failure_status = 500
+        with self.client(retries=3) as client:
+            failed = client.submit('model', {'accuracy': 0.9})
+        self.assertEqual(failed, {'accuracy': 0.9})
+        self.assertEqual(len(self.server.requests), 1)
+        self.assertFalse(self.spool_path.exists())
+
+    def test_orphaned_spool_is_resent(self):
+        # a file taken over by a process that crashed while resending it
+        pid = 2 ** 22 + 1
+        self.assertFalse(is_alive(pid))
+        orphan = self.spool_path.with_name(f'{self.spool_path.name}.{pid}')
+        orphan.write_text(json.dumps({'model': 'model', 'metrics': {'accuracy': 0.9}}) + '\n')
+        # a file of a running process is left to it
+        running = self.spool_path.with_name(f'{self.spool_path.name}.1')
+        running.write_text(json.dumps({'model': 'model', 'metrics': {'f1': 0.8}}) + '\n')
+
+        with self.client() as client:
+            sent = client.resend_spooled()
+        self.assertEqual(sent, 1)
+        self.assertFalse(orphan.exists())
+        self.assertTrue(running.exists())
+        self.assertEqual(self.received(), {'accuracy': 0.9})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,106 @@
+import os
+import pathlib
+import tempfile
+import unittest
+from unittest import mock
+
+import numpy as np
+import pandas as pd
+import yaml
+
+from lean_ds_project_mlflow import ContextualizedDirectory
+from lean_ds_project_mlflow.features.columnar import FrameDataset
+from lean_ds_project_mlflow.models import train
+from lean_ds_project_mlflow.models.train import CustomPythonModel, train_incremental
+
+
+def make_dataset(rows: int) -> FrameDataset:
+    return FrameDataset(pd.DataFrame({'x': np.arange(rows)}))
+
+
+class TestIncrementalTraining(unittest.TestCase):
+    """
+    Warm start of out-of-core training on an append-only dataset.
+    """
+    def test_only_appended_rows_are_consumed(self):
+        model = train_incremental(make_dataset(10), chunk_size=3)
+        self.assertEqual(model.n_rows_seen, 10)
+
+        with mock.patch.object(CustomPythonModel, 'partial_fit', autospec=True,
+                               side_effect=CustomPythonModel.partial_fit) as partial_fit:
+            model = train_incremental(make_dataset(15), chunk_size=3, model=model)
+        self.assertEqual([len(call.args[1]) for call in partial_fit.call_args_list], [3, 2])
+        self.assertEqual(model.n_rows_seen, 15)
+
+    def test_changed_rows_train_from_scratch(self):
+        model = train_incremental(make_dataset(10), chunk_size=3, params={'alpha': 1})
+        reordered = FrameDataset(pd.DataFrame({'x': np.arange(15)[::-1]}))
+        model = train_incremental(reordered, chunk_size=3, model=model)
+        self.assertEqual(model.n_rows_seen, 15)
+        self.assertEqual(model.params, {'alpha': 1})
+
+        model = train_incremental(make_dataset(5), chunk_size=3, model=model)
+        self.assertEqual(model.n_rows_seen, 5)
+
+    def test_legacy_model_has_defaults(self):
+        # models pickled before incremental training have none of its attributes
+        model = CustomPythonModel.__new__(CustomPythonModel)
+        self.assertEqual(dict(model.params), {})
+        model = train_incremental(make_dataset(4), chunk_size=3, model=model)
+        self.assertEqual(model.n_rows_seen, 4)
+
+
+class TempDirectory(ContextualizedDirectory):
+    root = None
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.dir = self.root
+
+
+class TestTrainStage(unittest.TestCase):
+    """
+    The warm-start model is downloaded only when the train stage actually runs.
+    """
+    def setUp(self):
+        from mlflow.tracking import MlflowClient
+
+        self.tempdir = tempfile.TemporaryDirectory()
+        self.directory = pathlib.Path(self.tempdir.name)
+        self.environ = dict(os.environ)
+        os.environ['MLFLOW_ALLOW_FILE_STORE'] = 'true'
+        os.environ['MLFLOW_TRACKING_URI'] = self.directory.joinpath('mlruns').as_uri()
+
+        config = yaml.safe_load(open('config/config_local.yml'))
+        config['pipeline']['reuse_stages'] = True
+        config['training']['incremental'].update(enabled=True, warm_start=True)
+        self.config_path = self.directory.joinpath('config.yml')
+        self.config_path.write_text(yaml.safe_dump(config))
+
+        client = MlflowClient()
+        experiment_id = client.create_experiment(config['experiment'])
+        self.run_id = client.create_run(experiment_id).info.run_id
+        TempDirectory.root = self.directory
+
+    def tearDown(self):
+        os.environ.clear()
+        os.environ.update(self.environ)
+        self.tempdir.cleanup()
+
+    def test_reused_stage_does_not_load_the_model(self):
+        fingerprint = mock.MagicMock()
+        fingerprint.return_value.reuse.return_value = self.directory
+
+        with mock.patch.object(train, 'ContextualizedDirectory', TempDirectory), \
+                mock.patch.object(train, 'StageFingerprint', fingerprint), \
+                mock.patch.object(train, 'get_latest_version', return_value='3') as get_latest_version, \
+                mock.patch.object(train, 'load_model_version') as load_model_version:
+            train.train_mlflow.__wrapped__(str(self.config_path), self.run_id)
+
+        get_latest_version.assert_called_once()
+        self.assertEqual(fingerprint.call_args.args[5]['warm_start_version'], '3')
+        load_model_version.assert_not_called()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,50 @@
+import pathlib
+import tempfile
+import unittest
+
+import numpy as np
+
+from lean_ds_project_mlflow.features.transform import transform_dataset
+
+CSV = '''id,count,zip,name
+1,10,007,a
+2,20,010,b
+3,30,100,
+4,40,200,d
+5,,300,e
+'''
+
+
+class TestTransform(unittest.TestCase):
+    """
+    The types of the transformed dataset are decided once, not per chunk.
+    """
+    def setUp(self):
+        self.tempdir = tempfile.TemporaryDirectory()
+        self.dataset = pathlib.Path(self.tempdir.name).joinpath('dataset.csv')
+        self.dataset.write_text(CSV)
+
+    def tearDown(self):
+        self.tempdir.cleanup()
+
+    def test_types_do_not_depend_on_chunk_size(self):
+        expected = transform_dataset(self.dataset, chunk_size=1000)
+        self.assertEqual(expected['id'].dtype, np.int64)
+        # the missing value of the last chunk makes the whole column float
+        self.assertEqual(expected['count'].dtype, np.float64)
+        self.assertEqual(expected['name'].isna().tolist(), [False, False, True, False, False])
+
+        for chunk_size in [1, 2, 4]:
+            transformed = transform_dataset(self.dataset, chunk_size=chunk_size)
+            self.assertEqual(transformed.dtypes.to_dict(), expected.dtypes.to_dict(), msg=chunk_size)
+            self.assertTrue(transformed.equals(expected), msg=chunk_size)
+
+    def test_header_only(self):
+        self.dataset.write_text('id,count\n')
+        transformed = transform_dataset(self.dataset, chunk_size=2)
+        self.assertEqual(list(transformed.columns), ['id', 'count'])
+        self.assertEqual(len(transformed), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
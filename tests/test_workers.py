@@ -0,0 +1,113 @@
+import os
+import time
+import signal
+import pathlib
+import tempfile
+import unittest
+import multiprocessing
+
+from lean_ds_project_mlflow.serving.workers import WorkerSupervisor
+
+
+def wait_for(condition, timeout: float = 10.):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.02)
+    return False
+
+
+def is_running(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    return True
+
+
+class TestWorkerSupervisor(unittest.TestCase):
+    """
+    Forking, restarts and shutdown of the pre-fork workers. The supervisor runs in a child process,
+    since it installs signal handlers and runs until it is stopped.
+    """
+    def setUp(self):
+        self.tempdir = tempfile.TemporaryDirectory()
+        self.log_path = pathlib.Path(self.tempdir.name).joinpath('starts.log')
+        self.supervisor = None
+
+    def tearDown(self):
+        if self.supervisor is not None and self.supervisor.is_alive():
+            self.supervisor.kill()
+        self.tempdir.cleanup()
+
+    def starts(self) -> list:
+        if not self.log_path.exists():
+            return []
+        lines = self.log_path.read_text().splitlines()
+        return [(int(index), int(pid), float(started)) for index, pid, started in (line.split() for line in lines)]
+
+    def start(self, behaviour: str, n_workers: int, **kwargs):
+        log_path = self.log_path
+
+        def target(index: int):
+            with open(log_path, 'a') as f:
+                f.write(f'{index} {os.getpid()} {time.monotonic()}\n')
+            if behaviour == 'crash' and index == 0:
+                raise RuntimeError('worker failed to start')
+            if behaviour == 'ignore_sigterm':
+                signal.signal(signal.SIGTERM, signal.SIG_IGN)
+            time.sleep(60)
+
+        def run():
+            WorkerSupervisor(target, n_workers, **kwargs).run(poll_interval=0.01)
+
+        self.supervisor = multiprocessing.get_context('fork').Process(target=run)
+        self.supervisor.start()
+
+    def stop(self, timeout: float = 10.):
+        os.kill(self.supervisor.pid, signal.SIGTERM)
+        self.supervisor.join(timeout)
+        self.assertEqual(self.supervisor.exitcode, 0)
+
+    def test_workers_are_stopped(self):
+        self.start('serve', n_workers=3)
+        self.assertTrue(wait_for(lambda: len(self.starts()) == 3))
+        self.assertEqual(sorted(index for index, _, _ in self.starts()), [0, 1, 2])
+
+        self.stop()
+        self.assertFalse([pid for _, pid, _ in self.starts() if is_running(pid)])
+        # workers stopped by the shutdown are not restarted
+        self.assertEqual(len(self.starts()), 3)
+
+    def test_crashing_worker_backs_off(self):
+        self.start('crash', n_workers=2, restart_delay=0.05, max_restart_delay=0.4, min_uptime=10)
+        self.assertTrue(wait_for(lambda: len([s for s in self.starts() if s[0] == 0]) >= 5))
+        self.stop()
+
+        starts = [started for index, _, started in self.starts() if index == 0]
+        gaps = [b - a for a, b in zip(starts, starts[1:])]
+        # the delay doubles from restart_delay up to max_restart_delay
+        for gap, delay in zip(gaps, [0.1, 0.2, 0.4, 0.4]):
+            self.assertGreaterEqual(gap, delay)
+        # the healthy worker is started once
+        self.assertEqual(len([s for s in self.starts() if s[0] == 1]), 1)
+
+    def test_stuck_workers_are_killed(self):
+        self.start('ignore_sigterm', n_workers=2, shutdown_timeout=0.3)
+        self.assertTrue(wait_for(lambda: len(self.starts()) == 2))
+        # the handler is set after the start is logged
+        time.sleep(0.1)
+
+        started = time.monotonic()
+        self.stop()
+        self.assertLess(time.monotonic() - started, 5)
+        self.assertFalse([pid for _, pid, _ in self.starts() if is_running(pid)])
+
+    def test_number_of_workers(self):
+        with self.assertRaises(ValueError):
+            WorkerSupervisor(lambda index: None, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()